@@ -0,0 +1,346 @@
+"""热点路径的微基准
+
+覆盖状态序列化、存读档(按历史长度与存档数量)、回合结算(10 到 100 万名弟子)、日志写入、
+事件检查、状态图处理命令以及检查点的逐步写入与重启恢复；LLM 请求由本地替身(stub_invoke)代替，不访问网络。
+
+    python -m bench.micro                  # 运行全部用例并与基线比较
+    python -m bench.micro -k save -k turn  # 只运行名称包含 save 或 turn 的用例
+    python -m bench.micro --quick          # 较小的规模与较少的重复，用于快速检查
+    python -m bench.micro --save           # 运行并把结果写入基线(只更新本次运行的用例)
+
+每个用例自动调整循环次数，使一次测量不少于 BENCH_MIN_TIME 秒，重复 BENCH_REPEAT 次取最快一次的单次耗时。
+与基线相比慢了超过 BENCH_THRESHOLD 的用例标记为退步，此时退出码为 1。
+基线与机器有关，保存在 BENCH_BASELINE，不随代码提交。存档类用例在临时目录中进行，不影响正式存档。
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+import timeit
+from typing import Optional
+
+from config.settings import (BENCH_BASELINE, BENCH_THRESHOLD, BENCH_REPEAT, BENCH_MIN_TIME,
+                             MESSAGE_LOG_DISPLAY)
+from core import actions
+from core.game_state import GameState
+from core.save_system import save_game, get_save_files, load_save_state
+from events.llm_turn import plan_turn
+from events.special_events import EventManager
+
+BASELINE_VERSION = 1
+_ACTIONS = ("dispatch mining 1", "dispatch recruiting 1", "recall mining 1", "recall recruiting 1",
+            "upgrade vault", "upgrade cave")
+_STUB_CHRONICLE = "本年风调雨顺，宗门弟子勤修不辍，灵脉矿洞产出稳定，山门内外一片祥和。"
+_STUB_EVENT = {
+    "title": "山门来客",
+    "description": "一名散修登门求见。",
+    "options": [
+        {"text": "以礼相待", "outcome": "散修留下些许灵石。", "deltas": {"wealth": 5}},
+        {"text": "收为弟子", "outcome": "散修拜入山门。", "deltas": {"disciples_total": 1}},
+        {"text": "闭门谢客", "outcome": "散修悻悻离去。"},
+    ],
+}
+
+
+class _Skipped(Exception):
+    """当前环境无法运行的用例组"""
+
+
+def stub_invoke(message, tools) -> dict:
+    """本地 LLM 替身：返回固定的年度总结与事件，格式同 core.llm.LLM_invoke_tools"""
+    return {"content": "", "tool_calls": [("write_chronicle", {"narrative": _STUB_CHRONICLE}),
+                                          ("define_event", _STUB_EVENT)]}
+
+
+def _quiet_invoke(message, tools) -> dict:
+    """只返回年度总结的 LLM 替身"""
+    return {"content": "", "tool_calls": [("write_chronicle", {"narrative": _STUB_CHRONICLE})]}
+
+
+def aged_state(years: int, seed: int = 0) -> GameState:
+    """用脚本玩家玩 years 年得到的状态(日志、编年史与指标表随年份增长)"""
+    rng = random.Random(seed)
+    state = GameState()
+    event_manager = EventManager(rng)
+    for _ in range(years):
+        state.game_time += 1
+        event = event_manager.check_events(state, False)
+        if event is not None:
+            actions.choose(state, event_manager, event, f"choose {rng.randrange(len(event['options']))}")
+        for _ in range(rng.randint(0, 3)):
+            actions.perform(state, rng.choice(_ACTIONS))
+        actions.settle_turn(state, rng)
+        event_manager.pending_event = actions.apply_plan(state, plan_turn(state, stub_invoke))
+    return state
+
+
+def _crowded_state(disciples: int) -> tuple:
+    """有 disciples 名弟子(一半挖矿、一半招募)的状态，以及每次结算前用于复位的宗门数据"""
+    state = GameState()
+    state.game_time = 1
+    sect = state.sect_data
+    sect.update(disciples_total=disciples, disciples_mining=disciples // 2,
+                disciples_recruiting=disciples - disciples // 2,
+                vault_level=disciples + 1, cave_level=disciples // 50 + 1, wealth=disciples)
+    return state, dict(sect)
+
+
+# ---- 用例组：每组生成 (名称, 无参函数)，函数执行一次被测操作 ----
+
+def bench_state(quick: bool):
+    """GameState.to_dict / from_dict"""
+    for years in (10, 1000) if quick else (10, 1000, 10000):
+        state = aged_state(years)
+        data = state.to_dict()
+        yield f"state.to_dict[{years}年]", state.to_dict
+        yield f"state.from_dict[{years}年]", lambda data=data: GameState.from_dict(data)
+
+
+def bench_saves(quick: bool):
+    """save_game / load_save_state / get_save_files"""
+    for years in (10, 1000) if quick else (10, 1000, 10000):
+        state = aged_state(years)
+        yield f"save.write[{years}年]", lambda state=state: save_game(state, 1)
+        yield f"save.load[{years}年]", lambda: load_save_state(1)
+
+    state = GameState()
+    slots = 0
+    for count in (10, 100) if quick else (10, 100, 1000):
+        while slots < count:
+            slots += 1
+            save_game(state, slots)
+        yield f"save.list[{count}个存档]", get_save_files
+
+
+def bench_turn(quick: bool):
+    """回合结算：数值结算 + LLM 推演(替身) + 应用推演结果，即命令行结束回合时除输入输出外的部分"""
+    rng = random.Random(0)
+    for disciples in (10, 1000, 100000) if quick else (10, 1000, 100000, 1000000):
+        state, sect = _crowded_state(disciples)
+
+        def end_turn(state=state, sect=sect):
+            state.sect_data.update(sect)  # 复位，使每次结算的规模相同
+            actions.settle_turn(state, rng)
+            actions.apply_plan(state, plan_turn(state, stub_invoke))
+
+        yield f"turn.end[{disciples}弟子]", end_turn
+
+
+def bench_log(quick: bool):
+    """日志写入与读取"""
+    state = aged_state(100)
+    yield "log.log_message", lambda: state.log_message("弟子在后山发现一株百年灵芝")
+    yield "log.template", lambda: state.log("mining_gain", 12)
+    yield "log.recent", lambda: state.message_log.recent(MESSAGE_LOG_DISPLAY)
+
+
+def bench_events(quick: bool):
+    """EventManager.check_events(有无预生成事件)与事件结算"""
+    state = aged_state(100)
+    event_manager = EventManager(random.Random(0))
+    event = plan_turn(state, stub_invoke)["event"]
+    yield "events.check[无事件]", lambda: event_manager.check_events(state, False)
+
+    def check_pending():
+        event_manager.pending_event = event
+        return event_manager.check_events(state, False)
+
+    yield "events.check[预生成事件]", check_pending
+    yield "events.resolve", lambda: event_manager.resolve_event(event, 2, state)
+
+
+def bench_turn_graph(quick: bool):
+    """
+    宗门回合状态图(graph.turn_graph)处理一条命令，含检查点的读写
+    graph.turn 为默认的 ParkingSaver(只在暂停时记录检查点)，graph.turn_sync 为每一步写入 SQLite 的 IncrementalSaver，
+    两者之差即逐步持久化的开销；checkpoint.resume 为进程重启后从 SQLite 重建会话
+    """
+    from graph.checkpoint import ParkingSaver, IncrementalSaver
+    from graph.turn_graph import TurnSession, TURN_CODECS
+
+    planner = lambda state: plan_turn(state, _quiet_invoke)
+    saver = ParkingSaver(os.path.join("saves", "bench-parked.db"))
+    session = TurnSession(saver, "bench", planner)
+    session.start(aged_state(100))
+    yield "graph.turn[status]", lambda: session.handle("status")
+    yield "graph.turn[dispatch]", lambda: session.handle("dispatch mining 0")
+    yield "graph.turn[end]", lambda: session.handle("end")
+
+    for years in (100,) if quick else (100, 1000):
+        path = os.path.join("saves", f"bench-checkpoints-{years}.db")
+        saver = IncrementalSaver(path, TURN_CODECS)
+        session = TurnSession(saver, "bench", planner, durability="sync")
+        session.start(aged_state(years))
+        yield f"graph.turn_sync[status,{years}年]", lambda session=session: session.handle("status")
+        yield f"graph.turn_sync[dispatch,{years}年]", lambda session=session: session.handle("dispatch mining 0")
+        yield f"graph.turn_sync[end,{years}年]", lambda session=session: session.handle("end")
+        saver.close()
+
+        def resume(path=path):
+            restarted = IncrementalSaver(path, TURN_CODECS)
+            restarted.get_tuple(session.config)
+            restarted.close()
+
+        yield f"checkpoint.resume[{years}年]", resume
+
+
+def bench_game_graph(quick: bool):
+    """修仙版状态图 GameGraphManager.process_action(运行状态图)与 continue_dialogue(直接调度)"""
+    try:
+        from core.player import Player
+        from core.time_system import TimeSystem
+        from npc.npcs import NPCManager
+        from graph.game_graph import GameGraphManager
+    except ImportError as e:
+        raise _Skipped(f"缺少模块 {e.name}")
+    manager = GameGraphManager(Player(), TimeSystem(), EventManager(random.Random(0)), NPCManager())
+    yield "graph.process_action[idle]", lambda: manager.process_action("idle")
+    yield "graph.process_action[cultivate]", lambda: manager.process_action("cultivate")
+
+
+GROUPS = (bench_state, bench_saves, bench_turn, bench_log, bench_events, bench_turn_graph, bench_game_graph)
+
+
+# ---- 测量与基线 ----
+
+def measure(func, repeat: int = BENCH_REPEAT, min_time: float = BENCH_MIN_TIME) -> dict:
+    """
+    测量 func 的单次耗时(秒)
+    返回: {"best": 最快一次, "median": 中位数, "number": 每次测量的循环次数}
+    """
+    timer = timeit.Timer(func)
+    number, elapsed = 1, timer.timeit(1)
+    while elapsed < min_time:
+        number = max(number * 2, int(number * min_time / max(elapsed, 1e-9) * 1.2))
+        elapsed = timer.timeit(number)
+    times = [elapsed / number] + [timer.timeit(number) / number for _ in range(repeat - 1)]
+    return {"best": min(times), "median": statistics.median(times), "number": number}
+
+
+def run(patterns: list = (), quick: bool = False, repeat: int = BENCH_REPEAT,
+        min_time: float = BENCH_MIN_TIME, report=print) -> tuple:
+    """
+    在临时目录中运行名称包含任一 patterns 的用例(为空时运行全部)
+    返回: ({用例名: measure 的结果}, [跳过的用例组说明])
+    """
+    results, skipped = {}, []
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            for group in GROUPS:
+                try:
+                    for name, func in group(quick):
+                        if patterns and not any(p in name for p in patterns):
+                            continue
+                        results[name] = measure(func, repeat, min_time)
+                        report(_format_row(name, results[name]))
+                except _Skipped as e:
+                    skipped.append(f"{group.__name__}: 跳过({e})")
+                    report(skipped[-1])
+        finally:
+            os.chdir(cwd)
+    return results, skipped
+
+
+def load_baseline(path: str) -> dict:
+    """读取基线，不存在时返回空字典"""
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    if data.get("version") != BASELINE_VERSION:
+        return {}
+    return data["results"]
+
+
+def save_baseline(path: str, results: dict):
+    """把本次结果合并进基线(未运行的用例保留原基线)"""
+    merged = load_baseline(path)
+    merged.update({name: result["best"] for name, result in results.items()})
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    data = {
+        "version": BASELINE_VERSION,
+        "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": merged,
+    }
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, path)
+
+
+def compare(results: dict, baseline: dict, threshold: float = BENCH_THRESHOLD) -> list:
+    """
+    与基线比较
+    返回: [(用例名, 本次耗时, 基线耗时 或 None, 变化比例 或 None, 是否退步)]
+    """
+    rows = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        change = result["best"] / base - 1 if base else None
+        rows.append((name, result["best"], base, change, change is not None and change > threshold))
+    return rows
+
+
+def _time(seconds: Optional[float]) -> str:
+    if seconds is None:
+        return "-"
+    if seconds < 1e-3:
+        return f"{seconds * 1e6:.2f}us"
+    if seconds < 1:
+        return f"{seconds * 1e3:.3f}ms"
+    return f"{seconds:.3f}s"
+
+
+def _format_row(name: str, result: dict) -> str:
+    return (f"{name:<36} 最快 {_time(result['best']):>10}  中位数 {_time(result['median']):>10}"
+            f"  ({result['number']} 次/轮)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="热点路径的微基准")
+    parser.add_argument("-k", "--filter", action="append", default=[], help="只运行名称包含该字符串的用例，可重复")
+    parser.add_argument("--quick", action="store_true", help="较小的规模与较少的重复")
+    parser.add_argument("--save", action="store_true", help="把本次结果写入基线")
+    parser.add_argument("--baseline", default=BENCH_BASELINE, help=f"基线文件(默认 {BENCH_BASELINE})")
+    parser.add_argument("--threshold", type=float, default=BENCH_THRESHOLD,
+                        help=f"比基线慢超过该比例视为退步(默认 {BENCH_THRESHOLD})")
+    args = parser.parse_args(argv)
+
+    baseline_path = os.path.abspath(args.baseline)
+    repeat = 3 if args.quick else BENCH_REPEAT
+    results, skipped = run(args.filter, args.quick, repeat)
+    if not results:
+        parser.error("没有匹配的用例")
+
+    baseline = load_baseline(baseline_path)
+    rows = compare(results, baseline, args.threshold)
+    print()
+    if baseline:
+        for name, best, base, change, regressed in rows:
+            mark = "退步" if regressed else ("进步" if change is not None and change < -args.threshold else "")
+            change_text = f"{change:+.1%}" if change is not None else "无基线"
+            print(f"{name:<36} {_time(best):>10}  基线 {_time(base):>10}  {change_text:>8}  {mark}")
+    regressions = [row[0] for row in rows if row[4]]
+    print(f"{len(results)} 个用例，跳过 {len(skipped)} 组"
+          + (f"；{len(regressions)} 个比基线慢超过 {args.threshold:.0%}" if baseline else "；没有基线"))
+
+    if args.save:
+        save_baseline(baseline_path, results)
+        print(f"基线已写入 {baseline_path}")
+    if regressions and not args.save:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""长周期浸泡测试
+
+用脚本玩家在无界面会话(server.game_server.GameSession)中连续玩很多个回合，LLM 由本地替身(bench.micro.stub_invoke)代替。
+每隔 interval 个回合采样一次：常驻内存、存活对象数、这一段的平均回合耗时、存档大小与 LLM 提示词长度，
+以及消息日志、指标表、编年史的条数。跳过前 warmup 个回合(日志环形缓冲区填满、指标表开始降采样之前)后，
+对每项指标做线性拟合，斜率(每千回合的增量)超过 SOAK_SLOPES 中的上限即判定为失败，退出码为 1。
+
+    python -m bench.soak                               # 默认 SOAK_TURNS 个回合
+    python -m bench.soak --turns 20000 --interval 500 --out saves/soak.jsonl
+
+编年史按设计保存全部历史，条数与存档大小随回合数线性增长，上限按这一增长设定；
+回合耗时、提示词长度与内存的增长超过上限通常意味着某处随历史长度变慢或泄漏。
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+from config.settings import SOAK_TURNS, SOAK_INTERVAL, SOAK_WARMUP, SOAK_SLOPES
+from core.game_state import GameState
+from core.rng import RandomStreams
+from core.save_db import encode_state
+from events.llm_turn import plan_turn, turn_messages
+from bench.micro import stub_invoke
+from server.game_server import GameSession
+
+_ACTIONS = ("dispatch mining 1", "dispatch recruiting 1", "recall mining 1", "recall recruiting 1",
+            "upgrade vault", "upgrade cave", "status", "log 5")
+# 采样项：(名称, 单位, 显示时的缩放)
+_COLUMNS = (
+    ("rss", "KB", 1 / 1024),
+    ("objects", "个", 1),
+    ("latency", "us", 1e6),
+    ("save", "KB", 1 / 1024),
+    ("prompt", "字", 1),
+)
+
+
+def _rss() -> int:
+    """当前进程常驻内存(字节)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _sample(turn: int, state: GameState, turn_times: list) -> dict:
+    gc.collect()
+    return {
+        "turn": turn,
+        "rss": _rss(),
+        "objects": len(gc.get_objects()),
+        "latency": statistics.fmean(turn_times) if turn_times else 0.0,
+        "save": len(encode_state(state)),
+        "prompt": sum(len(m["content"]) for m in turn_messages(state)),
+        "message_log": len(state.message_log),
+        "data_log": len(state.data_log),
+        "chronicle": len(state.chronicle),
+    }
+
+
+def soak(turns: int = SOAK_TURNS, interval: int = SOAK_INTERVAL, seed: int = 0, report=None) -> list:
+    """
+    用脚本玩家玩 turns 个回合，每 interval 个回合采样一次
+    report(sample) 在每次采样后调用
+    返回: 采样列表
+    """
+    policy = random.Random(seed)
+    session = GameSession(planner=lambda state: plan_turn(state, stub_invoke), streams=RandomStreams(seed=seed))
+    session.start()
+    samples = [_sample(0, session.state, [])]
+    turn_times = []
+    for turn in range(1, turns + 1):
+        start = time.perf_counter()
+        while session.event is not None:
+            session.handle(f"choose {policy.randrange(len(session.event['options']))}")
+        for _ in range(policy.randint(0, 5)):
+            session.handle(policy.choice(_ACTIONS))
+        session.handle("end")
+        turn_times.append(time.perf_counter() - start)
+        if turn % interval == 0:
+            samples.append(_sample(turn, session.state, turn_times))
+            turn_times.clear()
+            if report:
+                report(samples[-1])
+    return samples
+
+
+def slopes(samples: list, warmup: int = SOAK_WARMUP) -> dict:
+    """跳过前 warmup 个回合的采样，对每项指标做线性拟合，返回 {名称: 每千回合的增量}"""
+    fitted = [s for s in samples if s["turn"] > warmup]
+    if len(fitted) < 2:
+        return {}
+    x = [s["turn"] / 1000 for s in fitted]
+    return {name: statistics.linear_regression(x, [s[name] for s in fitted]).slope
+            for name in (*SOAK_SLOPES, "message_log", "data_log", "chronicle")}
+
+
+def check(fitted: dict, limits: dict = SOAK_SLOPES) -> list:
+    """返回斜率超过上限的指标 [(名称, 斜率, 上限)]"""
+    return [(name, fitted[name], limit) for name, limit in limits.items() if fitted.get(name, 0) > limit]
+
+
+def _format_sample(sample: dict) -> str:
+    values = "  ".join(f"{name} {sample[name] * scale:.1f}{unit}" for name, unit, scale in _COLUMNS)
+    return (f"第 {sample['turn']:>7} 回合  {values}  "
+            f"日志 {sample['message_log']} 指标 {sample['data_log']} 编年史 {sample['chronicle']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="长周期浸泡测试")
+    parser.add_argument("--turns", type=int, default=SOAK_TURNS, help="回合数")
+    parser.add_argument("--interval", type=int, default=SOAK_INTERVAL, help="每隔多少回合采样一次")
+    parser.add_argument("--warmup", type=int, default=SOAK_WARMUP, help="拟合斜率时跳过的前若干回合")
+    parser.add_argument("--seed", type=int, default=0, help="随机数种子")
+    parser.add_argument("--out", help="把采样写入 JSON Lines 文件")
+    args = parser.parse_args(argv)
+    if args.turns < args.warmup + 2 * args.interval:
+        parser.error("回合数不足：至少需要 warmup 之后的两次采样")
+
+    start = time.perf_counter()
+    samples = soak(args.turns, args.interval, args.seed, report=lambda s: print(_format_sample(s), flush=True))
+    wall = time.perf_counter() - start
+    if args.out:
+        directory = os.path.dirname(args.out)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.writelines(json.dumps(s) + "\n" for s in samples)
+
+    fitted = slopes(samples, args.warmup)
+    print(f"\n{args.turns} 回合，用时 {wall:.1f}s({args.turns / wall:.0f} 回合/s)；第 {args.warmup} 回合之后每千回合的增量：")
+    for name, unit, scale in _COLUMNS:
+        print(f"  {name:<8} {fitted[name] * scale:>+12.2f}{unit}  上限 {SOAK_SLOPES[name] * scale:.2f}{unit}")
+    for name in ("message_log", "data_log", "chronicle"):
+        print(f"  {name:<12} {fitted[name]:>+8.1f} 条")
+    failures = check(fitted)
+    if failures:
+        print("增长过快：" + "，".join(name for name, *_ in failures))
+        sys.exit(1)
+    print("全部指标的增长在上限之内")
+
+
+if __name__ == "__main__":
+    main()
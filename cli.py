@@ -1,48 +1,32 @@
-"""仙宗 - 修仙模拟器 命令行版本"""
-import random
+"""仙宗 - 修仙模拟器 命令行版本
+
+    python cli.py [--record [目录]] [--seed N] [--profile [--tracemalloc]]
+
+--record 时把每局新游戏录制到目录下(core.recording)，可用 python -m server.replay 无界面回放。
+--profile 时每回合把各阶段耗时导出到 PROFILE_JSONL / PROFILE_PROMETHEUS(core.profiler)；
+游戏中操作菜单的 8 随时查看各阶段耗时。
+"""
+import argparse
 import os
+import time
+from itertools import islice
 from core.game_state import GameState
+from core import actions
 from events.special_events import EventManager
-from core.save_system import save_game, load_game, get_save_files
+from events.llm_turn import plan_turn
+from core.save_system import save_game, get_save_files, load_save_state
+from core.llm import LLM_invoke
+from core.journal import open_journal
+from core.autosave import AutosaveService
+from core.history import StateHistory
+from core.terminal import TerminalRenderer
+from core.save_store import SaveStore
+from core.recording import Recorder
+from core.rng import RandomStreams
+from core.profiler import profiler
 from config.settings import *
 
 
-
-def LLM_invoke(message,tools=None):
-    """调用LLM"""
-    payload = json.dumps({
-        "model": CHEAP_MODEL_ID,
-        "stream": False,
-        "messages": message,
-        "tools": tools,
-        "stream_options": {
-            "include_usage": True
-        }
-    })if tools else json.dumps({
-        "model": CHEAP_MODEL_ID,
-        "stream": False,
-        "messages": message,
-        "stream_options": {
-            "include_usage": True
-        }
-    })
-    # start_time = datetime.datetime.now()
-
-    CONNECTION.request("POST", "/api/v1/chat/completions", payload, HEADERS)
-    res = CONNECTION.getresponse()
-    obj = json.loads(res.read().decode('utf-8'))
-    # elapsed_time = datetime.datetime.now()-start_time
-    # log(obj)
-    # print("-"*100,f"\nexecuted in {elapsed_time.total_seconds():.4f} seconds")
-    # print("usage:",obj["usage"])
-    try:
-        content=obj["choices"][0]["message"]["content"]
-    except:
-        print("msg=",message)
-        print("obj=",obj)
-        content="胜算云API错误"
-    return content
-
 #test
 # msg=[{"role": "user", "content": "你谁啊"}];print(LLM_invoke(msg))
 
@@ -51,9 +35,22 @@ def LLM_invoke(message,tools=None):
 class GameCLI:
     """游戏命令行类"""
     
-    def __init__(self):
+    def __init__(self, record_dir: str = None, seed: int = None):
         self.state = GameState()
-        self.event_manager = EventManager()
+        # 各子系统的随机数流，种子写入录像
+        self.rng = RandomStreams(seed=seed)
+        self.event_manager = EventManager(self.rng["events"])
+        self.record_dir = record_dir
+        self.seed = seed
+        self.recorder = None
+        if record_dir:
+            path = os.path.join(record_dir, time.strftime("cli-%Y%m%d-%H%M%S.jsonl"))
+            self.recorder = Recorder(path, self.rng.seeds, "cli")
+        # 自动存档：每回合结算后在后台追加增量
+        self.autosave = AutosaveService()
+        # 本局操作历史，用于回退(事件管理器与随机数流一起还原)
+        self.history = StateHistory(event_manager=self.event_manager, streams=self.rng)
+        self.renderer = TerminalRenderer()
 
     def run_turn(self):
         """
@@ -62,6 +59,7 @@ class GameCLI:
         """
         self.state.game_time+=1
         self._start_turn()
+        self.history.record(self.state, f"第{self.state.game_time}年 回合开始")
 
         # 玩家操作阶段
         while True:
@@ -69,7 +67,10 @@ class GameCLI:
             print("\n【操作菜单】")
             print("1. 弟子管理")
             print("2. 宗门建设")
+            print("3. 宗门编年史")
+            print("4. 回退操作")
             print("5. 存档/读档")
+            print("8. 性能统计")
             print("9. 结束回合")
             print("0. 返回主菜单")
 
@@ -81,43 +82,54 @@ class GameCLI:
             elif choice == "2":
                 self._manage_sect()
                 self.refresh()
+            elif choice == "3":
+                self._view_chronicle()
+                self.refresh()
+            elif choice == "4":
+                self._rewind()
+                self.refresh()
             elif choice == "5":
                 self._handle_save_load()
                 self.refresh()
+            elif choice == "8":
+                self._show_profile()
+                self.refresh()
             elif choice == "9":
                 self._end_player_turn()
                 break
             elif choice == "0":
                 return True
             else:
-                self.state.log_message("无效输入。")
+                self.state.log("invalid_input")
         return False
 
     def refresh(self):
-        """显示玩家当前状态"""
-        os.system("cls")
-        print(f"\n --- 第 {self.state.game_time} 年 ---")
-        # print(self.state.sect_data)
-        print("="*50)
-        print(f"【财富】 灵石: {self.state.sect_data['wealth']}/{self.state.max_wealth}")
-        print(f"【弟子】 总数: {self.state.sect_data['disciples_total']}/{self.state.max_disciples} | 空闲: {self.state.idle_disciples}")
-        print(f"【分配】 挖矿: {self.state.sect_data['disciples_mining']} | 招募: {self.state.sect_data['disciples_recruiting']}")
-        print("="*50)
+        """显示玩家当前状态(只重绘变化的行)"""
+        lines = [
+            "",
+            f" --- 第 {self.state.game_time} 年 ---",
+            "="*50,
+            f"【财富】 灵石: {self.state.sect_data['wealth']}/{self.state.max_wealth}",
+            f"【弟子】 总数: {self.state.sect_data['disciples_total']}/{self.state.max_disciples} | 空闲: {self.state.idle_disciples}",
+            f"【分配】 挖矿: {self.state.sect_data['disciples_mining']} | 招募: {self.state.sect_data['disciples_recruiting']}",
+            "="*50,
+        ]
         # 显示日志消息
         if self.state.message_log:
-            print("\n【最近日志】")
-            for log_msg in self.state.message_log[-10:]:  # 只显示最近5条日志
-                print(f"  {log_msg}")
+            lines += ["", "【最近日志】"]
+            lines += [f"  {log_msg}" for log_msg in self.state.message_log.recent(MESSAGE_LOG_DISPLAY)]
+        self.renderer.render(lines)
 
     def _start_turn(self):
         """开始新回合"""
         self.refresh()
         
         # 1. 回合开始 --> LLM生成随机事件
-        event = self.event_manager.check_events(
-            self.state,
-            False # 回合开始触发
-        )
+        with profiler.span("turn.events"):
+            event = self.event_manager.check_events(
+                self.state,
+                False # 回合开始触发
+            )
 
         if event:
             self._handle_event(event)
@@ -136,14 +148,15 @@ class GameCLI:
                 option_id = int(choice)
                 break
             print("无效输入，请重新输入。")
-            
+
+        self._record(f"choose {option_id}")
         result = self.event_manager.resolve_event(
             event,
             option_id,
             self.state
         )
         print(f"\n[结果] {result['message']}")
-        self.state.log_message(f"事件结果: {result['message']}")
+        self.state.log("event_result", result['message'])
         
         if result.get("trigger_dialogue"):
             self._start_dialogue(result["trigger_dialogue"])
@@ -165,27 +178,17 @@ class GameCLI:
             if choice in ["1", "2"]:
                 amount = input("输入派遣人数: ").strip()
                 if not amount.isdigit(): continue
-                amount = int(amount)
                 task = "mining" if choice == "1" else "recruiting"
-                if self.state.idle_disciples >= amount:
-                    self.state.sect_data[f"disciples_{task}"] += amount
-                    msg = "挖矿" if task == "mining" else "招募"
-                    self.state.log_message(f"成功派遣 {amount} 名弟子去{msg}。")
-                else:
-                    self.state.log_message("没有足够的空闲弟子！")
+                self._record(f"dispatch {task} {amount}")
+                if actions.dispatch(self.state, task, int(amount)):
+                    self.history.record(self.state)
             elif choice in ["3", "4"]:
                 task = "mining" if choice == "3" else "recruiting"
                 amount = input("输入召回人数: ").strip()
                 if not amount.isdigit(): continue
-                amount = int(amount)
-                current = self.state.sect_data[f"disciples_{task}"]
-                if current >= amount:
-                    self.state.sect_data[f"disciples_{task}"] -= amount
-                    msg = "挖矿" if task == "mining" else "招募"
-                    self.refresh()
-                    self.state.log_message(f"成功召回 {amount} 名去{msg}的弟子。")
-                else:
-                    self.state.log_message("没有这么多正在工作的弟子！")
+                self._record(f"recall {task} {amount}")
+                if actions.recall(self.state, task, int(amount)):
+                    self.history.record(self.state)
 
     def _manage_sect(self):
         """宗门管理"""
@@ -193,90 +196,186 @@ class GameCLI:
             self.refresh()
             # info = self.game_state.get_display_info()
             print(f"\n【宗门管理】 财富: {self.state.sect_data['wealth']} 灵石")
-            print(f"1. 扩建灵库 (当前上限: {self.state.max_wealth}) - 消耗 10 灵石")
-            print(f"2. 扩建洞府 (当前上限: {self.state.max_disciples}) - 消耗 10 灵石")
+            print(f"1. 扩建灵库 (当前上限: {self.state.max_wealth}) - 消耗 {BUILDING_UPGRADE_COST} 灵石")
+            print(f"2. 扩建洞府 (当前上限: {self.state.max_disciples}) - 消耗 {BUILDING_UPGRADE_COST} 灵石")
             print(f"0. 返回")
             
             choice = input("\n选择操作: ").strip()
             if choice == "0": break
             
             if choice in ["1", "2"]:
-                cost = 10
-                if self.state.sect_data['wealth'] >= cost:
-                    self.state.sect_data['wealth'] -= cost
-                    if choice == "1":
-                        old_max_wealth = self.state.max_wealth
-                        self.state.sect_data["vault_level"] += 1
-                        new_max_wealth = self.state.max_wealth
-                        self.refresh()
-                        self.state.log_message(f"灵库扩建成功！上限 {old_max_wealth} → {new_max_wealth}")
-                    else:
-                        old_max_disciples = self.state.max_disciples
-                        self.state.sect_data["cave_level"] += 1
-                        new_max_disciples = self.state.max_disciples
-                        self.state.log_message(f"洞府扩建成功！上限 {old_max_disciples} → {new_max_disciples}")
-                else:
-                    self.state.log_message(f"灵石不足，扩建需要 {cost} 灵石。")
+                building = "vault" if choice == "1" else "cave"
+                self._record(f"upgrade {building}")
+                if actions.upgrade(self.state, building):
+                    self.history.record(self.state)
+
+    def _rewind(self):
+        """回退到本局之前的某次操作(不读写磁盘)"""
+        labels = self.history.labels()
+        # 最后一个标记就是当前状态，至少要有一个更早的标记
+        if len(labels) < 2:
+            self.state.log("rewind_none")
+            return
+        first = max(0, len(labels) - 1 - REWIND_PAGE_SIZE)
+        print("\n【操作历史】(越往下越新)")
+        for i in range(first, len(labels) - 1):
+            print(f"{i - first + 1}. {labels[i]}")
+        choice = input("\n选择要回退到的编号(回车返回): ").strip()
+        if not choice:
+            return
+        if not (choice.isdigit() and 1 <= int(choice) <= len(labels) - 1 - first):
+            self.state.log("invalid_choice")
+            return
+        index = first + int(choice) - 1
+        self._stop_recording("回退")
+        # 等后台自动存档写完再改动状态，回退后的状态作为新一代自动存档的起点
+        self.autosave.flush()
+        self.history.rewind(self.state, index)
+        self.autosave.reset(self.state)
+        self.state.log("rewind", labels[index])
+
+    def _view_chronicle(self):
+        """宗门编年史：搜索关键词或按年份浏览完整历史"""
+        while True:
+            self.refresh()
+            chronicle = self.state.chronicle
+            print(f"\n【宗门编年史】 共 {len(chronicle)} 条记录")
+            print("1. 搜索关键词")
+            print("2. 跳转到年份")
+            print("0. 返回")
+
+            choice = input("\n选择操作: ").strip()
+            if choice == "0": break
+
+            if choice == "1":
+                query = input("输入关键词: ").strip()
+                if not query: continue
+                self._page_entries(f"搜索“{query}”", chronicle.search(query))
+            elif choice == "2":
+                year = input("输入年份: ").strip()
+                if not year.isdigit(): continue
+                start = chronicle.first_entry_of_year(int(year))
+                entry_ids = iter(range(start, len(chronicle))) if start is not None else iter(())
+                self._page_entries(f"第{year}年起", entry_ids)
+
+    def _page_entries(self, title: str, entry_ids):
+        """分页显示编年史记录，entry_ids 为按需产出记录编号的迭代器"""
+        chronicle = self.state.chronicle
+        fetched = []
+        page = 0
+        while True:
+            # 多取一条用于判断是否还有下一页
+            need = (page + 1) * CHRONICLE_PAGE_SIZE + 1 - len(fetched)
+            if need > 0:
+                fetched.extend(islice(entry_ids, need))
+            start = page * CHRONICLE_PAGE_SIZE
+            has_next = len(fetched) > start + CHRONICLE_PAGE_SIZE
+
+            self.refresh()
+            print(f"\n【编年史 · {title}】 第 {page + 1} 页")
+            if not fetched:
+                print("  没有找到相关记录。")
+            for entry_id in fetched[start:start + CHRONICLE_PAGE_SIZE]:
+                print(f"  {chronicle.format(entry_id)}")
+
+            print("\nn. 下一页  p. 上一页  0. 返回")
+            choice = input("\n选择操作: ").strip().lower()
+            if choice == "0": break
+            if choice == "n" and has_next:
+                page += 1
+            elif choice == "p" and page > 0:
+                page -= 1
 
     def LLM_summary(self):
         """使用LLM总结当前游戏状态"""
         messages = [
             {"role": "system", "content": ("你是一名小说家，请根据当前游戏状态以及本年度的玩家行动日志，写一段仙侠风的简短的年度总结\n"
                 "当前游戏状态：\n"
-                f"{self.state.to_dict()}\n"
+                f"{self.state.to_prompt()}\n"
                 "玩家操作日志：\n"
-                f"{self.state.message_log[-10:]}\n" )},
+                + "\n".join(self.state.message_log.recent(MESSAGE_LOG_DISPLAY)) + "\n")},
             # {"role": "user", "content": self.state.to_dict()}
         ]
-        response = LLM_invoke(messages)
-        self.state.log_message(f"LLM 总结：{response}")
+        return LLM_invoke(messages)
+
+    def LLM_turn(self):
+        """一次LLM请求完成年度总结，并预先生成下一年的事件及其结果"""
+        plan = plan_turn(self.state)
+        if plan["chronicle"] is None:
+            # 批量协议失败时退回单独的总结请求
+            plan["chronicle"] = self.LLM_summary()
+        if self.recorder:
+            self.recorder.plan(plan)
+        self.event_manager.pending_event = actions.apply_plan(self.state, plan)
+        if self.recorder:
+            self.recorder.turn(self.state)
+
+    def _record(self, command: str):
+        """录制一条与服务器文本命令等价的玩家操作"""
+        if self.recorder:
+            self.recorder.command(command)
+
+    def _stop_recording(self, reason: str):
+        """状态被整体替换(读档、回退)后录像无法重现，停止录制"""
+        if self.recorder:
+            self.recorder.close()
+            self.state.log("record_stop", reason)
+            self.recorder = None
 
     def _end_player_turn(self):
         """结束回合"""
         print("\n回合结束，结算中...")
         
-        # 1. 模拟弟子工作产出
-        # 挖矿产出
-        mining_gain = self.state.sect_data["disciples_mining"] * 2
-        if mining_gain > 0:
-            self.state.gain_wealth(mining_gain)
-            self.state.log_message(f"弟子挖矿产出: {mining_gain} 灵石")
-
-        # 招募产出
-        recruiting_disciples = self.state.sect_data["disciples_recruiting"]
-        if recruiting_disciples > 0:
-            new_disciples = 0
-            for _ in range(recruiting_disciples):
-                if self.state.sect_data["disciples_total"] < self.state.max_disciples:
-                    if random.random() < RECRUITMENT_BASE_GAIN: # 3% 几率招募成功
-                        new_disciples += 1
-                        self.state.sect_data["disciples_total"] += 1
-            if new_disciples > 0:
-                self.state.log_message(f"招募弟子成功：新增 {new_disciples} 名弟子！")
-            else:
-                self.state.log_message("本轮未招募到新弟子。")
-
-        # 弟子俸禄
-        self.state.sect_data["wealth"] -= self.state.sect_data["disciples_total"] * DISCIPLE_BASE_WAGE
-
-        self.LLM_summary()
+        # 弟子工作产出、俸禄与本回合指标
+        self._record("end")
+        with profiler.span("turn.settle"):
+            actions.settle_turn(self.state, self.rng["recruit"])
+        with profiler.span("turn.llm"):
+            self.LLM_turn()
+        with profiler.span("turn.autosave"):
+            self.autosave.submit(self.state)
+        if self.autosave.last_error:
+            self.state.log("save_result", self.autosave.last_error)
+            self.autosave.last_error = None
+        profiler.end_turn(self.state.game_time)
         print("结算完成。")
         input("\n按回车进入下一回合...")
 
+    def _show_profile(self):
+        """显示各阶段耗时(次数、p50、p95、最慢)"""
+        self.renderer.render(["", "【性能统计】", *profiler.summary_lines()])
+        input("\n按回车返回...")
+
     def run(self):
         """游戏主界面与主循环"""
         while True:
-            os.system("cls")
-            print("="*50,"\n      欢迎来到《仙宗 - 修仙模拟器》\n","="*50)
-            print("1. 开始新游戏\n2. 读取存档\n0. 退出游戏\n","="*50)
+            self.renderer.render(["="*50, "      欢迎来到《仙宗 - 修仙模拟器》", "="*50])
+            print("1. 开始新游戏\n2. 读取存档\n3. 继续上次游戏(自动存档)\n0. 退出游戏\n","="*50)
             
             menu_choice = input("\n请选择操作: ").strip()
             
             if menu_choice == "1":
-                self.__init__()
+                self.autosave.close()
+                self._close_recording()
+                self.__init__(self.record_dir, self.seed)
             elif menu_choice == "2":
                 self.load_save()
+            elif menu_choice == "3":
+                self.autosave.close()
+                self._stop_recording("继续上次游戏")
+                journal, result = open_journal()
+                self.autosave = AutosaveService(journal)
+                self.history.clear()
+                if not result["success"]:
+                    print(result["message"])
+                    input("\n按回车返回...")
+                    continue
+                self.state = result["state"]
             elif menu_choice == "0":
+                # 退出前写完所有待写的自动存档
+                self.autosave.close()
+                self._close_recording()
+                self.renderer.close()
                 print("\n感谢游玩，江湖再见！")
                 break
             else:
@@ -287,10 +386,18 @@ class GameCLI:
                 if self.run_turn():
                     break
 
+    def _close_recording(self):
+        """一局结束，写入结尾校验"""
+        if self.recorder:
+            self.recorder.close(self.state)
+            self.recorder = None
+
     def _handle_save_load(self):
         """处理存档读档"""
         print("\n1. 存档")
         print("2. 读档")
+        print("3. 存为分支")
+        print("4. 读取分支")
         print("0. 返回")
         choice = input("\n选择: ").strip()
         
@@ -299,50 +406,103 @@ class GameCLI:
                 print(f"槽位 {i}")
             slot = input("选择存档槽位 (1-3): ").strip()
             if slot in ["1", "2", "3"]:
-                res = save_game(self.state.to_dict(), int(slot))
-                self.state.log_message(f"{res['message']}")
+                res = save_game(self.state, int(slot))
+                self.state.log("save_result", res['message'])
             else:
-                self.state.log_message("无效的输入")
+                self.state.log("invalid_choice")
         elif choice == "2":
             self.load_save()
             self.refresh()
+        elif choice == "3":
+            name = input("输入分支名: ").strip()
+            res = SaveStore().save_branch(self.state.to_dict(), name)
+            self.state.log("save_result", res['message'])
+        elif choice == "4":
+            self.load_branch()
+            self.refresh()
+
+    def load_branch(self):
+        """读取分支存档"""
+        store = SaveStore()
+        branches = store.list_branches()
+        if not branches:
+            self.state.log("no_saves")
+            return
+
+        print("\n【分支列表】")
+        for i, branch in enumerate(branches, 1):
+            print(f"{i}. {branch['name']} 年份：{branch['game_time']} 保存时间：{branch['save_time']}")
+
+        choice = input("\n选择要读取的分支编号: ").strip()
+        if not (choice.isdigit() and 1 <= int(choice) <= len(branches)):
+            self.state.log("invalid_slot")
+            return
+        name = branches[int(choice) - 1]["name"]
+        res = store.load_branch(name)
+        if res["success"]:
+            self._apply_save_data(res["data"])
+            self.state.log("load_ok", name)
+        else:
+            self.state.log("load_fail", res["message"])
 
     def load_save(self):
         """读取存档"""
         files = get_save_files()
         if not files:
-            self.state.log_message("没有发现存档文件。")
+            self.state.log("no_saves")
             return
         
         print("\n【存档列表】")
         # 按槽位号排序显示
         for slot in sorted(files.keys()):
             f = files[slot]
-            print(f"{slot}. 年份：{f['game_time']} 保存时间：{f['save_time']}")
+            print(f"{slot}. 年份：{f['game_time']} 弟子：{f['disciples_total']} 保存时间：{f['save_time']}")
         
         choice = input("\n选择要读取的存档编号: ").strip()
         if choice.isdigit():
             slot = int(choice)
             if slot in files:
                 selected_file = files[slot]
+                # 列表只含元数据，选定后才从存档库读取完整状态
+                res = load_save_state(slot)
                 try:
-                    # 直接使用get_save_files()中已经读取的数据
-                    self._apply_save_data(selected_file["data"]["state"])
-                    self.state.log_message(f"读档成功！从 {selected_file['filename']} 读取")
+                    if not res["success"]:
+                        raise IOError(res["message"])
+                    self._apply_state(res["state"])
+                    self.state.log("load_ok", selected_file['filename'])
                 except Exception as e:
-                    self.state.log_message(f"读档失败：{str(e)}")
+                    self.state.log("load_fail", str(e))
             else:
-                self.state.log_message("无效的存档编号")
+                self.state.log("invalid_slot")
         else:
-            self.state.log_message("无效的输入")
+            self.state.log("invalid_choice")
 
     def _apply_save_data(self, data: dict):
         """恢复存档数据"""
-        self.state = GameState.from_dict(data)
+        self._apply_state(GameState.from_dict(data))
         # event_data = data.get("event_manager", {})
         # self.event_manager.last_secret_realm_year = event_data.get("last_secret_realm_year", 0)
 
+    def _apply_state(self, state: GameState):
+        """切换到读入的状态"""
+        self._stop_recording("读档")
+        self.state = state
+        # 自动存档以读入的状态为新的起点
+        self.autosave.reset(self.state)
+        self.history.clear()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="仙宗 - 修仙模拟器")
+    parser.add_argument("--record", nargs="?", const=REPLAY_DIR, help=f"录制对局的目录(默认 {REPLAY_DIR})")
+    parser.add_argument("--seed", type=int, help="随机数总种子")
+    parser.add_argument("--profile", action="store_true", help="每回合导出各阶段耗时")
+    parser.add_argument("--tracemalloc", action="store_true", help="同时用 tracemalloc 记录每回合的内存分配(较慢)")
+    args = parser.parse_args(argv)
+    if args.profile or args.tracemalloc:
+        profiler.configure(PROFILE_JSONL, PROFILE_PROMETHEUS, trace_memory=args.tracemalloc)
+    GameCLI(args.record, args.seed).run()
+
 
 if __name__ == "__main__":
-    game = GameCLI()
-    game.run()
\ No newline at end of file
+    main()
\ No newline at end of file
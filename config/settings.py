@@ -10,7 +10,10 @@ with open("api_key.json", "rb") as f:
 CHEAP_MODEL_ID= "bytedance/doubao-seed-1.6-flash"
 
 # 连接配置
-CONNECTION = http.client.HTTPSConnection("router.shengsuanyun.com")
+LLM_HOST = "router.shengsuanyun.com"
+LLM_PORT = 443
+LLM_POOL_SIZE = 32  # 异步接口共用的最大连接数(多会话服务器中所有会话共用)
+CONNECTION = http.client.HTTPSConnection(LLM_HOST)
 HEADERS = {
    'HTTP-Referer': 'https://www.postman.com',
    'X-Title': 'Postman',
@@ -23,6 +26,13 @@ RECRUITMENT_BASE_GAIN=0.03
 
 DISCIPLE_BASE_WAGE = 0.6
 
+BUILDING_UPGRADE_COST = 10  # 扩建灵库/洞府消耗的灵石
+
+# LLM回合配置 (一次请求同时生成年度总结与下一年事件)
+LLM_EVENT_MAX_OPTIONS = 3  # 事件最多选项数
+LLM_EVENT_MAX_WEALTH_DELTA = 50  # 单个选项灵石变化上限(绝对值)
+LLM_EVENT_MAX_DISCIPLE_DELTA = 5  # 单个选项弟子变化上限(绝对值)
+
 
 # 屏幕设置
 SCREEN_WIDTH = 1600
@@ -103,6 +113,7 @@ EVENT_SECRET_REALM_MIN_REALM = 2  # 最低境界要求(金丹期)
 # NPC配置
 NPCS = {
     "master": {
+        "persona": "你是玄真道人，主角的师傅，一位道行高深、言语简练的老道，常以道家箴言点拨弟子。",
         "name": "玄真道人",
         "title": "师傅",
         "dialogues": [
@@ -112,6 +123,7 @@ NPCS = {
         ],
     },
     "merchant": {
+        "persona": "你是云游商贾，走南闯北的修真界商人，精明圆滑，三句不离生意与宝物。",
         "name": "云游商贾",
         "title": "商人",
         "dialogues": [
@@ -121,6 +133,7 @@ NPCS = {
         ],
     },
     "friend": {
+        "persona": "你是李逍遥，主角的同辈道友，洒脱不羁、好切磋，喜欢打听江湖传闻。",
         "name": "李逍遥",
         "title": "道友",
         "dialogues": [
@@ -131,6 +144,26 @@ NPCS = {
     },
 }
 
+# 日志配置
+MESSAGE_LOG_CAPACITY = 100  # 消息日志保留条数
+MESSAGE_LOG_DISPLAY = 10  # 界面与提示词中显示的最近日志条数
+CHRONICLE_PAGE_SIZE = 10  # 编年史每页显示条数
+METRICS_CAPACITY = 4096  # 指标表最多行数，超出后隔行降采样
+REWIND_CAPACITY = 300  # 本局内可回退的最近操作数
+REWIND_PAGE_SIZE = 15  # 回退列表每次显示的条数
+
+# 终端渲染配置
+RENDER_MIN_INPUT_ROWS = 8  # 固定的状态区下方至少留给菜单与输入的行数，不够时退回整屏重画
+RENDER_WIDTH_CACHE = 4096  # 缓存显示宽度/折行结果的文本条数
+
+# NPC对话配置
+DIALOGUE_TAIL_MESSAGES = 6  # 每次请求附带的最近对话条数(人设前缀之后的滚动尾部)
+DIALOGUE_MAX_WORKERS = 4  # 多名NPC同时回复时的并发数
+DIALOGUE_FULL_HISTORY = False  # True时每次发送完整对话历史(旧方式，用于对比测量)
+DIALOGUE_WINDOW = 20  # 对话历史保留的最近条数，更早的折叠为摘要
+DIALOGUE_SUMMARY_CHARS = 300  # 对话摘要的最大字数(超出时保留最近的部分)
+DIALOGUE_SUMMARY_SNIPPET = 24  # 折叠进摘要时每条对话保留的字数
+
 # 商店物品
 SHOP_ITEMS = {
     "回灵丹": {"price": 50, "effect": "restore_spiritual", "value": 50, "desc": "恢复50点灵力"},
@@ -153,5 +186,69 @@ BUTTON_MARGIN = 10
 FONT_SIZE_LARGE = 28
 FONT_SIZE_MEDIUM = 22
 FONT_SIZE_SMALL = 18
-
-SAVE_DIR = "saves"
\ No newline at end of file
+FONT_PATH = None  # 中文字体文件路径，None 时按常见中文字体名查找系统字体
+FONT_CANDIDATES = ("microsoftyahei", "simhei", "simsun", "notosanscjksc", "notosanssc",
+                   "sourcehansanssc", "wenquanyimicrohei", "pingfangsc")
+
+# 图形界面配置
+UI_TEXT_CACHE = 512  # 缓存的整行文字表面数
+UI_TYPE_SPEED = 40  # LLM 文字逐字显示速度(字/秒)
+UI_STORY_RECT = (300, 10, 1290, 420)  # LLM 叙事区
+UI_LOG_RECT = (300, 440, 1290, 450)  # 日志区
+UI_STATS_RECT = (10, 860, 280, 30)  # 帧时间统计
+
+SAVE_DIR = "saves"
+SAVE_DB = "saves/saves.db"  # 存档库(旧的 save_*.json 首次启动时自动导入)
+
+# 自动存档日志配置
+JOURNAL_DIR = "saves/journal"
+JOURNAL_SNAPSHOT_EVERY = 50  # 每隔多少回合写一次完整快照
+JOURNAL_FSYNC_EVERY = 5  # 每追加多少条增量同步一次磁盘
+JOURNAL_KEEP_GENERATIONS = 2  # 保留最近几代快照及其日志段
+
+# 分支存档配置(按内容寻址去重)
+STORE_DIR = "saves/store"
+STORE_CHRONICLE_CHUNK = 1024  # 编年史每块记录数，各分支共享相同的历史前缀块
+
+# 跨存档统计配置
+ANALYTICS_CACHE = "saves/analytics_cache.db"  # 各存档已提取指标列的缓存
+ANALYTICS_INLINE_FILES = 8  # 待解析文件不超过该数时不启动进程池
+
+# 多会话服务器配置
+SERVER_HOST = "127.0.0.1"
+SERVER_PORT = 8765
+SERVER_MAX_LINE = 1024  # 单条命令最大字节数
+SERVER_PARK_AFTER = 30.0  # 会话空闲多少秒后换出到磁盘
+PARK_DB = "saves/parked.db"  # 换出会话的回合状态图检查点
+CHECKPOINT_DB = "saves/checkpoints.db"  # 逐步持久化的状态图检查点(graph.checkpoint.IncrementalSaver)
+
+# 对局录像配置
+REPLAY_DIR = "saves/replays"
+REPLAY_INLINE_FILES = 8  # 待回放录像不超过该数时不启动进程池
+
+# 分阶段计时配置
+PROFILER_ENABLED = True
+PROFILER_WINDOW = 1024  # 每个阶段保留最近多少次耗时用于计算分位数
+PROFILER_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0)  # 直方图上界(秒)
+PROFILER_TRACEMALLOC_TOP = 10  # 每回合记录新增分配最多的代码位置数
+PROFILE_JSONL = "saves/profile.jsonl"  # 每回合各阶段耗时
+PROFILE_PROMETHEUS = "saves/profile.prom"  # Prometheus 文本格式的直方图
+
+# 微基准配置(bench.micro)
+BENCH_BASELINE = "saves/bench_baseline.json"  # 基线结果(与机器相关，不随代码提交)
+BENCH_THRESHOLD = 0.15  # 比基线慢超过该比例视为退步
+BENCH_REPEAT = 5  # 每个用例重复测量的次数，取最快一次
+BENCH_MIN_TIME = 0.1  # 每次测量至少运行的秒数(自动调整循环次数)
+
+# 浸泡测试配置(bench.soak)
+SOAK_TURNS = 100000
+SOAK_INTERVAL = 1000  # 每隔多少回合采样一次
+SOAK_WARMUP = 5000  # 拟合斜率时跳过的前若干回合
+# 各项指标每千回合允许的最大增量
+SOAK_SLOPES = {
+    "rss": 2 * 1024 * 1024,  # 常驻内存(字节)，编年史约占每千回合 1.2MB
+    "objects": 2000,  # 存活对象数
+    "latency": 10e-6,  # 平均回合耗时(秒)
+    "save": 64 * 1024,  # 存档大小(字节)，编年史约占每千回合 22KB
+    "prompt": 20,  # LLM 提示词长度(字)
+}
@@ -0,0 +1,157 @@
+"""玩家操作与回合结算
+
+命令行与图形界面共用的游戏规则，只修改 GameState 并写日志，不做任何输入输出。
+perform / choose 解析文本命令(多会话服务器与回合状态图使用)，返回 {"success": bool, "message": str, ...}。
+"""
+import random
+from typing import Optional
+
+from config.settings import (
+    RECRUITMENT_BASE_GAIN, DISCIPLE_BASE_WAGE, BUILDING_UPGRADE_COST, MESSAGE_LOG_DISPLAY,
+)
+from core.game_state import GameState
+
+TASK_NAMES = {"mining": "挖矿", "recruiting": "招募"}
+BUILDINGS = ("vault", "cave")
+
+
+def dispatch(state: GameState, task: str, amount: int) -> bool:
+    """派遣空闲弟子去 mining / recruiting"""
+    if state.idle_disciples < amount:
+        state.log("dispatch_fail")
+        return False
+    state.sect_data[f"disciples_{task}"] += amount
+    state.log("dispatch", amount, TASK_NAMES[task])
+    return True
+
+
+def recall(state: GameState, task: str, amount: int) -> bool:
+    """召回正在 mining / recruiting 的弟子"""
+    if state.sect_data[f"disciples_{task}"] < amount:
+        state.log("recall_fail")
+        return False
+    state.sect_data[f"disciples_{task}"] -= amount
+    state.log("recall", amount, TASK_NAMES[task])
+    return True
+
+
+def upgrade(state: GameState, building: str) -> bool:
+    """扩建灵库(vault)或洞府(cave)"""
+    if state.sect_data["wealth"] < BUILDING_UPGRADE_COST:
+        state.log("upgrade_fail", BUILDING_UPGRADE_COST)
+        return False
+    state.sect_data["wealth"] -= BUILDING_UPGRADE_COST
+    if building == "vault":
+        old_max_wealth = state.max_wealth
+        state.sect_data["vault_level"] += 1
+        state.log("vault_upgrade", old_max_wealth, state.max_wealth)
+    else:
+        old_max_disciples = state.max_disciples
+        state.sect_data["cave_level"] += 1
+        state.log("cave_upgrade", old_max_disciples, state.max_disciples)
+    return True
+
+
+def settle_turn(state: GameState, rng=random):
+    """
+    回合结算：挖矿产出、招募、弟子俸禄，并记录本回合指标
+    rng: 招募判定使用的随机数源(random.Random 或 random 模块)
+    """
+    # 挖矿产出
+    mining_gain = state.sect_data["disciples_mining"] * 2
+    if mining_gain > 0:
+        state.gain_wealth(mining_gain)
+        state.log("mining_gain", mining_gain)
+
+    # 招募产出
+    recruiting_disciples = state.sect_data["disciples_recruiting"]
+    if recruiting_disciples > 0:
+        new_disciples = 0
+        for _ in range(recruiting_disciples):
+            if state.sect_data["disciples_total"] < state.max_disciples:
+                if rng.random() < RECRUITMENT_BASE_GAIN:  # 3% 几率招募成功
+                    new_disciples += 1
+                    state.sect_data["disciples_total"] += 1
+        if new_disciples > 0:
+            state.log("recruit_success", new_disciples)
+        else:
+            state.log("recruit_none")
+
+    # 弟子俸禄
+    state.sect_data["wealth"] -= state.sect_data["disciples_total"] * DISCIPLE_BASE_WAGE
+
+    state.log_data()
+
+
+def _reply(success: bool, message: str, **extra) -> dict:
+    return {"success": success, "message": message, **extra}
+
+
+def status(state: GameState, event: Optional[dict] = None) -> dict:
+    """宗门状况(回复给客户端的摘要)"""
+    sect = state.sect_data
+    return {
+        "year": state.game_time,
+        "wealth": sect["wealth"],
+        "max_wealth": state.max_wealth,
+        "disciples": sect["disciples_total"],
+        "max_disciples": state.max_disciples,
+        "mining": sect["disciples_mining"],
+        "recruiting": sect["disciples_recruiting"],
+        "event": event,
+    }
+
+
+def _last_log(state: GameState) -> str:
+    return state.message_log.recent(1)[-1]
+
+
+def perform(state: GameState, command: str) -> dict:
+    """
+    执行一条文本命令：status / log [N] / dispatch|recall mining|recruiting N / upgrade vault|cave
+    结束回合(end)与处理事件(choose)由调用方负责
+    """
+    parts = command.split()
+    if not parts:
+        return _reply(False, "请输入命令")
+    name, args = parts[0].lower(), parts[1:]
+
+    if name == "status":
+        return _reply(True, f"第 {state.game_time} 年", state=status(state))
+    if name == "log":
+        count = int(args[0]) if args and args[0].isdigit() else MESSAGE_LOG_DISPLAY
+        return _reply(True, "\n".join(state.message_log.recent(count)))
+    if name in ("dispatch", "recall"):
+        if len(args) != 2 or args[0] not in TASK_NAMES or not args[1].isdigit() or int(args[1]) <= 0:
+            return _reply(False, f"用法：{name} mining|recruiting 人数")
+        func = dispatch if name == "dispatch" else recall
+        return _reply(func(state, args[0], int(args[1])), _last_log(state))
+    if name == "upgrade":
+        if len(args) != 1 or args[0] not in BUILDINGS:
+            return _reply(False, "用法：upgrade vault|cave")
+        return _reply(upgrade(state, args[0]), _last_log(state))
+    return _reply(False, "未知命令")
+
+
+def choose(state: GameState, event_manager, event: dict, command: str) -> dict:
+    """处理事件命令 choose N，成功时 success 为 True"""
+    parts = command.split()
+    if len(parts) != 2 or parts[0].lower() != "choose" or not parts[1].isdigit() \
+            or int(parts[1]) >= len(event["options"]):
+        return _reply(False, "请选择事件选项：choose 编号", event=event)
+    result = event_manager.resolve_event(event, int(parts[1]), state)
+    state.log("event_result", result["message"])
+    return _reply(True, result["message"])
+
+
+def apply_plan(state: GameState, plan: Optional[dict], error: Optional[Exception] = None) -> Optional[dict]:
+    """
+    记录LLM回合推演的结果，返回下一年的事件
+    plan 为 None 表示推演失败(error 为原因)
+    """
+    if plan is None:
+        state.log("llm_fail", error)
+        return None
+    if plan["chronicle"]:
+        state.log("llm_summary", plan["chronicle"])
+    return plan["event"]
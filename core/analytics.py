@@ -0,0 +1,386 @@
+"""跨存档统计
+
+对一批已结束的存档(目录下的 save_*.json、二进制 *.sav 与存档库 saves.db 中的各槽位)做批量统计，例如
+「灵库达到 10 级的年份的中位数」：
+
+    python -m core.analytics saves/archive "first_year(vault_level>=10)" --percentiles 50 90
+    python -m core.analytics saves/archive "final(wealth)" --hist 20 --group-by "final(cave_level)"
+
+每局先按指标表算出一个值(见 parse_metric)，再对所有局的值求分位数、直方图与分组统计。
+存档库中的槽位记为「库文件路径#槽位」，按只读方式打开；库文件一有变化，其中所有槽位的缓存一并失效。
+解析存档在进程池中进行，子进程只解码指标表中查询需要的列、只把这些列传回；
+提取出的列按文件路径、修改时间与大小缓存在 SQLite 中，重复查询不再解析存档。
+"""
+import argparse
+import json
+import lzma
+import math
+import os
+import re
+import sqlite3
+import statistics
+import zlib
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+from config.settings import ANALYTICS_CACHE, ANALYTICS_INLINE_FILES, SAVE_DB
+from core.binary_save import read_section
+from core.metrics import METRIC_COLUMNS
+
+_TYPECODES = dict(METRIC_COLUMNS)
+_METRIC = re.compile(r"^\s*(final|max|min|mean|first_year)\(\s*(\w+)\s*(?:(>=|<=|==|>|<)\s*(-?[\d.]+)\s*)?\)\s*$")
+_COMPARE = {
+    ">=": lambda a, b: a >= b,
+    "<=": lambda a, b: a <= b,
+    "==": lambda a, b: a == b,
+    ">": lambda a, b: a > b,
+    "<": lambda a, b: a < b,
+}
+
+_CACHE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS columns (
+    path TEXT NOT NULL,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (path, name)
+);
+"""
+
+
+# ---- 每局的指标 ----
+
+def parse_metric(expr: str) -> tuple:
+    """
+    解析每局指标表达式，返回 (函数, 列名, 比较符, 阈值)
+    final/max/min/mean(列)；first_year(列 比较符 数值) 为首次满足条件的年份
+    """
+    match = _METRIC.match(expr)
+    if not match:
+        raise ValueError(f"无法解析的指标: {expr}")
+    func, column, op, value = match.groups()
+    if column not in _TYPECODES:
+        raise ValueError(f"未知的指标列: {column}")
+    if (func == "first_year") != (op is not None):
+        raise ValueError("只有 first_year 需要且必须带比较条件")
+    return func, column, op, float(value) if value is not None else None
+
+
+def metric_columns(metric: tuple) -> set:
+    """计算该指标需要的列"""
+    func, column, _, _ = metric
+    return {column, "year"} if func == "first_year" else {column}
+
+
+def evaluate_metric(metric: tuple, columns: dict) -> Optional[float]:
+    """对一局的指标列求值，没有数据或条件从未满足时返回 None"""
+    func, column, op, value = metric
+    values = columns.get(column)
+    if not values:
+        return None
+    if func == "final":
+        return values[-1]
+    if func == "max":
+        return max(values)
+    if func == "min":
+        return min(values)
+    if func == "mean":
+        return math.fsum(values) / len(values)
+    compare = _COMPARE[op]
+    for i, v in enumerate(values):
+        if compare(v, value):
+            return columns["year"][i]
+    return None
+
+
+# ---- 存档库中的槽位 ----
+
+_DATABASE_NAME = os.path.basename(SAVE_DB)
+
+
+def _split_slot(path: str) -> tuple:
+    """「库文件路径#槽位」拆分为 (库文件路径, 槽位)，普通存档文件返回 (路径, None)"""
+    file_path, sep, slot = path.rpartition("#")
+    if sep and os.path.basename(file_path) == _DATABASE_NAME and slot.isdigit():
+        return file_path, int(slot)
+    return path, None
+
+
+def _connect_readonly(path: str) -> sqlite3.Connection:
+    return sqlite3.connect(f"file:{os.path.abspath(path)}?mode=ro", uri=True)
+
+
+def _database_slots(path: str) -> list:
+    """存档库中的各槽位，记为「库文件路径#槽位」；无法读取的库返回空列表"""
+    try:
+        conn = _connect_readonly(path)
+        try:
+            return [f"{path}#{slot}" for slot, in conn.execute("SELECT slot FROM saves ORDER BY slot")]
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return []
+
+
+# ---- 提取指标列(在子进程中执行) ----
+
+def _extract_columns(path: str, names: tuple) -> dict:
+    """从存档中只解码需要的指标列，返回 {列名: 原始字节}；没有指标表的旧存档各列为空(同样缓存)"""
+    file_path, slot = _split_slot(path)
+    if slot is not None:
+        conn = _connect_readonly(file_path)
+        try:
+            row = conn.execute("SELECT rowid FROM saves WHERE slot = ?", (slot,)).fetchone()
+            if row is None:
+                raise KeyError(f"槽位 {slot} 不存在")
+            with conn.blobopen("saves", "state", row[0], readonly=True) as blob:
+                store = read_section(blob, "data_log")
+        finally:
+            conn.close()
+        return {name: store.columns[name].tobytes() for name in names}
+    if path.endswith(".sav"):
+        with open(path, "rb") as f:
+            store = read_section(f, "data_log")
+        return {name: store.columns[name].tobytes() for name in names}
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    # 槽位存档外面还包了一层 {"save_time", "state"}，自动存档快照直接是状态
+    data_log = data.get("state", data).get("data_log")
+    if not isinstance(data_log, dict):
+        return {name: b"" for name in names}
+    columns = data_log.get("columns", {})
+    return {name: array(_TYPECODES[name], columns.get(name, [])).tobytes() for name in names}
+
+
+def _extract_worker(task: tuple) -> tuple:
+    path, names = task
+    try:
+        return path, _extract_columns(path, names), None
+    except (OSError, ValueError, KeyError, TypeError, AttributeError, StopIteration,
+            sqlite3.Error, zlib.error, lzma.LZMAError) as e:
+        # 损坏或截断的存档可能在解压、分帧、解码的任何一步出错，记为解析失败，不影响其余存档
+        return path, {}, str(e)
+
+
+# ---- 列缓存 ----
+
+class ColumnCache:
+    """已提取指标列的缓存，文件修改时间或大小变化后失效"""
+
+    def __init__(self, path: str = ANALYTICS_CACHE):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path)
+        self._conn.executescript(_CACHE_SCHEMA)
+
+    def get(self, path: str, stat: os.stat_result, names: tuple) -> Optional[dict]:
+        """全部列都命中时返回 {列名: 原始字节}，否则返回 None"""
+        rows = self._conn.execute(
+            f"SELECT name, data FROM columns WHERE path = ? AND mtime = ? AND size = ? "
+            f"AND name IN ({','.join('?' * len(names))})",
+            (path, stat.st_mtime, stat.st_size, *names)).fetchall()
+        return dict(rows) if len(rows) == len(names) else None
+
+    def put_many(self, entries: list):
+        """entries: [(路径, stat, {列名: 原始字节})]"""
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO columns VALUES (?, ?, ?, ?, ?)",
+                [(path, stat.st_mtime, stat.st_size, name, data)
+                 for path, stat, columns in entries for name, data in columns.items()])
+
+    def close(self):
+        self._conn.close()
+
+
+# ---- 汇总 ----
+
+def find_saves(root: str) -> list:
+    """
+    目录(递归)下的所有存档文件与存档库槽位，也可直接给出单个文件
+    JSON 只认 save_*.json，自动存档快照、分支存档清单等其他 JSON 文件不是完整存档
+    """
+    if os.path.isfile(root):
+        return _database_slots(root) if os.path.basename(root) == _DATABASE_NAME else [root]
+    paths = []
+    for directory, _, filenames in os.walk(root):
+        for name in filenames:
+            path = os.path.join(directory, name)
+            if name.endswith(".sav") or (name.startswith("save_") and name.endswith(".json")):
+                paths.append(path)
+            elif name == _DATABASE_NAME:
+                paths.extend(_database_slots(path))
+    return sorted(paths)
+
+
+def percentile(sorted_values: list, p: float) -> float:
+    """线性插值分位数(p 取 0-100)，输入需已排序"""
+    if len(sorted_values) == 1:
+        return sorted_values[0]
+    position = (len(sorted_values) - 1) * p / 100
+    lower = math.floor(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def histogram(values: list, bins: int) -> list:
+    """等宽直方图，返回 [(区间下界, 区间上界, 数量)]"""
+    low, high = min(values), max(values)
+    width = (high - low) / bins or 1
+    counts = [0] * bins
+    for value in values:
+        counts[min(int((value - low) / width), bins - 1)] += 1
+    return [(low + i * width, low + (i + 1) * width, count) for i, count in enumerate(counts)]
+
+
+def _summarize(values: list, percentiles) -> dict:
+    values = sorted(values)
+    return {
+        "count": len(values),
+        "mean": statistics.fmean(values) if values else None,
+        "percentiles": {p: percentile(values, p) for p in percentiles} if values else {},
+    }
+
+
+def load_columns(paths: list, names: tuple, workers: Optional[int] = None,
+                 cache: Optional[ColumnCache] = None) -> tuple:
+    """
+    读取各存档的指标列：先查缓存，未命中的文件交给进程池解析
+    返回: ({路径: {列名: array}}, {路径: 错误信息}, 命中缓存的文件数)
+    """
+    raw, errors, misses = {}, {}, []
+    for path in paths:
+        stat = os.stat(_split_slot(path)[0])
+        cached = cache.get(path, stat, names) if cache else None
+        if cached is None:
+            misses.append((path, stat))
+        else:
+            raw[path] = cached
+    hits = len(raw)
+
+    tasks = [(path, names) for path, _ in misses]
+    workers = workers or os.cpu_count() or 1
+    if len(tasks) <= ANALYTICS_INLINE_FILES or workers == 1:
+        results = list(map(_extract_worker, tasks))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            # 每批若干文件，减少进程间往返
+            results = list(executor.map(_extract_worker, tasks,
+                                        chunksize=max(1, len(tasks) // (workers * 4))))
+    extracted = []
+    stats = dict(misses)
+    for path, columns, error in results:
+        if error is not None:
+            errors[path] = error
+            continue
+        raw[path] = columns
+        extracted.append((path, stats[path], columns))
+    if cache and extracted:
+        cache.put_many(extracted)
+
+    columns = {}
+    for path, data in raw.items():
+        columns[path] = {}
+        for name, blob in data.items():
+            column = array(_TYPECODES[name])
+            column.frombytes(blob)
+            columns[path][name] = column
+    return columns, errors, hits
+
+
+def run_query(root: str, metric_expr: str, group_by: Optional[str] = None,
+              percentiles=(50,), bins: int = 0, workers: Optional[int] = None,
+              cache_path: Optional[str] = ANALYTICS_CACHE) -> dict:
+    """
+    对目录下所有存档求每局指标并汇总
+    返回: {"files", "errors", "cache_hits", "missing", "summary", "histogram", "groups"}
+    """
+    metric = parse_metric(metric_expr)
+    group_metric = parse_metric(group_by) if group_by else None
+    names = metric_columns(metric) | (metric_columns(group_metric) if group_metric else set())
+    paths = find_saves(root)
+
+    cache = ColumnCache(cache_path) if cache_path else None
+    try:
+        columns, errors, hits = load_columns(paths, tuple(sorted(names)), workers, cache)
+    finally:
+        if cache:
+            cache.close()
+
+    values, groups = [], {}
+    for path in paths:
+        if path not in columns:
+            continue
+        value = evaluate_metric(metric, columns[path])
+        if value is None:
+            continue
+        values.append(value)
+        if group_metric:
+            key = evaluate_metric(group_metric, columns[path])
+            groups.setdefault(key, []).append(value)
+
+    return {
+        "files": len(paths),
+        "errors": errors,
+        "cache_hits": hits,
+        "missing": len(columns) - len(values),
+        "summary": _summarize(values, percentiles),
+        "histogram": histogram(values, bins) if bins and values else [],
+        "groups": {key: _summarize(group, percentiles)
+                   for key, group in sorted(groups.items(), key=lambda item: (item[0] is None, item[0] or 0))},
+    }
+
+
+# ---- 命令行 ----
+
+def _fmt(value) -> str:
+    return "-" if value is None else f"{value:.6g}"
+
+
+def format_report(metric_expr: str, result: dict, group_by: Optional[str] = None) -> str:
+    """统计结果排版为文字报告"""
+    summary = result["summary"]
+    lines = [
+        f"存档 {result['files']} 个(缓存命中 {result['cache_hits']}，解析失败 {len(result['errors'])})",
+        f"指标 {metric_expr}：有效 {summary['count']} 局，未达成/无数据 {result['missing']} 局",
+        f"  平均 {_fmt(summary['mean'])}  "
+        + "  ".join(f"p{p:g} {_fmt(v)}" for p, v in summary["percentiles"].items()),
+    ]
+    if result["histogram"]:
+        peak = max(count for _, _, count in result["histogram"]) or 1
+        lines.append("直方图:")
+        for low, high, count in result["histogram"]:
+            lines.append(f"  [{_fmt(low):>8}, {_fmt(high):>8}) {count:>6} {'#' * round(count * 40 / peak)}")
+    if result["groups"]:
+        lines.append(f"按 {group_by} 分组:")
+        for key, group in result["groups"].items():
+            lines.append(f"  {_fmt(key):>8}: {group['count']:>6} 局  平均 {_fmt(group['mean'])}  "
+                         + "  ".join(f"p{p:g} {_fmt(v)}" for p, v in group["percentiles"].items()))
+    for path, error in list(result["errors"].items())[:5]:
+        lines.append(f"解析失败 {path}: {error}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="跨存档统计宗门指标")
+    parser.add_argument("root", help="存档目录或单个存档文件")
+    parser.add_argument("metric", help="每局指标，如 final(wealth)、first_year(vault_level>=10)")
+    parser.add_argument("--percentiles", type=float, nargs="+", default=[50], help="分位数(0-100)")
+    parser.add_argument("--hist", type=int, default=0, help="直方图区间数")
+    parser.add_argument("--group-by", help="分组指标，如 final(cave_level)")
+    parser.add_argument("--workers", type=int, help="进程数，默认等于 CPU 核数")
+    parser.add_argument("--no-cache", action="store_true", help="不读写列缓存")
+    args = parser.parse_args(argv)
+    try:
+        result = run_query(args.root, args.metric, args.group_by, args.percentiles, args.hist,
+                           args.workers, None if args.no_cache else ANALYTICS_CACHE)
+    except ValueError as e:
+        parser.error(str(e))
+    print(format_report(args.metric, result, args.group_by))
+
+
+if __name__ == "__main__":
+    main()
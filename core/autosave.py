@@ -0,0 +1,94 @@
+"""后台自动存档
+
+回合结束时只在主线程拍一份快照(GameState.snapshot，代价与历史长度无关)，
+序列化与写盘都在后台线程进行，回合循环不等待文件系统。
+写入跟不上时只保留最新的一份待写快照，中间的快照直接丢弃：
+日志按「上次写入的内容」计算增量，跳过的回合会并入下一次写入，不会丢数据。
+写入由 SaveJournal 完成：完整快照写临时文件后原子替换，每回合增量追加到日志段。
+"""
+import atexit
+import threading
+from typing import Optional
+
+from core.game_state import GameState
+from core.journal import SaveJournal
+from core.profiler import profiler
+
+
+class AutosaveService:
+    """后台自动存档服务"""
+
+    def __init__(self, journal: Optional[SaveJournal] = None):
+        self.journal = journal or SaveJournal()
+        self._cond = threading.Condition()
+        self._pending: Optional[GameState] = None
+        self._pending_reset = False
+        self._busy = False
+        self._closed = False
+        # 统计
+        self.written = 0
+        self.coalesced = 0
+        self.last_error: Optional[str] = None
+        self._worker = threading.Thread(target=self._run, name="autosave", daemon=True)
+        self._worker.start()
+        # 异常退出时也把待写快照写完
+        atexit.register(self.close)
+
+    def submit(self, state: GameState):
+        """回合结束时调用：拍快照交给后台写入，立即返回"""
+        self._put(state.snapshot(), reset=False)
+
+    def reset(self, state: GameState):
+        """读档后调用：以该状态开始新一代自动存档(写完整快照)"""
+        self._put(state.snapshot(), reset=True)
+
+    def _put(self, snapshot: GameState, reset: bool):
+        with self._cond:
+            if self._closed:
+                return
+            if self._pending is not None:
+                self.coalesced += 1
+            self._pending = snapshot
+            # 待写的重置不能被后来的增量覆盖掉，最新快照改为以完整快照写入
+            self._pending_reset = self._pending_reset or reset
+            self._cond.notify_all()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._pending is None and not self._closed:
+                    self._cond.wait()
+                if self._pending is None:
+                    return
+                snapshot, reset = self._pending, self._pending_reset
+                self._pending, self._pending_reset = None, False
+                self._busy = True
+            try:
+                with profiler.span("save.autosave"):
+                    if reset:
+                        self.journal.reset(snapshot)
+                    else:
+                        self.journal.append(snapshot)
+                self.written += 1
+            except Exception as e:  # 后台线程不能因任何异常退出，否则之后的快照都不会写入
+                self.last_error = f"自动存档失败: {str(e)}"
+            finally:
+                with self._cond:
+                    self._busy = False
+                    self._cond.notify_all()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """等待待写快照全部写完，返回是否在超时前完成"""
+        with self._cond:
+            return self._cond.wait_for(lambda: self._pending is None and not self._busy, timeout)
+
+    def close(self):
+        """写完待写快照后停止后台线程，并关闭日志(同步磁盘)"""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        self._worker.join()
+        self.journal.close()
+        atexit.unregister(self.close)
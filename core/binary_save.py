@@ -0,0 +1,321 @@
+"""二进制存档格式
+
+文件结构(整数均为小端)：
+    文件头   魔数 "XZSV" | 格式版本 u16 | 标志 u16 | 状态版本 u16 | 年份 i64 | 灵石 f64 | 弟子数 i64
+             | 保存时间长度 u16 | 保存时间(UTF-8)
+    若干段   名称长度 u8 | 压缩方式 u8 | 名称 | 若干帧(长度 u32 + 压缩数据) | 结束帧(长度 0)
+    结束     名称长度为 0 的段头
+
+每段解压后是一串带长度前缀(u32)的记录。编年史等大段按批(每批 RECORD_BATCH 条)流式压缩写出、逐批读入，
+不需要先在内存中拼出整个存档；读取某一段时其余段只读帧长度并跳过，不解压。
+只读文件头即可得到列表所需的年份、弟子数等信息。
+"""
+import json
+import lzma
+import os
+import struct
+import sys
+import zlib
+from array import array
+from datetime import datetime
+from typing import Iterator, Optional
+
+from core.chronicle import Chronicle
+from core.game_state import GameState, SAVE_VERSION, FIELDS
+from core.message_log import MessageLog
+from core.metrics import MetricsStore
+
+MAGIC = b"XZSV"
+FORMAT_VERSION = 1
+FLAG_BIG_ENDIAN = 1  # 指标列按写入机器的字节序存储
+
+CODEC_NONE, CODEC_ZLIB, CODEC_LZMA = 0, 1, 2
+_CODEC_NAMES = {"none": CODEC_NONE, "zlib": CODEC_ZLIB, "lzma": CODEC_LZMA}
+
+_HEADER = struct.Struct("<4sHHHqdqH")
+_SECTION = struct.Struct("<BB")
+_U32 = struct.Struct("<I")
+FRAME_SIZE = 64 * 1024  # 未压缩数据累计到该大小时压缩并写出一帧
+RECORD_BATCH = 512  # 日志类段每条记录打包的条目数
+
+# 由专门的段保存的字段，其余字段写入 "core" 段
+_SECTION_FIELDS = ("message_log", "chronicle", "data_log")
+_CORE_FIELDS = tuple(name for name, *_ in FIELDS if name not in _SECTION_FIELDS)
+
+
+class SaveFormatError(ValueError):
+    """存档文件格式错误"""
+
+
+def _dumps(value) -> bytes:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _compressor(codec: int):
+    if codec == CODEC_ZLIB:
+        return zlib.compressobj()
+    if codec == CODEC_LZMA:
+        return lzma.LZMACompressor()
+    return None
+
+
+def _decompressor(codec: int):
+    if codec == CODEC_ZLIB:
+        return zlib.decompressobj()
+    if codec == CODEC_LZMA:
+        return lzma.LZMADecompressor()
+    if codec == CODEC_NONE:
+        return None
+    raise SaveFormatError(f"未知的压缩方式: {codec}")
+
+
+class _SectionWriter:
+    """流式写出一段：记录先攒在缓冲区，累计到 FRAME_SIZE 时压缩并写出一帧"""
+
+    def __init__(self, f, name: str, codec: int):
+        encoded = name.encode("utf-8")
+        f.write(_SECTION.pack(len(encoded), codec) + encoded)
+        self._f = f
+        self._compressor = _compressor(codec)
+        self._raw = bytearray()
+
+    def _write_frame(self, data):
+        if data:
+            self._f.write(_U32.pack(len(data)))
+            self._f.write(data)
+
+    def _flush_raw(self):
+        if self._raw:
+            self._write_frame(self._compressor.compress(self._raw) if self._compressor else self._raw)
+            self._raw = bytearray()
+
+    def write(self, record):
+        """写一条记录(bytes 或任意缓冲区对象，如 array 的 memoryview)"""
+        self._raw += _U32.pack(memoryview(record).nbytes)
+        self._raw += record
+        if len(self._raw) >= FRAME_SIZE:
+            self._flush_raw()
+
+    def write_batched(self, entries):
+        """把条目每 RECORD_BATCH 条打包成一条 JSON 记录写出"""
+        batch = []
+        for entry in entries:
+            batch.append(entry)
+            if len(batch) == RECORD_BATCH:
+                self.write(_dumps(batch))
+                batch = []
+        if batch:
+            self.write(_dumps(batch))
+
+    def close(self):
+        self._flush_raw()
+        if self._compressor is not None:
+            self._write_frame(self._compressor.flush())
+        self._f.write(_U32.pack(0))
+
+
+def _read_exact(f, size: int) -> bytes:
+    data = f.read(size)
+    if len(data) != size:
+        raise SaveFormatError("存档文件不完整")
+    return data
+
+
+def _iter_frames(f) -> Iterator[bytes]:
+    while True:
+        (size,) = _U32.unpack(_read_exact(f, 4))
+        if not size:
+            return
+        yield _read_exact(f, size)
+
+
+def _skip_frames(f):
+    while True:
+        (size,) = _U32.unpack(_read_exact(f, 4))
+        if not size:
+            return
+        f.seek(size, 1)
+
+
+def _iter_records(f, codec: int) -> Iterator[bytes]:
+    """逐帧解压并切分出记录"""
+    decompressor = _decompressor(codec)
+    buffer = bytearray()
+    for frame in _iter_frames(f):
+        buffer += decompressor.decompress(frame) if decompressor else frame
+        offset = 0
+        while len(buffer) - offset >= 4:
+            (size,) = _U32.unpack_from(buffer, offset)
+            if len(buffer) - offset - 4 < size:
+                break
+            yield bytes(buffer[offset + 4:offset + 4 + size])
+            offset += 4 + size
+        del buffer[:offset]
+    if buffer:
+        raise SaveFormatError("段数据不完整")
+
+
+def _read_section_header(f) -> Optional[tuple]:
+    name_len, codec = _SECTION.unpack(_read_exact(f, _SECTION.size))
+    if not name_len:
+        return None
+    return _read_exact(f, name_len).decode("utf-8"), codec
+
+
+def write_save(f, state: GameState, save_time: Optional[str] = None, codec: str = "zlib"):
+    """把状态流式写入二进制文件对象"""
+    codec_id = _CODEC_NAMES[codec]
+    save_time = (save_time or datetime.now().strftime("%Y-%m-%d %H:%M:%S")).encode("utf-8")
+    sect = state.sect_data
+    flags = FLAG_BIG_ENDIAN if sys.byteorder == "big" else 0
+    f.write(_HEADER.pack(MAGIC, FORMAT_VERSION, flags, SAVE_VERSION, state.game_time,
+                         sect["wealth"], sect["disciples_total"], len(save_time)) + save_time)
+
+    section = _SectionWriter(f, "core", codec_id)
+    section.write(_dumps({"version": SAVE_VERSION, **{name: getattr(state, name) for name in _CORE_FIELDS}}))
+    section.close()
+
+    section = _SectionWriter(f, "message_log", codec_id)
+    section.write(_dumps({"capacity": state.message_log.capacity}))
+    section.write_batched(state.message_log.records())
+    section.close()
+
+    section = _SectionWriter(f, "chronicle", codec_id)
+    section.write_batched(state.chronicle.records())
+    section.close()
+
+    metrics = state.data_log
+    section = _SectionWriter(f, "data_log", codec_id)
+    section.write(_dumps({"capacity": metrics.capacity, "stride": metrics.stride, "turns": metrics.turns}))
+    for name, column in metrics.columns.items():
+        # 列名与类型码之后直接接数组的原始字节，不经过 JSON
+        section.write(f"{name}:{column.typecode}".encode("ascii"))
+        section.write(memoryview(column))
+    section.close()
+
+    f.write(_SECTION.pack(0, 0))
+
+
+def read_header(f) -> dict:
+    """只读取文件头"""
+    (magic, format_version, flags, state_version, game_time, wealth,
+     disciples_total, time_len) = _HEADER.unpack(_read_exact(f, _HEADER.size))
+    if magic != MAGIC:
+        raise SaveFormatError("不是二进制存档文件")
+    if format_version > FORMAT_VERSION:
+        raise SaveFormatError(f"不支持的存档格式版本: {format_version}")
+    return {
+        "format_version": format_version,
+        "flags": flags,
+        "version": state_version,
+        "game_time": game_time,
+        "wealth": wealth,
+        "disciples_total": disciples_total,
+        "save_time": _read_exact(f, time_len).decode("utf-8"),
+    }
+
+
+def _decode_metrics(records: Iterator[bytes], flags: int) -> MetricsStore:
+    meta = json.loads(next(records))
+    store = MetricsStore(meta["capacity"])
+    store.stride, store.turns = meta["stride"], meta["turns"]
+    swap = bool(flags & FLAG_BIG_ENDIAN) != (sys.byteorder == "big")
+    for label in records:
+        name, typecode = label.decode("ascii").split(":")
+        column = array(typecode)
+        column.frombytes(next(records))
+        if swap:
+            column.byteswap()
+        if name in store.columns:
+            store.columns[name] = column
+    return store
+
+
+def _iter_entries(records: Iterator[bytes]) -> Iterator[list]:
+    """把批量记录展开为逐条 [年份, 模板名, 参数]"""
+    for record in records:
+        yield from json.loads(record)
+
+
+def read_section(f, name: str):
+    """
+    只读取指定的一段，其余段跳过不解压
+    core 段返回字典，data_log 段返回 MetricsStore，其余段逐条产出记录 [年份, 模板名, 参数]
+    """
+    header = read_header(f)
+    while True:
+        section = _read_section_header(f)
+        if section is None:
+            raise SaveFormatError(f"存档中没有 {name} 段")
+        section_name, codec = section
+        if section_name != name:
+            _skip_frames(f)
+            continue
+        records = _iter_records(f, codec)
+        if name == "core":
+            return json.loads(next(records))
+        if name == "data_log":
+            return _decode_metrics(records, header["flags"])
+        if name == "message_log":
+            next(records)
+        return _iter_entries(records)
+
+
+def read_save(f) -> GameState:
+    """流式读取完整存档"""
+    header = read_header(f)
+    sections = {}
+    while True:
+        section = _read_section_header(f)
+        if section is None:
+            break
+        name, codec = section
+        records = _iter_records(f, codec)
+        if name == "core":
+            sections["core"] = json.loads(next(records))
+            for _ in records:
+                pass
+        elif name == "data_log":
+            sections["data_log"] = _decode_metrics(records, header["flags"])
+        elif name == "message_log":
+            meta = json.loads(next(records))
+            sections["message_log"] = MessageLog.from_data(
+                {"capacity": meta["capacity"], "records": list(_iter_entries(records))})
+        elif name == "chronicle":
+            sections["chronicle"] = Chronicle.from_data(_iter_entries(records))
+        else:
+            for _ in records:
+                pass
+
+    core = sections.get("core")
+    if core is None:
+        raise SaveFormatError("存档缺少 core 段")
+    if core.get("version", 0) != SAVE_VERSION:
+        # 旧版本状态走字典迁移流程
+        data = dict(core)
+        for name in _SECTION_FIELDS:
+            if name in sections:
+                data[name] = sections[name].to_data()
+        return GameState.from_dict(data)
+
+    state = GameState.from_dict(core)
+    for name in _SECTION_FIELDS:
+        if name in sections:
+            setattr(state, name, sections[name])
+    return state
+
+
+def save_to_file(filepath: str, state: GameState, codec: str = "zlib"):
+    """写入二进制存档文件(写临时文件后原子替换)"""
+    tmp_path = filepath + ".tmp"
+    with open(tmp_path, "wb") as f:
+        write_save(f, state, codec=codec)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, filepath)
+
+
+def load_from_file(filepath: str) -> GameState:
+    """读取二进制存档文件"""
+    with open(filepath, "rb") as f:
+        return read_save(f)
@@ -0,0 +1,202 @@
+"""宗门编年史：完整历史日志，带 n-gram 倒排索引与年份索引
+
+追加与读档只保存原始记录(年份、模板编号、参数)，不格式化也不建索引；
+第一次搜索或按年份跳转时才为尚未索引的记录补建索引，之后的查询只补新追加的部分：
+- 中文按单字与相邻二字建索引，字母/数字按整词(小写)建索引
+- 年份索引记录每个年份的第一条记录，用于跳转
+"""
+import bisect
+import re
+from array import array
+from typing import Iterator, Optional
+
+from core.message_log import TEMPLATE_IDS, TEMPLATE_NAMES, pack_args, unpack_args, format_body, format_entry
+
+_CJK_RUN = re.compile(r"[㐀-鿿豈-﫿]+")
+_WORD = re.compile(r"[0-9a-zA-Z_]+")
+
+
+def tokenize(text: str) -> set:
+    """切分出索引词：中文单字与二字组，字母数字整词"""
+    tokens = set()
+    for run in _CJK_RUN.findall(text):
+        tokens.update(run)
+        tokens.update(run[i:i + 2] for i in range(len(run) - 1))
+    tokens.update(word.lower() for word in _WORD.findall(text))
+    return tokens
+
+
+def _query_tokens(query: str) -> list:
+    """查询词：中文片段取二字组(单字片段取单字)，字母数字取整词"""
+    tokens = []
+    for run in _CJK_RUN.findall(query):
+        if len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    tokens.extend(word.lower() for word in _WORD.findall(query))
+    return tokens
+
+
+def _contains(postings: array, entry_id: int) -> bool:
+    """倒排表按记录编号递增，二分查找"""
+    i = bisect.bisect_left(postings, entry_id)
+    return i < len(postings) and postings[i] == entry_id
+
+
+class Chronicle:
+    """完整历史日志"""
+    __slots__ = ("_years", "_templates", "_args", "_indexed", "_postings", "_year_first", "_year_keys")
+
+    def __init__(self):
+        self._years = array("i")
+        self._templates = array("H")
+        self._args = []
+        self._indexed = 0  # 已建索引的记录条数(前 _indexed 条)
+        self._postings = {}  # 索引词 -> 记录编号数组
+        self._year_first = {}  # 年份 -> 该年第一条记录编号
+        self._year_keys = []  # 已出现的年份(升序)
+
+    def append(self, year: int, template: str, *args):
+        """追加一条记录(索引在查询时补建)"""
+        tid = TEMPLATE_IDS[template]
+        self._years.append(year)
+        self._templates.append(tid)
+        self._args.append(pack_args(tid, args))
+
+    def __len__(self) -> int:
+        return len(self._args)
+
+    def _ensure_index(self):
+        """为尚未索引的记录补建索引，代价与新增条数成正比"""
+        for entry_id in range(self._indexed, len(self._args)):
+            for token in tokenize(format_body(self._templates[entry_id], self._args[entry_id])):
+                postings = self._postings.get(token)
+                if postings is None:
+                    postings = self._postings[token] = array("I")
+                postings.append(entry_id)
+
+            year = self._years[entry_id]
+            if year not in self._year_first:
+                self._year_first[year] = entry_id
+                if not self._year_keys or year > self._year_keys[-1]:
+                    self._year_keys.append(year)
+                else:
+                    bisect.insort(self._year_keys, year)
+        self._indexed = len(self._args)
+
+    def truncate(self, length: int):
+        """删除第 length 条起的记录并同步撤销索引(回退用)，代价与删除的已索引条数成正比"""
+        for entry_id in range(self._indexed - 1, length - 1, -1):
+            # 倒序删除，被删记录总在各倒排表末尾
+            for token in tokenize(format_body(self._templates[entry_id], self._args[entry_id])):
+                postings = self._postings[token]
+                postings.pop()
+                if not postings:
+                    del self._postings[token]
+            year = self._years[entry_id]
+            if self._year_first.get(year) == entry_id:
+                del self._year_first[year]
+                if self._year_keys[-1] == year:
+                    self._year_keys.pop()
+                else:
+                    self._year_keys.remove(year)
+        self._indexed = min(self._indexed, length)
+        del self._years[length:]
+        del self._templates[length:]
+        del self._args[length:]
+
+    def format(self, entry_id: int) -> str:
+        """格式化一条记录"""
+        return format_entry(self._years[entry_id], self._templates[entry_id], self._args[entry_id])
+
+    def year_of(self, entry_id: int) -> int:
+        return self._years[entry_id]
+
+    def search(self, query: str) -> Iterator[int]:
+        """
+        按关键词搜索，按时间顺序逐条产出匹配的记录编号
+        查询只有一个索引词时索引结果即为精确结果，否则再逐条核对原文
+        """
+        tokens = _query_tokens(query)
+        if not tokens:
+            return
+        self._ensure_index()
+        postings = []
+        for token in dict.fromkeys(tokens):
+            found = self._postings.get(token)
+            if found is None:
+                return
+            postings.append(found)
+        postings.sort(key=len)
+        smallest, others = postings[0], postings[1:]
+        exact = len(tokens) == 1 and tokens[0] == query.strip().lower()
+        needle = query.strip().lower()
+        for entry_id in smallest:
+            if all(_contains(other, entry_id) for other in others):
+                if exact or needle in format_body(self._templates[entry_id], self._args[entry_id]).lower():
+                    yield entry_id
+
+    def first_entry_of_year(self, year: int) -> Optional[int]:
+        """不早于指定年份的第一条记录编号，没有则返回 None"""
+        self._ensure_index()
+        i = bisect.bisect_left(self._year_keys, year)
+        if i == len(self._year_keys):
+            return None
+        return self._year_first[self._year_keys[i]]
+
+    def records(self, start: int = 0) -> Iterator[tuple]:
+        """按时间顺序遍历第 start 条起的原始记录 (年份, 模板名, 参数元组)"""
+        for i in range(start, len(self._args)):
+            tid = self._templates[i]
+            yield self._years[i], TEMPLATE_NAMES[tid], unpack_args(tid, self._args[i])
+
+    def to_data(self) -> list:
+        """序列化为存档数据(不含索引)"""
+        return [[year, name, list(args)] for year, name, args in self.records()]
+
+    def snapshot(self) -> "ChronicleView":
+        """当前内容的只读视图：编年史只追加，记下长度即可，不复制数据"""
+        return ChronicleView(self, len(self._args))
+
+    @classmethod
+    def from_data(cls, data) -> "Chronicle":
+        """从存档数据恢复(索引在第一次查询时建立)，未知模板按原文保存"""
+        chronicle = cls()
+        years, templates, packed_args = chronicle._years, chronicle._templates, chronicle._args
+        raw = TEMPLATE_IDS["raw"]
+        for year, name, args in data:
+            tid = TEMPLATE_IDS.get(name)
+            if tid is None:
+                tid, args = raw, (" ".join(str(arg) for arg in args),)
+            years.append(year)
+            templates.append(tid)
+            packed_args.append(pack_args(tid, tuple(args)))
+        return chronicle
+
+
+class ChronicleView:
+    """编年史前 length 条记录的只读视图，与原编年史共享数据，供后台存档读取"""
+    __slots__ = ("_chronicle", "_length")
+
+    def __init__(self, chronicle: Chronicle, length: int):
+        self._chronicle = chronicle
+        self._length = length
+
+    def __len__(self) -> int:
+        return self._length
+
+    def format(self, entry_id: int) -> str:
+        return self._chronicle.format(entry_id)
+
+    def records(self, start: int = 0) -> Iterator[tuple]:
+        chronicle = self._chronicle
+        for i in range(start, self._length):
+            tid = chronicle._templates[i]
+            yield chronicle._years[i], TEMPLATE_NAMES[tid], unpack_args(tid, chronicle._args[i])
+
+    def to_data(self) -> list:
+        return [[year, name, list(args)] for year, name, args in self.records()]
+
+    def snapshot(self) -> "ChronicleView":
+        return self
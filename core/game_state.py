@@ -1,42 +1,126 @@
 """玩家类"""
+import copy
+import re
 from typing import Tuple
 
+from config.settings import MESSAGE_LOG_CAPACITY
+from core.message_log import MessageLog
+from core.chronicle import Chronicle
+from core.metrics import MetricsStore
+
+
+# 存档格式版本，字段表变化时递增并在 _MIGRATIONS 中补充迁移函数
+SAVE_VERSION = 4
+
+
+class SaveVersionError(ValueError):
+    """存档版本高于当前支持的版本"""
+
+
+def _default_sect_data() -> dict:
+    # 宗门数据 (根据 MMD 增加)
+    return {
+        "disciples_mining": 0,
+        "disciples_recruiting": 0,
+        "vault_level": 1,
+        "cave_level": 1,
+        "wealth": 30,
+        "disciples_total": 1
+    }
+
+
+# 字段表: (字段名, 默认值工厂[, 编解码类])，存档只包含这些字段
+# 编解码类需提供 to_data() 与 from_data(data)，其实例需提供 snapshot()
+FIELDS: Tuple[tuple, ...] = (
+    ("game_time", int),  # 游戏内时间
+    ("sect_data", _default_sect_data),
+    ("message_log", MessageLog, MessageLog),  # 消息日志(最近若干条)
+    ("chronicle", Chronicle, Chronicle),  # 编年史(完整历史，带索引)
+    ("data_log", MetricsStore, MetricsStore),  # 数据日志(每回合宗门指标，按列存储)
+    ("event_log", list),
+    ("buffs", dict),  # Buff效果 {buff_name: {remaining: int, multiplier: float}}
+    ("inventory", dict),  # 背包
+)
+
+
+def _migrate_v0(data: dict) -> dict:
+    """v0: 反射序列化的旧存档，去掉混入的 property 值"""
+    return {key: value for key, value in data.items()
+            if key not in ("max_wealth", "max_disciples", "idle_disciples")}
+
+
+_LEGACY_MESSAGE = re.compile(r"^第(-?\d+)年 (.*)$", re.S)
+
+
+def _migrate_v1(data: dict) -> dict:
+    """v1: 消息日志是格式化好的字符串列表，转换为按原文保存的记录"""
+    records = []
+    for msg in data.get("message_log", []):
+        match = _LEGACY_MESSAGE.match(msg)
+        if match:
+            records.append([int(match.group(1)), "raw", [match.group(2)]])
+        else:
+            records.append([0, "raw", [msg]])
+    return {**data, "message_log": {"capacity": MESSAGE_LOG_CAPACITY, "records": records}}
+
+
+def _migrate_v2(data: dict) -> dict:
+    """v2: 没有编年史，用消息日志中仍保留的记录作为编年史的开端"""
+    return {**data, "chronicle": list(data.get("message_log", {}).get("records", []))}
+
+
+def _migrate_v3(data: dict) -> dict:
+    """v3: 数据日志是从未写入过的列表，换成空的指标表"""
+    return {**data, "data_log": {}}
+
+
+# 迁移函数: {旧版本: 将该版本数据升级到下一版本的函数}
+_MIGRATIONS = {
+    0: _migrate_v0,
+    1: _migrate_v1,
+    2: _migrate_v2,
+    3: _migrate_v3,
+}
+
+
+def _compile_serializers(fields) -> dict:
+    """根据字段表生成 __init__ / to_dict / _load 的函数体，避免运行时反射"""
+    namespace = {}
+    dump_exprs, load_exprs = [], []
+    for name, factory, *codec in fields:
+        namespace[f"_default_{name}"] = factory
+        if codec:
+            namespace[f"_codec_{name}"] = codec[0]
+            dump_exprs.append(f"'{name}': self.{name}.to_data()")
+            load_exprs.append(f"_codec_{name}.from_data(data['{name}'])")
+        else:
+            dump_exprs.append(f"'{name}': self.{name}")
+            load_exprs.append(f"data['{name}']")
+    init_src = "def __init__(self):\n" + "".join(
+        f"    self.{name} = _default_{name}()\n" for name, *_ in fields)
+    to_dict_src = ("def to_dict(self):\n    return {'version': %d, " % SAVE_VERSION
+                   + ", ".join(dump_exprs) + "}\n")
+    load_src = "def _load(self, data):\n" + "".join(
+        f"    self.{name} = {expr} if '{name}' in data else _default_{name}()\n"
+        for (name, *_), expr in zip(fields, load_exprs))
+    exec(init_src + to_dict_src + load_src, namespace)
+    return namespace
+
+
+_SERIALIZERS = _compile_serializers(FIELDS)
+
 
 class GameState:
     """游戏状态类"""
-    
-    def __init__(self):
-        #游戏内时间
-        self.game_time=0
-
-        # 宗门数据 (根据 MMD 增加)
-        self.sect_data = {
-            "disciples_mining": 0,
-            "disciples_recruiting": 0,
-            "vault_level": 1,
-            "cave_level": 1,
-            "wealth":30,
-            "disciples_total": 1
-        }
-
-        # 消息日志
-        self.message_log=[]
-
-        # 数据日志
-        self.data_log=[]
-
-        self.event_log=[]
-
-        # Buff效果
-        self.buffs = {}  # {buff_name: {remaining: int, multiplier: float}}
-        
-        # 背包
-        self.inventory = {}
+    __slots__ = tuple(name for name, *_ in FIELDS)
+
+    __init__ = _SERIALIZERS["__init__"]
+    _load = _SERIALIZERS["_load"]
 
     def add_item(self, item_name: str, count: int = 1):
         """添加物品到背包"""
         self.inventory[item_name] = self.inventory.get(item_name, 0) + count
-    
+
     def remove_item(self, item_name: str, count: int = 1) -> bool:
         """从背包移除物品"""
         if self.inventory.get(item_name, 0) >= count:
@@ -47,27 +131,31 @@ class GameState:
         return False
 
     def log_message(self, msg: str):
-        """添加消息到日志，保持最多10条消息，自动添加游戏年份"""
-        # 在消息前添加游戏年份
-        formatted_msg = f"第{self.game_time}年 {msg}"
-        self.message_log.append(formatted_msg)
-        # 如果消息数超过10条，删除最老的消息
-        if len(self.message_log) > 100:
-            self.message_log.pop(0)
-
-    def log_data(self):
-        """添加数据到日志"""
-        pass
-        # 如果数据数超过10条，删除最老的消息
-        if len(self.data_log) > 100:
-            self.data_log.pop(0)
+        """添加一条原文消息到日志，自动记录游戏年份"""
+        self.log("raw", msg)
 
+    def log(self, template: str, *args):
+        """按模板添加消息到日志(见 core.message_log.LOG_TEMPLATES)，显示时才格式化"""
+        self.message_log.append(self.game_time, template, *args)
+        self.chronicle.append(self.game_time, template, *args)
 
+    def log_data(self):
+        """记录本回合的宗门指标，行数超过上限时指标表自动降采样"""
+        sect = self.sect_data
+        self.data_log.append(
+            self.game_time,
+            sect["wealth"],
+            sect["disciples_total"],
+            sect["disciples_mining"],
+            sect["disciples_recruiting"],
+            sect["vault_level"],
+            sect["cave_level"],
+        )
 
     def gain_wealth(self, amount: int):
         """增加财富/灵石"""
         self.sect_data['wealth'] = min(self.max_wealth, self.sect_data['wealth'] + amount)
-    
+
     @property
     def idle_disciples(self) -> int:
         """空闲弟子数"""
@@ -81,29 +169,50 @@ class GameState:
     def max_disciples(self) -> int:
         return self.sect_data["cave_level"]*100
 
-    def to_dict(self) -> dict:
-        """序列化为字典"""
-        result = {}
-        # 获取所有非私有属性
-        for attr_name in dir(self):
-            if not attr_name.startswith('_') and not callable(getattr(self, attr_name)):
-                attr_value = getattr(self, attr_name)
-                # 跳过属性装饰器
-                if not isinstance(attr_value, property):
-                    result[attr_name] = attr_value
-        return result
-    
+    to_dict = _SERIALIZERS["to_dict"]
+    to_dict.__doc__ = """序列化为字典(按字段表，包含存档版本号)"""
+
+    def to_prompt(self) -> str:
+        """编码为给LLM的紧凑状态描述"""
+        sect = self.sect_data
+        return (f"第{self.game_time}年 灵石{sect['wealth']}/{self.max_wealth} "
+                f"弟子{sect['disciples_total']}/{self.max_disciples}"
+                f"(挖矿{sect['disciples_mining']} 招募{sect['disciples_recruiting']} 空闲{self.idle_disciples}) "
+                f"灵库{sect['vault_level']}级 洞府{sect['cave_level']}级"
+                + self._trend_prompt())
+
+    def _trend_prompt(self, rows: int = 10) -> str:
+        """近期趋势，直接读取指标表而不扫描日志"""
+        wealth = self.data_log.trend("wealth", rows)
+        if wealth is None or len(self.data_log) < 2:
+            return ""
+        _, disciples_from, disciples_to = self.data_log.trend("disciples_total", rows)
+        return (f" 自第{wealth[0]}年起 灵石{wealth[1]:.0f}→{wealth[2]:.0f} "
+                f"弟子{disciples_from}→{disciples_to}")
+
+    def snapshot(self) -> "GameState":
+        """
+        只读快照，供后台存档在主线程继续游戏时读取
+        小字段深拷贝，消息日志与指标表复制(大小有界)，编年史只记录长度、共享数据，代价与历史长度无关
+        """
+        state = GameState.__new__(GameState)
+        for name, _, *codec in FIELDS:
+            value = getattr(self, name)
+            setattr(state, name, value.snapshot() if codec else copy.deepcopy(value))
+        return state
+
     @classmethod
     def from_dict(cls, data: dict) -> "GameState":
-        """从字典反序列化"""
-        state = cls()
-        print("data:", data)
-        # 直接遍历字典中的键值对
-        for key, value in data.items():
-            if hasattr(state, key) and not key.startswith('_'):
-                # 检查是否为只读属性(property)
-                attr = getattr(type(state), key, None)
-                if not isinstance(attr, property):
-                    print("setattr:", key, value)
-                    setattr(state, key, value)
-        return state
\ No newline at end of file
+        """
+        从字典反序列化，旧版本存档先依次迁移到当前版本
+        比当前版本新的存档(新版游戏写入)无法正确读取，抛出 SaveVersionError
+        """
+        version = data.get("version", 0)
+        if version > SAVE_VERSION:
+            raise SaveVersionError(f"存档版本 {version} 高于当前支持的版本 {SAVE_VERSION}，请更新游戏")
+        while version < SAVE_VERSION:
+            data = _MIGRATIONS[version](data)
+            version += 1
+        state = cls.__new__(cls)
+        state._load(data)
+        return state
@@ -0,0 +1,98 @@
+"""本局操作历史：撤销/回退
+
+每次操作后记一个标记，回退时把 GameState 原地还原到该标记：
+- 编年史与指标表只追加，标记只记长度(指标表另记列数组引用)，回退时截断，与其余标记共享数据
+- 小字段(年份、宗门数据等)与上一个标记相同时直接共用上一个标记的对象，有变化才复制
+- 消息日志总是编年史的最后若干条，回退时从编年史末尾重建，不必保存
+- 给出事件管理器与随机数流时，标记同时记录待处理事件与各随机数流的状态(与上一个标记相同时共用)，
+  跨回合回退后预先生成的事件重新等待触发，重玩的回合抽到与原来相同的随机数
+因此每个标记的代价与历史长度无关，保留几百个标记也只占很少内存。
+"""
+import copy
+from collections import deque
+from typing import Optional
+
+from config.settings import REWIND_CAPACITY
+from core.game_state import GameState
+from core.message_log import MessageLog
+from core.rng import RandomStreams
+from events.special_events import EventManager
+
+# 按值保存的小字段，其余字段(消息日志、编年史、指标表)按上面的方式还原
+_SMALL_FIELDS = ("game_time", "sect_data", "event_log", "buffs", "inventory")
+
+
+class _Mark:
+    __slots__ = ("label", "small", "chronicle_len", "metrics", "events", "streams")
+
+    def __init__(self, label: str, small: tuple, chronicle_len: int, metrics: tuple,
+                 events: Optional[dict], streams: Optional[dict]):
+        self.label = label
+        self.small = small
+        self.chronicle_len = chronicle_len
+        self.metrics = metrics
+        self.events = events
+        self.streams = streams
+
+
+class StateHistory:
+    """本局的状态标记序列(旧 → 新)，超过容量时丢弃最老的"""
+
+    def __init__(self, capacity: int = REWIND_CAPACITY, event_manager: Optional[EventManager] = None,
+                 streams: Optional[RandomStreams] = None):
+        """event_manager / streams：随状态一起记录与还原的事件管理器和随机数流(原地还原，对象不变)"""
+        self._marks = deque(maxlen=capacity)
+        self.event_manager = event_manager
+        self.streams = streams
+
+    def __len__(self) -> int:
+        return len(self._marks)
+
+    def clear(self):
+        """读档、开新局后调用：之前的标记不再对应当前状态"""
+        self._marks.clear()
+
+    def record(self, state: GameState, label: Optional[str] = None):
+        """记录当前状态，label 默认取最新一条消息"""
+        if label is None:
+            recent = state.message_log.recent(1)
+            label = recent[0] if recent else f"第{state.game_time}年"
+        previous = self._marks[-1].small if self._marks else (None,) * len(_SMALL_FIELDS)
+        small = tuple(
+            old if old == getattr(state, name) else copy.deepcopy(getattr(state, name))
+            for name, old in zip(_SMALL_FIELDS, previous))
+        last = self._marks[-1] if self._marks else None
+        events = streams = None
+        if self.event_manager is not None:
+            events = self.event_manager.to_data()
+            events = last.events if last is not None and last.events == events else copy.deepcopy(events)
+        if self.streams is not None:
+            streams = self.streams.getstate()
+            streams = last.streams if last is not None and last.streams == streams else streams
+        self._marks.append(_Mark(label, small, len(state.chronicle), state.data_log.mark(), events, streams))
+
+    def labels(self) -> list:
+        """各标记的说明(旧 → 新)"""
+        return [mark.label for mark in self._marks]
+
+    def rewind(self, state: GameState, index: int):
+        """
+        把状态原地还原到第 index 个标记(0 为最老)，并丢弃其后的标记
+        还原后该标记仍保留，可以再次回退到它
+        """
+        mark = self._marks[index]
+        while len(self._marks) > index + 1:
+            self._marks.pop()
+        for name, value in zip(_SMALL_FIELDS, mark.small):
+            # 标记中的对象可能被多个标记共用，还原时复制一份给可变的游戏状态
+            setattr(state, name, copy.deepcopy(value))
+        state.chronicle.truncate(mark.chronicle_len)
+        state.data_log.rewind(mark.metrics)
+        log = MessageLog(state.message_log.capacity)
+        for year, template, args in state.chronicle.records(max(0, mark.chronicle_len - log.capacity)):
+            log.append(year, template, *args)
+        state.message_log = log
+        if mark.events is not None:
+            self.event_manager.load_data(copy.deepcopy(mark.events))
+        if mark.streams is not None:
+            self.streams.setstate(mark.streams)
@@ -0,0 +1,220 @@
+"""自动存档日志(预写式)
+
+目录结构 (第 N 代):
+    snapshot_N.json  完整快照，写临时文件后原子替换
+    journal_N.log    快照之后每回合一行的增量记录
+
+每回合只追加本回合的变化：小字段(年份、宗门数据等)有变化才写，
+日志与指标只写新增的记录/行，I/O 与本回合变化量成正比而不是与整个存档成正比。
+每行写完即 flush，进程崩溃最多丢失正在写的那一回合；每 JOURNAL_FSYNC_EVERY 行同步一次磁盘。
+每 JOURNAL_SNAPSHOT_EVERY 回合写一次新快照并开启新一代，旧代文件由后台线程清理。
+"""
+import json
+import os
+import re
+import threading
+from typing import Optional
+
+from config.settings import (
+    JOURNAL_DIR,
+    JOURNAL_SNAPSHOT_EVERY,
+    JOURNAL_FSYNC_EVERY,
+    JOURNAL_KEEP_GENERATIONS,
+)
+from core.game_state import GameState, SaveVersionError
+from core.metrics import MetricsStore
+from core.save_system import write_atomic
+
+# 整体比较是否变化的小字段；日志与指标按追加的部分单独记录
+_SMALL_FIELDS = ("game_time", "sect_data", "event_log", "buffs", "inventory")
+_SNAPSHOT_NAME = re.compile(r"^snapshot_(\d+)\.json$")
+
+
+def _dumps(value) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+class SaveJournal:
+    """自动存档日志"""
+
+    def __init__(self, directory: str = JOURNAL_DIR):
+        self.directory = directory
+        # 接着目录中已有的最新一代编号，避免新快照被旧的更高代号遮住
+        self.generation = _latest_generation(directory)
+        self._file = None
+        self._unsynced = 0
+        self._turns_since_snapshot = 0
+        # 已写入内容的基线，用于计算增量
+        self._small = {}
+        self._chronicle_len = 0
+        self._metrics_len = 0
+        self._metrics_turns = 0
+        self._metrics_stride = 1
+        self._compactor: Optional[threading.Thread] = None
+
+    def _path(self, kind: str, generation: int) -> str:
+        ext = "json" if kind == "snapshot" else "log"
+        return os.path.join(self.directory, f"{kind}_{generation}.{ext}")
+
+    def _remember(self, state: GameState):
+        """记录当前状态为增量基线"""
+        self._small = {name: _dumps(getattr(state, name)) for name in _SMALL_FIELDS}
+        self._chronicle_len = len(state.chronicle)
+        self._metrics_len = len(state.data_log)
+        self._metrics_turns = state.data_log.turns
+        self._metrics_stride = state.data_log.stride
+
+    def reset(self, state: GameState):
+        """以当前状态开始新一代：写完整快照，之后的增量写入新日志段"""
+        os.makedirs(self.directory, exist_ok=True)
+        self.close()
+        self.generation += 1
+        write_atomic(self._path("snapshot", self.generation), _dumps(state.to_dict()))
+        self._file = open(self._path("journal", self.generation), "a", encoding="utf-8")
+        self._turns_since_snapshot = 0
+        self._remember(state)
+        self._compact_in_background()
+
+    def append(self, state: GameState):
+        """追加本回合相对上次写入的增量，到达快照间隔时改写完整快照"""
+        if self._file is None or self._turns_since_snapshot >= JOURNAL_SNAPSHOT_EVERY:
+            self.reset(state)
+            return
+
+        delta = {}
+        changed = {}
+        for name in _SMALL_FIELDS:
+            encoded = _dumps(getattr(state, name))
+            if encoded != self._small[name]:
+                changed[name] = getattr(state, name)
+                self._small[name] = encoded
+        if changed:
+            delta["set"] = changed
+
+        if len(state.chronicle) > self._chronicle_len:
+            delta["log"] = [[year, name, list(args)]
+                            for year, name, args in state.chronicle.records(self._chronicle_len)]
+        metrics = state.data_log
+        if metrics.stride != self._metrics_stride or len(metrics) < self._metrics_len:
+            # 指标表降采样后行号整体变化，整表重写
+            delta["metrics_full"] = metrics.to_data()
+        elif metrics.turns != self._metrics_turns:
+            delta["metrics"] = {"turns": metrics.turns, "rows": metrics.rows(self._metrics_len)}
+
+        self._file.write(_dumps(delta) + "\n")
+        self._file.flush()
+        self._unsynced += 1
+        if self._unsynced >= JOURNAL_FSYNC_EVERY:
+            self.sync()
+
+        self._chronicle_len = len(state.chronicle)
+        self._metrics_len = len(metrics)
+        self._metrics_turns = metrics.turns
+        self._metrics_stride = metrics.stride
+        self._turns_since_snapshot += 1
+
+    def sync(self):
+        """把已写入的增量同步到磁盘"""
+        if self._file is not None and self._unsynced:
+            os.fsync(self._file.fileno())
+            self._unsynced = 0
+
+    def close(self):
+        """同步并关闭当前日志段"""
+        if self._file is not None:
+            self.sync()
+            self._file.close()
+            self._file = None
+
+    def _compact_in_background(self):
+        """后台删除已被新快照覆盖的旧代文件"""
+        keep_from = self.generation - JOURNAL_KEEP_GENERATIONS + 1
+        if self._compactor is not None and self._compactor.is_alive():
+            return
+        self._compactor = threading.Thread(target=_remove_generations_before,
+                                           args=(self.directory, keep_from), daemon=True)
+        self._compactor.start()
+
+
+def _remove_generations_before(directory: str, generation: int):
+    """删除早于指定代的快照与日志段"""
+    for filename in os.listdir(directory):
+        match = re.match(r"^(?:snapshot|journal)_(\d+)\.(?:json|log)$", filename)
+        if match and int(match.group(1)) < generation:
+            try:
+                os.remove(os.path.join(directory, filename))
+            except OSError:
+                continue
+
+
+def _generations(directory: str) -> list:
+    """目录中已有快照的代号，从新到旧"""
+    if not os.path.isdir(directory):
+        return []
+    return sorted((int(match.group(1)) for match in map(_SNAPSHOT_NAME.match, os.listdir(directory)) if match),
+                  reverse=True)
+
+
+def _latest_generation(directory: str) -> int:
+    """目录中最新快照的代号，没有则为 0"""
+    return next(iter(_generations(directory)), 0)
+
+
+def _apply_delta(state: GameState, delta: dict):
+    """把一行增量应用到状态上"""
+    for name, value in delta.get("set", {}).items():
+        setattr(state, name, value)
+    for year, name, args in delta.get("log", []):
+        state.message_log.append(year, name, *args)
+        state.chronicle.append(year, name, *args)
+    if "metrics_full" in delta:
+        state.data_log = MetricsStore.from_data(delta["metrics_full"])
+    elif "metrics" in delta:
+        state.data_log.extend_rows(delta["metrics"]["rows"], delta["metrics"]["turns"])
+
+
+def load_journal(directory: str = JOURNAL_DIR) -> dict:
+    """
+    读取自动存档：最新快照 + 其后的增量日志
+    最新快照无法读取时依次退回更早的一代
+    返回: {"success": bool, "message": str, "state": GameState, "generation": int}
+    """
+    generations = _generations(directory)
+    if not generations:
+        return {"success": False, "message": "没有自动存档！", "state": None, "generation": 0}
+
+    for generation in generations:
+        try:
+            with open(os.path.join(directory, f"snapshot_{generation}.json"), "r", encoding="utf-8") as f:
+                state = GameState.from_dict(json.load(f))
+            break
+        except (json.JSONDecodeError, SaveVersionError, IOError, KeyError, TypeError, AttributeError) as e:
+            # 内容是合法 JSON 但结构不对的快照同样退回上一代
+            error = e
+    else:
+        return {"success": False, "message": f"读档失败: {str(error)}", "state": None, "generation": 0}
+
+    journal_path = os.path.join(directory, f"journal_{generation}.log")
+    if os.path.exists(journal_path):
+        with open(journal_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    delta = json.loads(line)
+                except json.JSONDecodeError:
+                    # 崩溃时写了一半的最后一行
+                    break
+                _apply_delta(state, delta)
+
+    return {"success": True, "message": "读档成功！", "state": state, "generation": generation}
+
+
+def open_journal(directory: str = JOURNAL_DIR) -> tuple:
+    """
+    继续上次的自动存档：恢复状态，并返回接着写入的日志对象
+    返回: (SaveJournal, 读档结果)
+    """
+    result = load_journal(directory)
+    journal = SaveJournal(directory)
+    if result["success"]:
+        journal.reset(result["state"])
+    return journal, result
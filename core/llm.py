@@ -0,0 +1,251 @@
+"""LLM调用
+
+同步接口走 http.client；异步接口(aLLM_*)用 asyncio 流直接收发 HTTP，等待响应时不占用线程，
+同一事件循环上的多个会话的请求可以同时进行，并共用一个连接池(LLMPool)里的长连接。
+"""
+import asyncio
+import http.client
+import json
+import threading
+import time
+from typing import Optional
+
+from config.settings import CHEAP_MODEL_ID, CONNECTION, HEADERS, LLM_HOST, LLM_PORT, LLM_POOL_SIZE
+from core.profiler import profiled
+
+# http.client 连接不能跨线程共用：主线程沿用全局连接，其余线程各自建立
+_local = threading.local()
+
+
+def _connection() -> http.client.HTTPSConnection:
+    """获取当前线程的连接"""
+    if threading.current_thread() is threading.main_thread():
+        return CONNECTION
+    if not hasattr(_local, "connection"):
+        _local.connection = http.client.HTTPSConnection(LLM_HOST)
+    return _local.connection
+
+
+def _payload(message, tools=None) -> str:
+    """对话补全请求体"""
+    body = {
+        "model": CHEAP_MODEL_ID,
+        "stream": False,
+        "messages": message,
+        "stream_options": {
+            "include_usage": True
+        }
+    }
+    if tools:
+        body["tools"] = tools
+    return json.dumps(body)
+
+
+@profiled("llm.request")
+def _request(message, tools=None) -> dict:
+    """发送一次对话补全请求，返回解析后的响应"""
+    connection = _connection()
+    connection.request("POST", "/api/v1/chat/completions", _payload(message, tools), HEADERS)
+    res = connection.getresponse()
+    return json.loads(res.read().decode('utf-8'))
+
+
+def _encode_request(payload: str, host: str) -> bytes:
+    body = payload.encode("utf-8")
+    lines = [
+        "POST /api/v1/chat/completions HTTP/1.1",
+        f"Host: {host}",
+        f"Content-Length: {len(body)}",
+        *(f"{name}: {value}" for name, value in HEADERS.items()),
+    ]
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("utf-8") + body
+
+
+async def _read_response(reader: asyncio.StreamReader) -> tuple:
+    """
+    读取一个 HTTP 响应(支持 Content-Length 与 chunked)
+    返回: (正文, 连接能否继续复用)
+    """
+    status = await reader.readline()
+    if not status:
+        raise EOFError("连接已被关闭")
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    keep_alive = headers.get("connection", "").lower() != "close"
+
+    if headers.get("transfer-encoding", "").lower() == "chunked":
+        chunks = []
+        while True:
+            size = int((await reader.readline()).split(b";")[0], 16)
+            if size == 0:
+                # 跳过 trailer 直到空行
+                while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    pass
+                return b"".join(chunks), keep_alive
+            chunks.append(await reader.readexactly(size))
+            await reader.readline()
+    if "content-length" in headers:
+        return await reader.readexactly(int(headers["content-length"])), keep_alive
+    return await reader.read(), False
+
+
+class LLMPool:
+    """
+    异步连接池：同一事件循环上的所有会话共用最多 size 条长连接
+    超出的请求排队等待空闲连接，不会为每个会话各建一条连接
+    须在事件循环中创建，只能在该事件循环中使用
+    """
+
+    def __init__(self, host: str = LLM_HOST, port: int = LLM_PORT, ssl: bool = True,
+                 size: int = LLM_POOL_SIZE):
+        self.host = host
+        self.port = port
+        self.ssl = ssl
+        self.loop = asyncio.get_running_loop()
+        self._slots = asyncio.Semaphore(size)
+        self._idle = []  # 空闲连接 (reader, writer)
+        # 统计
+        self.requests = 0
+        self.connects = 0
+
+    async def _open(self) -> tuple:
+        self.connects += 1
+        return await asyncio.open_connection(self.host, self.port, ssl=self.ssl or None)
+
+    async def request(self, payload: str) -> dict:
+        """发送一次请求，返回解析后的响应"""
+        async with self._slots:
+            self.requests += 1
+            data = _encode_request(payload, self.host)
+            while True:
+                reused = bool(self._idle)
+                reader, writer = self._idle.pop() if reused else await self._open()
+                try:
+                    writer.write(data)
+                    await writer.drain()
+                    body, keep_alive = await _read_response(reader)
+                except (OSError, EOFError):
+                    writer.close()
+                    if reused:
+                        # 空闲连接可能已被服务端关闭，换一条重试
+                        continue
+                    raise
+                except BaseException:
+                    # 被取消等情况下连接状态未知，不再复用
+                    writer.close()
+                    raise
+                if keep_alive:
+                    self._idle.append((reader, writer))
+                else:
+                    writer.close()
+                return json.loads(body.decode("utf-8"))
+
+    def close(self):
+        while self._idle:
+            self._idle.pop()[1].close()
+
+
+_pool: Optional[LLMPool] = None
+
+
+def get_pool() -> LLMPool:
+    """当前事件循环共用的连接池"""
+    global _pool
+    if _pool is None or _pool.loop is not asyncio.get_running_loop():
+        # 旧连接池属于已结束的事件循环，直接丢弃
+        _pool = LLMPool()
+    return _pool
+
+
+def set_pool(pool: LLMPool):
+    """替换当前事件循环使用的连接池(如连到本地测试服务)"""
+    global _pool
+    if _pool is not None and _pool.loop is pool.loop:
+        _pool.close()
+    _pool = pool
+
+
+@profiled("llm.request")
+async def _arequest(message, tools=None) -> dict:
+    """异步发送一次对话补全请求，返回解析后的响应"""
+    return await get_pool().request(_payload(message, tools))
+
+
+def LLM_invoke(message, tools=None):
+    """调用LLM"""
+    return LLM_invoke_detail(message, tools)["content"]
+
+
+def LLM_invoke_detail(message, tools=None) -> dict:
+    """
+    调用LLM并返回耗时与用量
+    返回: {"content": str, "usage": dict, "elapsed": float}
+    """
+    start = time.perf_counter()
+    obj = _request(message, tools)
+    return _detail(message, obj, time.perf_counter() - start)
+
+
+async def aLLM_invoke(message, tools=None):
+    """异步调用LLM"""
+    return (await aLLM_invoke_detail(message, tools))["content"]
+
+
+async def aLLM_invoke_detail(message, tools=None) -> dict:
+    """异步调用LLM并返回耗时与用量，返回格式同 LLM_invoke_detail"""
+    start = time.perf_counter()
+    obj = await _arequest(message, tools)
+    return _detail(message, obj, time.perf_counter() - start)
+
+
+def _detail(message, obj: dict, elapsed: float) -> dict:
+    """从响应中取出回复内容与用量"""
+    try:
+        content = obj["choices"][0]["message"]["content"]
+    except:
+        print("msg=", message)
+        print("obj=", obj)
+        content = "胜算云API错误"
+    return {"content": content, "usage": obj.get("usage") or {}, "elapsed": elapsed}
+
+
+def LLM_invoke_tools(message, tools) -> dict:
+    """
+    调用LLM并解析工具调用，一次请求可返回多个工具调用结果
+    返回: {"content": str, "tool_calls": [(name, arguments_dict), ...]}
+    """
+    return _tool_calls(message, _request(message, tools))
+
+
+async def aLLM_invoke_tools(message, tools) -> dict:
+    """异步调用LLM并解析工具调用，返回格式同 LLM_invoke_tools"""
+    return _tool_calls(message, await _arequest(message, tools))
+
+
+def _tool_calls(message, obj: dict) -> dict:
+    """从响应中解析回复正文与工具调用"""
+    try:
+        reply = obj["choices"][0]["message"]
+    except (KeyError, IndexError, TypeError):
+        print("msg=", message)
+        print("obj=", obj)
+        return {"content": "", "tool_calls": []}
+
+    calls = []
+    for call in reply.get("tool_calls") or []:
+        function = call.get("function", {})
+        try:
+            arguments = json.loads(function.get("arguments") or "{}")
+        except json.JSONDecodeError:
+            # 参数不是合法JSON的调用直接丢弃，由调用方按缺失处理
+            continue
+        if not isinstance(arguments, dict):
+            # 参数须为 JSON 对象，列表、字符串、数字同样丢弃
+            continue
+        calls.append((function.get("name", ""), arguments))
+    return {"content": reply.get("content") or "", "tool_calls": calls}
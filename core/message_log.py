@@ -0,0 +1,159 @@
+"""消息日志：定长环形缓冲区，按模板编号+参数存储，显示时才格式化"""
+from array import array
+from typing import Iterator, Optional
+
+from config.settings import MESSAGE_LOG_CAPACITY
+
+
+# 日志模板: 模板名 -> (分类, 格式串)，格式串用 {0} {1} 引用参数
+LOG_TEMPLATES = {
+    "raw": ("system", "{0}"),
+    "invalid_input": ("system", "无效输入。"),
+    "invalid_choice": ("system", "无效的输入"),
+    "dispatch": ("disciples", "成功派遣 {0} 名弟子去{1}。"),
+    "dispatch_fail": ("disciples", "没有足够的空闲弟子！"),
+    "recall": ("disciples", "成功召回 {0} 名去{1}的弟子。"),
+    "recall_fail": ("disciples", "没有这么多正在工作的弟子！"),
+    "vault_upgrade": ("sect", "灵库扩建成功！上限 {0} → {1}"),
+    "cave_upgrade": ("sect", "洞府扩建成功！上限 {0} → {1}"),
+    "upgrade_fail": ("sect", "灵石不足，扩建需要 {0} 灵石。"),
+    "mining_gain": ("settlement", "弟子挖矿产出: {0} 灵石"),
+    "recruit_success": ("settlement", "招募弟子成功：新增 {0} 名弟子！"),
+    "recruit_none": ("settlement", "本轮未招募到新弟子。"),
+    "event_result": ("event", "事件结果: {0}"),
+    "llm_summary": ("llm", "LLM 总结：{0}"),
+    "save_result": ("save", "{0}"),
+    "load_ok": ("save", "读档成功！从 {0} 读取"),
+    "load_fail": ("save", "读档失败：{0}"),
+    "no_saves": ("save", "没有发现存档文件。"),
+    "invalid_slot": ("save", "无效的存档编号"),
+    "rewind": ("system", "已回退到：{0}"),
+    "rewind_none": ("system", "本局还没有可以回退的操作。"),
+    "llm_fail": ("llm", "天机推演失败：{0}"),
+    "record_stop": ("system", "录像已停止(读档或回退后无法重现)：{0}"),
+}
+
+# 模板与分类在缓冲区中以小整数编号存储
+TEMPLATE_NAMES = tuple(LOG_TEMPLATES)
+TEMPLATE_IDS = {name: i for i, name in enumerate(TEMPLATE_NAMES)}
+_FORMATS = tuple(LOG_TEMPLATES[name][1] for name in TEMPLATE_NAMES)
+CATEGORIES = tuple(dict.fromkeys(category for category, _ in LOG_TEMPLATES.values()))
+_TEMPLATE_CATEGORY = tuple(CATEGORIES.index(LOG_TEMPLATES[name][0]) for name in TEMPLATE_NAMES)
+# 每个模板的参数个数：单参数直接存参数本身，不再包一层元组
+_ARITY = tuple(fmt.count("{") for fmt in _FORMATS)
+
+
+def pack_args(tid: int, args: tuple):
+    """压缩参数：无参数存 None，单参数存参数本身，多参数存元组"""
+    return args[0] if _ARITY[tid] == 1 else (args or None)
+
+
+def unpack_args(tid: int, packed) -> tuple:
+    """还原 pack_args 压缩的参数"""
+    return (packed,) if _ARITY[tid] == 1 else (packed or ())
+
+
+def format_body(tid: int, packed) -> str:
+    """格式化消息正文(不含年份)"""
+    return _FORMATS[tid].format(*unpack_args(tid, packed))
+
+
+def format_entry(year: int, tid: int, packed) -> str:
+    """格式化带年份的消息"""
+    return f"第{year}年 {format_body(tid, packed)}"
+
+
+class MessageLog:
+    """
+    定长环形缓冲区
+    年份与模板编号存于定长数组，参数存于预分配列表，追加为 O(1) 且不扩容
+    """
+    __slots__ = ("capacity", "_years", "_templates", "_args", "_start", "_count")
+
+    def __init__(self, capacity: int = MESSAGE_LOG_CAPACITY):
+        self.capacity = capacity
+        self._years = array("i", bytes(4 * capacity))
+        self._templates = array("H", bytes(2 * capacity))
+        self._args = [None] * capacity
+        self._start = 0
+        self._count = 0
+
+    def append(self, year: int, template: str, *args):
+        """追加一条记录，缓冲区满时覆盖最老的记录"""
+        if self._count < self.capacity:
+            index = (self._start + self._count) % self.capacity
+            self._count += 1
+        else:
+            index = self._start
+            self._start = (self._start + 1) % self.capacity
+        tid = TEMPLATE_IDS[template]
+        self._years[index] = year
+        self._templates[index] = tid
+        self._args[index] = pack_args(tid, args)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _index(self, i: int) -> int:
+        return (self._start + i) % self.capacity
+
+    def _format(self, index: int) -> str:
+        return format_entry(self._years[index], self._templates[index], self._args[index])
+
+    def __iter__(self) -> Iterator[str]:
+        """按时间顺序遍历格式化后的消息"""
+        for i in range(self._count):
+            yield self._format(self._index(i))
+
+    def recent(self, n: int) -> list:
+        """最近 n 条格式化后的消息(旧 → 新)"""
+        n = min(n, self._count)
+        return [self._format(self._index(i)) for i in range(self._count - n, self._count)]
+
+    def filter(self, category: str, year: Optional[int] = None) -> list:
+        """按分类(及年份)筛选消息，比较的是分类编号而不是消息文字"""
+        cid = CATEGORIES.index(category)
+        result = []
+        for i in range(self._count):
+            index = self._index(i)
+            if _TEMPLATE_CATEGORY[self._templates[index]] != cid:
+                continue
+            if year is not None and self._years[index] != year:
+                continue
+            result.append(self._format(index))
+        return result
+
+    def records(self) -> Iterator[tuple]:
+        """按时间顺序遍历原始记录 (年份, 模板名, 参数元组)"""
+        for i in range(self._count):
+            index = self._index(i)
+            tid = self._templates[index]
+            yield self._years[index], TEMPLATE_NAMES[tid], unpack_args(tid, self._args[index])
+
+    def snapshot(self) -> "MessageLog":
+        """复制一份(容量有界，复制代价固定)"""
+        log = MessageLog.__new__(MessageLog)
+        log.capacity = self.capacity
+        log._years = array("i", self._years)
+        log._templates = array("H", self._templates)
+        log._args = list(self._args)
+        log._start, log._count = self._start, self._count
+        return log
+
+    def to_data(self) -> dict:
+        """序列化为存档数据"""
+        return {
+            "capacity": self.capacity,
+            "records": [[year, name, list(args)] for year, name, args in self.records()],
+        }
+
+    @classmethod
+    def from_data(cls, data: dict) -> "MessageLog":
+        """从存档数据恢复，未知模板按原文保存"""
+        log = cls(data.get("capacity", MESSAGE_LOG_CAPACITY))
+        for year, name, args in data.get("records", []):
+            if name in TEMPLATE_IDS:
+                log.append(year, name, *args)
+            else:
+                log.append(year, "raw", " ".join(str(arg) for arg in args))
+        return log
@@ -0,0 +1,155 @@
+"""宗门数据指标：按列存储的每回合数据
+
+每列是定宽数值数组(array)，每回合追加一行，不产生逐行字典。
+行数达到上限时自动隔行降采样，采样间隔翻倍，长局内存保持有界。
+"""
+import bisect
+import csv
+import sys
+import zipfile
+from array import array
+
+from config.settings import METRICS_CAPACITY
+
+# 列定义: (列名, array 类型码)
+METRIC_COLUMNS = (
+    ("year", "q"),
+    ("wealth", "d"),
+    ("disciples_total", "q"),
+    ("disciples_mining", "q"),
+    ("disciples_recruiting", "q"),
+    ("vault_level", "q"),
+    ("cave_level", "q"),
+)
+
+_BYTE_ORDER = "<" if sys.byteorder == "little" else ">"
+_NPY_DTYPES = {"q": "i8", "d": "f8"}
+
+
+def _npy_header(typecode: str, length: int) -> bytes:
+    """生成 .npy 1.0 格式的文件头"""
+    header = "{'descr': '%s%s', 'fortran_order': False, 'shape': (%d,), }" % (
+        _BYTE_ORDER, _NPY_DTYPES[typecode], length)
+    # 魔数(6) + 版本(2) + 长度(2) + 文件头，总长按 64 字节对齐，以换行结尾
+    padding = 64 - (10 + len(header) + 1) % 64
+    header = (header + " " * padding + "\n").encode("latin1")
+    return b"\x93NUMPY\x01\x00" + len(header).to_bytes(2, "little") + header
+
+
+class MetricsStore:
+    """按列存储的指标表"""
+    __slots__ = ("capacity", "stride", "turns", "columns")
+
+    def __init__(self, capacity: int = METRICS_CAPACITY):
+        self.capacity = capacity
+        self.stride = 1  # 每隔多少回合记录一行
+        self.turns = 0  # 已提交的回合数(含未记录的)
+        self.columns = {name: array(typecode) for name, typecode in METRIC_COLUMNS}
+
+    def __len__(self) -> int:
+        return len(self.columns["year"])
+
+    def append(self, *values):
+        """按 METRIC_COLUMNS 顺序追加一行，降采样期间未到采样间隔的回合直接跳过"""
+        turn = self.turns
+        self.turns += 1
+        if turn % self.stride:
+            return
+        for column, value in zip(self.columns.values(), values):
+            column.append(value)
+        if len(self) >= self.capacity:
+            self._downsample()
+
+    def _downsample(self):
+        """隔行删除，采样间隔翻倍(换成新数组，旧数组不再改动，回退标记可继续引用)"""
+        self.columns = {name: column[::2] for name, column in self.columns.items()}
+        self.stride *= 2
+
+    def mark(self) -> tuple:
+        """
+        当前内容的回退标记，代价 O(1)
+        各列只追加，降采样时整体换成新数组，因此记下列字典与行数即可还原
+        """
+        return self.columns, len(self), self.turns, self.stride
+
+    def rewind(self, mark: tuple):
+        """还原到 mark() 时的内容"""
+        columns, length, turns, stride = mark
+        if columns is self.columns:
+            for column in columns.values():
+                del column[length:]
+        else:
+            # 之后发生过降采样，从旧数组复制
+            self.columns = {name: column[:length] for name, column in columns.items()}
+        self.turns, self.stride = turns, stride
+
+    def _row_range(self, start_year: int, end_year: int) -> tuple:
+        years = self.columns["year"]
+        return bisect.bisect_left(years, start_year), bisect.bisect_right(years, end_year)
+
+    def query(self, start_year: int, end_year: int, names=None) -> dict:
+        """查询 [start_year, end_year] 年份范围内的数据，返回 {列名: 数组切片}"""
+        lo, hi = self._row_range(start_year, end_year)
+        names = names or self.columns.keys()
+        return {name: self.columns[name][lo:hi] for name in names}
+
+    def trend(self, name: str, rows: int) -> tuple:
+        """最近若干行中某列的 (起始年份, 起始值, 最新值)"""
+        column = self.columns[name]
+        if not column:
+            return None
+        first = max(0, len(column) - rows)
+        return self.columns["year"][first], column[first], column[-1]
+
+    def rows(self, start: int = 0) -> list:
+        """第 start 行起的数据，每行按 METRIC_COLUMNS 顺序"""
+        return [list(row) for row in zip(*(column[start:] for column in self.columns.values()))]
+
+    def extend_rows(self, rows: list, turns: int):
+        """直接追加已采样的行(回放存档日志用)，并同步回合计数"""
+        for row in rows:
+            for column, value in zip(self.columns.values(), row):
+                column.append(value)
+        self.turns = turns
+
+    def export_npz(self, path: str):
+        """导出为 numpy 可直接读取的 .npz，各列数组缓冲区直接写入，不做中间拷贝"""
+        with zipfile.ZipFile(path, "w", zipfile.ZIP_STORED) as archive:
+            for name, column in self.columns.items():
+                with archive.open(f"{name}.npy", "w", force_zip64=True) as f:
+                    f.write(_npy_header(column.typecode, len(column)))
+                    f.write(memoryview(column))
+
+    def export_csv(self, path: str):
+        """导出为 CSV"""
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(self.columns.keys())
+            writer.writerows(zip(*self.columns.values()))
+
+    def snapshot(self) -> "MetricsStore":
+        """复制一份(行数有界，复制代价固定)"""
+        store = MetricsStore.__new__(MetricsStore)
+        store.capacity, store.stride, store.turns = self.capacity, self.stride, self.turns
+        store.columns = {name: array(column.typecode, column) for name, column in self.columns.items()}
+        return store
+
+    def to_data(self) -> dict:
+        """序列化为存档数据"""
+        return {
+            "capacity": self.capacity,
+            "stride": self.stride,
+            "turns": self.turns,
+            "columns": {name: column.tolist() for name, column in self.columns.items()},
+        }
+
+    @classmethod
+    def from_data(cls, data) -> "MetricsStore":
+        """从存档数据恢复"""
+        store = cls(data.get("capacity", METRICS_CAPACITY))
+        store.stride = data.get("stride", 1)
+        store.turns = data.get("turns", 0)
+        for name, values in data.get("columns", {}).items():
+            if name in store.columns:
+                store.columns[name].fromlist(values)
+        return store
@@ -0,0 +1,218 @@
+"""NPC对话：LLM生成回复
+
+提示词布局为「固定的NPC人设前缀 + 最近几条对话的滚动尾部」。
+人设前缀对同一NPC逐字节不变，服务端的前缀缓存可以命中；
+尾部长度固定，每轮发送的内容不再随对话历史线性增长。
+对话历史本身也是有界的(DialogueHistory)，超出窗口的部分折叠为摘要，长对话的内存不再增长。
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Optional
+
+from config.settings import (
+    NPCS,
+    DIALOGUE_TAIL_MESSAGES,
+    DIALOGUE_MAX_WORKERS,
+    DIALOGUE_FULL_HISTORY,
+    DIALOGUE_WINDOW,
+    DIALOGUE_SUMMARY_CHARS,
+    DIALOGUE_SUMMARY_SNIPPET,
+)
+from core.llm import LLM_invoke_detail, aLLM_invoke_detail
+
+
+_SPEAKERS = {"player": "玩家", "npc": "对方"}
+
+
+def _fold(summary: str, entries: tuple) -> str:
+    """把移出窗口的对话折叠进摘要，摘要超长时只保留最近的部分"""
+    parts = [summary] if summary else []
+    for entry in entries:
+        speaker = _SPEAKERS.get(entry["role"], entry["role"])
+        parts.append(f"{speaker}：{entry['content'][:DIALOGUE_SUMMARY_SNIPPET]}")
+    text = "；".join(parts)
+    if len(text) > DIALOGUE_SUMMARY_CHARS:
+        text = "……" + text[-(DIALOGUE_SUMMARY_CHARS - 2):]
+    return text
+
+
+def _entry_chars(entries) -> int:
+    return sum(len(entry["content"]) for entry in entries)
+
+
+class DialogueHistory:
+    """
+    有界的对话历史：保留最近 window 条，更早的对话折叠为一段摘要
+    不可变：extend 返回新对象，引用旧对象的状态不受影响
+    可以像列表一样取长度、遍历与切片(只包含窗口内的对话)
+    """
+    __slots__ = ("entries", "summary", "dropped", "chars")
+
+    def __init__(self, entries=(), summary: str = "", dropped: int = 0, chars: Optional[int] = None):
+        self.entries = tuple(entries)
+        self.summary = summary
+        self.dropped = dropped  # 已折叠进摘要的条数
+        # 全部对话(含已折叠的)的总字数，用于统计完整历史方式本应发送的量
+        self.chars = _entry_chars(self.entries) if chars is None else chars
+
+    def extend(self, new_entries, window: int = DIALOGUE_WINDOW) -> "DialogueHistory":
+        """追加若干条对话，返回新的历史"""
+        new_entries = tuple(new_entries)
+        entries = self.entries + new_entries
+        chars = self.chars + _entry_chars(new_entries)
+        overflow = len(entries) - window
+        if overflow <= 0:
+            return DialogueHistory(entries, self.summary, self.dropped, chars)
+        return DialogueHistory(entries[overflow:], _fold(self.summary, entries[:overflow]),
+                               self.dropped + overflow, chars)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def __getitem__(self, index):
+        return self.entries[index]
+
+    def __eq__(self, other):
+        if isinstance(other, DialogueHistory):
+            return (self.entries, self.summary, self.dropped) == (other.entries, other.summary, other.dropped)
+        return NotImplemented
+
+    def __repr__(self):
+        return f"DialogueHistory({len(self.entries)} 条, 已折叠 {self.dropped} 条)"
+
+    def to_data(self) -> dict:
+        """序列化为检查点数据"""
+        return {"entries": list(self.entries), "summary": self.summary, "dropped": self.dropped,
+                "chars": self.chars}
+
+    @classmethod
+    def from_data(cls, data: dict) -> "DialogueHistory":
+        return cls(data.get("entries", ()), data.get("summary", ""), data.get("dropped", 0), data.get("chars"))
+
+
+@lru_cache(maxsize=None)
+def build_persona(npc_id: str) -> str:
+    """NPC人设前缀(同一NPC始终返回相同文本)"""
+    npc = NPCS.get(npc_id, {})
+    samples = "\n".join(f"- {line}" for line in npc.get("dialogues", []))
+    return (
+        f"{npc.get('persona', '你是修真界的一名修士。')}\n"
+        f"你的名字是{npc.get('name', 'NPC')}，身份是{npc.get('title', '修士')}。\n"
+        "请始终以该角色的口吻、用简短的仙侠风中文回复玩家，每次不超过三句话。\n"
+        f"你说话的风格示例：\n{samples}"
+    )
+
+
+def build_messages(npc_id: str, user_input: str, history: list,
+                   full_history: bool = DIALOGUE_FULL_HISTORY) -> list:
+    """组装请求消息：人设前缀 + 早先对话摘要(如有) + 对话尾部 + 本轮玩家输入"""
+    tail = history if full_history else history[-DIALOGUE_TAIL_MESSAGES:]
+    messages = [{"role": "system", "content": build_persona(npc_id)}]
+    summary = getattr(history, "summary", "")
+    if summary:
+        messages.append({"role": "system", "content": f"此前的对话摘要：{summary}"})
+    for entry in tail:
+        role = "assistant" if entry["role"] == "npc" else "user"
+        messages.append({"role": role, "content": entry["content"]})
+    messages.append({"role": "user", "content": user_input})
+    return messages
+
+
+def _prompt_chars(messages: list) -> int:
+    return sum(len(m["content"]) for m in messages)
+
+
+def full_history_chars(npc_id: str, user_input: str, history) -> int:
+    """
+    完整历史方式(人设 + 从头到尾的全部对话 + 本轮输入)本应发送的字数
+    有界历史按其记录的总字数计算(包含已折叠进摘要的对话)，普通列表按全部条目计算
+    """
+    chars = getattr(history, "chars", None)
+    if chars is None:
+        chars = _entry_chars(history)
+    return len(build_persona(npc_id)) + chars + len(user_input)
+
+
+class DialogueStats:
+    """
+    对话请求的耗时与发送量统计，同时记录完整历史方式本应发送的字数用于对比
+    只保存累计值，长期运行的服务器中不随请求次数增长；并发请求可以同时记录
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.count = 0
+        self.elapsed = 0.0
+        self.prompt_chars = 0
+        self.full_history_chars = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+
+    def record(self, npc_id: str, messages: list, full_chars: int, result: dict):
+        usage = result["usage"]
+        with self._lock:
+            self.count += 1
+            self.elapsed += result["elapsed"]
+            self.prompt_chars += _prompt_chars(messages)
+            self.full_history_chars += full_chars
+            self.prompt_tokens += usage.get("prompt_tokens") or 0
+            self.cached_tokens += (usage.get("prompt_tokens_details") or {}).get("cached_tokens") or 0
+
+    def summary(self) -> dict:
+        """汇总：平均耗时、平均发送字数，以及相对完整历史方式的发送量比例"""
+        with self._lock:
+            if not self.count:
+                return {"count": 0}
+            return {
+                "count": self.count,
+                "avg_elapsed": self.elapsed / self.count,
+                "avg_prompt_chars": self.prompt_chars / self.count,
+                "avg_full_history_chars": self.full_history_chars / self.count,
+                "sent_ratio": self.prompt_chars / self.full_history_chars if self.full_history_chars else 1.0,
+                "cached_ratio": self.cached_tokens / self.prompt_tokens if self.prompt_tokens else 0.0,
+            }
+
+
+DIALOGUE_STATS = DialogueStats()
+
+
+def generate_reply(npc_id: str, user_input: str, history: list,
+                   stats: Optional[DialogueStats] = DIALOGUE_STATS) -> str:
+    """生成单个NPC的回复"""
+    messages = build_messages(npc_id, user_input, history)
+    result = LLM_invoke_detail(messages)
+    if stats is not None:
+        stats.record(npc_id, messages, full_history_chars(npc_id, user_input, history), result)
+    return result["content"]
+
+
+async def agenerate_reply(npc_id: str, user_input: str, history: list,
+                          stats: Optional[DialogueStats] = DIALOGUE_STATS) -> str:
+    """异步生成单个NPC的回复(等待LLM时不占用线程)"""
+    messages = build_messages(npc_id, user_input, history)
+    result = await aLLM_invoke_detail(messages)
+    if stats is not None:
+        stats.record(npc_id, messages, full_history_chars(npc_id, user_input, history), result)
+    return result["content"]
+
+
+def generate_replies(npc_ids: list, user_input: str, histories: dict,
+                     stats: Optional[DialogueStats] = DIALOGUE_STATS) -> dict:
+    """
+    多名NPC(如聚会场景)并发生成回复
+    histories: {npc_id: 对话历史}
+    返回: {npc_id: 回复}
+    """
+    if not npc_ids:
+        return {}
+    workers = min(DIALOGUE_MAX_WORKERS, len(npc_ids))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            npc_id: pool.submit(generate_reply, npc_id, user_input, histories.get(npc_id, []), stats)
+            for npc_id in npc_ids
+        }
+        return {npc_id: future.result() for npc_id, future in futures.items()}
@@ -0,0 +1,228 @@
+"""分阶段计时
+
+在回合各阶段(事件检查、结算、LLM 推演、自动存档)、LLM 请求、存读档与状态图节点外包一层计时：
+
+    with profiler.span("turn.settle"):
+        ...
+
+    @profiled("save.write")
+    def save_game(...): ...
+
+每个阶段保留最近 PROFILER_WINDOW 次耗时(环形缓冲区，用于 p50/p95)与累计直方图(用于 Prometheus)。
+每回合结束时调用 profiler.end_turn(year)：配置了导出文件时，把本回合各阶段的次数与耗时追加为一行 JSON，
+并重写 Prometheus 文本格式的直方图；开启 tracemalloc 时同时记录本回合的内存占用与新增分配最多的代码位置。
+"""
+import bisect
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+import tracemalloc
+from array import array
+from typing import Optional
+
+from config.settings import PROFILER_ENABLED, PROFILER_WINDOW, PROFILER_BUCKETS, PROFILER_TRACEMALLOC_TOP
+
+
+class _Phase:
+    """一个阶段的耗时统计"""
+    __slots__ = ("window", "next", "buckets", "count", "total", "turn_count", "turn_total", "turn_max")
+
+    def __init__(self):
+        self.window = array("d")  # 最近 PROFILER_WINDOW 次耗时
+        self.next = 0
+        self.buckets = [0] * (len(PROFILER_BUCKETS) + 1)  # 最后一格为 +Inf
+        self.count = 0
+        self.total = 0.0
+        # 本回合
+        self.turn_count = 0
+        self.turn_total = 0.0
+        self.turn_max = 0.0
+
+    def add(self, elapsed: float):
+        if len(self.window) < PROFILER_WINDOW:
+            self.window.append(elapsed)
+        else:
+            self.window[self.next] = elapsed
+            self.next = (self.next + 1) % PROFILER_WINDOW
+        self.buckets[bisect.bisect_left(PROFILER_BUCKETS, elapsed)] += 1
+        self.count += 1
+        self.total += elapsed
+        self.turn_count += 1
+        self.turn_total += elapsed
+        if elapsed > self.turn_max:
+            self.turn_max = elapsed
+
+    def percentile(self, q: float) -> float:
+        values = sorted(self.window)
+        return values[min(len(values) - 1, int(len(values) * q))] if values else 0.0
+
+
+class _Span:
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler: "Profiler", name: str):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.add(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Profiler:
+    """分阶段计时器，可在多个线程中使用"""
+
+    def __init__(self, enabled: bool = PROFILER_ENABLED):
+        self.enabled = enabled
+        self._phases = {}
+        self._lock = threading.Lock()
+        self.jsonl_path: Optional[str] = None
+        self.prometheus_path: Optional[str] = None
+        self.tracemalloc = False
+        self._snapshot: Optional[tracemalloc.Snapshot] = None
+
+    def configure(self, jsonl_path: Optional[str] = None, prometheus_path: Optional[str] = None,
+                  trace_memory: bool = False):
+        """设置导出文件；trace_memory 为 True 时开启 tracemalloc 并在每回合记录内存"""
+        self.enabled = True
+        for path in (jsonl_path, prometheus_path):
+            if path and os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.jsonl_path = jsonl_path
+        self.prometheus_path = prometheus_path
+        self.tracemalloc = trace_memory
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def span(self, name: str):
+        """计时上下文，未启用时不做任何事"""
+        return _Span(self, name) if self.enabled else _NULL_SPAN
+
+    def add(self, name: str, elapsed: float):
+        """记录一次耗时(秒)"""
+        with self._lock:
+            phase = self._phases.get(name)
+            if phase is None:
+                phase = self._phases[name] = _Phase()
+            phase.add(elapsed)
+
+    def summary(self) -> list:
+        """各阶段统计 [(阶段, 总次数, p50, p95, 窗口内最慢)]，按阶段名排序"""
+        with self._lock:
+            return [(name, phase.count, phase.percentile(0.5), phase.percentile(0.95), max(phase.window))
+                    for name, phase in sorted(self._phases.items())]
+
+    def summary_lines(self) -> list:
+        """用于界面显示的统计表"""
+        rows = self.summary()
+        if not rows:
+            return ["暂无计时数据"]
+        width = max(len(name) for name, *_ in rows)
+        return [f"{name:<{width}}  {count:>7} 次  p50 {_ms(p50):>10}  p95 {_ms(p95):>10}  最慢 {_ms(worst):>10}"
+                for name, count, p50, p95, worst in rows]
+
+    def end_turn(self, year: int):
+        """回合结束：导出本回合统计并清零本回合计数"""
+        if not self.enabled:
+            return
+        with self._lock:
+            phases = {name: [phase.turn_count, round(phase.turn_total * 1000, 4), round(phase.turn_max * 1000, 4)]
+                      for name, phase in self._phases.items() if phase.turn_count}
+            for phase in self._phases.values():
+                phase.turn_count, phase.turn_total, phase.turn_max = 0, 0.0, 0.0
+        if not phases:
+            return
+        record = {"year": year, "time": round(time.time(), 3), "phases": phases}
+        if self.tracemalloc and tracemalloc.is_tracing():
+            record["memory"] = self._memory()
+        if self.jsonl_path:
+            with open(self.jsonl_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        if self.prometheus_path:
+            self.write_prometheus(self.prometheus_path)
+
+    def _memory(self) -> dict:
+        """当前内存占用与相对上一回合新增分配最多的代码位置"""
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+        top = []
+        if self._snapshot is not None:
+            for stat in snapshot.compare_to(self._snapshot, "lineno")[:PROFILER_TRACEMALLOC_TOP]:
+                frame = stat.traceback[0]
+                top.append([f"{frame.filename}:{frame.lineno}", stat.size_diff, stat.count_diff])
+        self._snapshot = snapshot
+        return {"current": current, "peak": peak, "top": top}
+
+    def prometheus_text(self) -> str:
+        """Prometheus 文本格式的各阶段耗时直方图"""
+        lines = ["# HELP spirit_rush_phase_seconds 各阶段耗时",
+                 "# TYPE spirit_rush_phase_seconds histogram"]
+        with self._lock:
+            for name, phase in sorted(self._phases.items()):
+                cumulative = 0
+                for bound, count in zip((*PROFILER_BUCKETS, "+Inf"), phase.buckets):
+                    cumulative += count
+                    lines.append(f'spirit_rush_phase_seconds_bucket{{phase="{name}",le="{bound}"}} {cumulative}')
+                lines.append(f'spirit_rush_phase_seconds_sum{{phase="{name}"}} {phase.total:.6f}')
+                lines.append(f'spirit_rush_phase_seconds_count{{phase="{name}"}} {phase.count}')
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str):
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp, path)
+
+    def reset(self):
+        with self._lock:
+            self._phases.clear()
+
+
+def _ms(seconds: float) -> str:
+    return f"{seconds * 1000:.3f}ms"
+
+
+# 进程内共用的计时器
+profiler = Profiler()
+
+
+def profiled(name: str):
+    """给函数(含 async 函数)加计时的装饰器"""
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with profiler.span(name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with profiler.span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
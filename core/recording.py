@@ -0,0 +1,97 @@
+"""对局录像
+
+录像记录一局游戏的全部输入：各子系统的随机数种子、玩家的每条命令、每回合 LLM 推演的结果，
+以及每回合结算后的校验值，用于无界面回放(server.replay)与回归检查。
+
+文件为 JSON Lines，边玩边追加：
+
+    {"version": 1, "source": "cli", "seeds": {"recruit": ..., "events": ...}}
+    {"c": "dispatch mining 1"}          玩家命令(与 server.game_server 的文本命令相同)
+    {"p": {"chronicle": ..., "event": ...}}   LLM 推演结果
+    {"e": "错误信息"}                    LLM 推演失败
+    {"t": "校验值"}                      回合结算后(进入下一年之前)的宗门状态校验值
+    {"end": {"turns": N, "commands": N, "digest": "校验值"}}
+"""
+import hashlib
+import json
+import os
+from typing import Optional
+
+from core.game_state import GameState
+
+RECORDING_VERSION = 1
+
+
+def state_digest(state: GameState) -> str:
+    """宗门状态的校验值(年份与宗门数据；日志与编年史不参与)"""
+    data = json.dumps([state.game_time, state.sect_data], sort_keys=True, ensure_ascii=False)
+    return hashlib.blake2b(data.encode("utf-8"), digest_size=8).hexdigest()
+
+
+class Recorder:
+    """录制一局游戏，每条记录立即写入文件"""
+
+    def __init__(self, path: str, seeds: dict, source: str = "session"):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._file = open(path, "w", encoding="utf-8")
+        self.turns = 0
+        self.commands = 0
+        self._write({"version": RECORDING_VERSION, "source": source, "seeds": seeds})
+
+    def _write(self, record: dict):
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def command(self, command: str):
+        self.commands += 1
+        self._write({"c": command})
+
+    def plan(self, plan: Optional[dict], error: Optional[Exception] = None):
+        """LLM 推演结果，plan 为 None 表示推演失败(error 为原因)"""
+        self._write({"p": plan} if plan is not None else {"e": str(error)})
+
+    def turn(self, state: GameState):
+        """回合结算完成"""
+        self.turns += 1
+        self._write({"t": state_digest(state)})
+        self._file.flush()
+
+    def close(self, state: Optional[GameState] = None):
+        """结束录制；state 为 None 表示录制中断(如读档、回退)，录像不含结尾校验"""
+        if self._file.closed:
+            return
+        if state is not None:
+            self._write({"end": {"turns": self.turns, "commands": self.commands, "digest": state_digest(state)}})
+        self._file.close()
+
+
+class Recording:
+    """读入的录像"""
+    __slots__ = ("path", "source", "seeds", "commands", "plans", "turns", "end")
+
+    def __init__(self, path: str):
+        self.path = path
+        self.commands = []
+        self.plans = []  # LLM 推演结果，失败时为 OSError
+        self.turns = []
+        self.end: Optional[dict] = None
+        with open(path, encoding="utf-8") as f:
+            header = json.loads(f.readline() or "{}")
+            if header.get("version") != RECORDING_VERSION:
+                raise ValueError(f"不支持的录像版本: {header.get('version')}")
+            self.source = header.get("source", "")
+            self.seeds = header["seeds"]
+            for line in f:
+                record = json.loads(line)
+                if "c" in record:
+                    self.commands.append(record["c"])
+                elif "p" in record:
+                    self.plans.append(record["p"])
+                elif "e" in record:
+                    self.plans.append(OSError(record["e"]))
+                elif "t" in record:
+                    self.turns.append(record["t"])
+                elif "end" in record:
+                    self.end = record["end"]
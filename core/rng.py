@@ -0,0 +1,57 @@
+"""按子系统划分的随机数流
+
+每个用到随机数的子系统(招募结算、事件)各用一个独立的 random.Random，种子分别记录。
+某个子系统多取或少取一次随机数不会影响其他子系统的序列，录像回放时只需恢复各自的种子。
+"""
+import random
+from typing import Optional
+
+# 使用随机数的子系统
+SUBSYSTEMS = ("recruit", "events")
+
+
+def derive_seeds(seed: int) -> dict:
+    """由一个总种子为各子系统派生种子"""
+    return {name: random.Random(f"{seed}:{name}").getrandbits(63) for name in SUBSYSTEMS}
+
+
+class RandomStreams:
+    """一局游戏的各子系统随机数流"""
+
+    def __init__(self, seeds: Optional[dict] = None, seed: Optional[int] = None):
+        """seeds 为各子系统的种子；未给出时由 seed 派生，seed 也未给出时随机选取"""
+        if seeds is None:
+            seeds = derive_seeds(random.SystemRandom().getrandbits(63) if seed is None else seed)
+        self.seeds = {name: int(seeds[name]) for name in SUBSYSTEMS}
+        self._streams = {name: random.Random(value) for name, value in self.seeds.items()}
+
+    def __getitem__(self, name: str) -> random.Random:
+        return self._streams[name]
+
+    def to_data(self) -> dict:
+        """种子与各随机数流的当前状态(用于检查点，恢复后从同一位置继续)"""
+        return {"seeds": self.seeds,
+                "states": {name: _stream_state(stream) for name, stream in self._streams.items()}}
+
+    def getstate(self) -> dict:
+        """各随机数流的内部状态(random.Random.getstate 的结果)，用于本局内回退"""
+        return {name: stream.getstate() for name, stream in self._streams.items()}
+
+    def setstate(self, states: dict):
+        """原地恢复 getstate 的结果，已交给各子系统的随机数流对象不变"""
+        for name, state in states.items():
+            self._streams[name].setstate(state)
+
+    @classmethod
+    def from_data(cls, data: dict) -> "RandomStreams":
+        streams = cls(data["seeds"])
+        for name, state in data.get("states", {}).items():
+            if name in streams._streams:
+                version, internal, gauss_next = state
+                streams._streams[name].setstate((version, tuple(internal), gauss_next))
+        return streams
+
+
+def _stream_state(stream: random.Random) -> list:
+    version, internal, gauss_next = stream.getstate()
+    return [version, list(internal), gauss_next]
@@ -0,0 +1,170 @@
+"""SQLite 存档库
+
+每个槽位一行：年份、保存时间、弟子数等元数据放在带索引的列中，
+完整状态以二进制存档格式(见 core.binary_save)存为 BLOB，只在真正读档时才读取和解析。
+列出、排序、筛选存档只查元数据列，不再逐个读取存档文件。
+读档时通过增量 BLOB I/O 流式读取，只需某一段(如指标表)时其余段直接跳过。
+"""
+import io
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Optional
+
+from core.binary_save import write_save, read_save, read_section
+from core.game_state import GameState
+from core.metrics import MetricsStore
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS saves (
+    slot INTEGER PRIMARY KEY,
+    save_time TEXT NOT NULL,
+    game_time INTEGER NOT NULL,
+    disciples_total INTEGER NOT NULL,
+    wealth REAL NOT NULL,
+    source TEXT NOT NULL,
+    state BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_saves_save_time ON saves(save_time);
+CREATE INDEX IF NOT EXISTS idx_saves_game_time ON saves(game_time);
+CREATE INDEX IF NOT EXISTS idx_saves_disciples ON saves(disciples_total);
+CREATE TABLE IF NOT EXISTS imported_files (
+    filename TEXT PRIMARY KEY,
+    mtime REAL NOT NULL
+);
+"""
+
+# 可排序的列(防止拼接任意 SQL)
+SORT_COLUMNS = ("slot", "save_time", "game_time", "disciples_total", "wealth")
+_META_COLUMNS = "slot, save_time, game_time, disciples_total, wealth, source"
+
+
+def encode_state(state: GameState, save_time: Optional[str] = None) -> bytes:
+    """状态编码为 BLOB"""
+    buffer = io.BytesIO()
+    write_save(buffer, state, save_time=save_time)
+    return buffer.getvalue()
+
+
+class SaveDatabase:
+    """存档库"""
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # 后台自动存档等线程也会使用同一连接，用锁串行化
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.executescript(_SCHEMA)
+
+    def save(self, slot: int, state: GameState, source: str = "game",
+             save_time: Optional[str] = None) -> str:
+        """写入(覆盖)一个槽位，返回保存时间"""
+        save_time = save_time or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        sect = state.sect_data
+        blob = encode_state(state, save_time)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO saves VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (slot, save_time, state.game_time, sect["disciples_total"],
+                 sect["wealth"], source, blob))
+        return save_time
+
+    def list(self, order_by: str = "slot", descending: bool = False,
+             min_game_time: Optional[int] = None, max_game_time: Optional[int] = None,
+             min_disciples: Optional[int] = None, limit: Optional[int] = None) -> list:
+        """查询存档元数据(不读取状态)，返回字典列表"""
+        if order_by not in SORT_COLUMNS:
+            raise ValueError(f"不支持的排序列: {order_by}")
+        conditions, params = [], []
+        if min_game_time is not None:
+            conditions.append("game_time >= ?")
+            params.append(min_game_time)
+        if max_game_time is not None:
+            conditions.append("game_time <= ?")
+            params.append(max_game_time)
+        if min_disciples is not None:
+            conditions.append("disciples_total >= ?")
+            params.append(min_disciples)
+        sql = f"SELECT {_META_COLUMNS} FROM saves"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += f" ORDER BY {order_by} {'DESC' if descending else 'ASC'}"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            return [dict(row) for row in self._conn.execute(sql, params)]
+
+    def _open_blob(self, slot: int):
+        """以类文件对象(增量 BLOB I/O)打开槽位的状态，不存在时返回 None；调用方需持有锁"""
+        row = self._conn.execute("SELECT rowid FROM saves WHERE slot = ?", (slot,)).fetchone()
+        if row is None:
+            return None
+        return self._conn.blobopen("saves", "state", row[0], readonly=True)
+
+    def load(self, slot: int) -> Optional[GameState]:
+        """读取一个槽位的完整状态，不存在时返回 None"""
+        with self._lock:
+            blob = self._open_blob(slot)
+            if blob is None:
+                return None
+            with blob:
+                return read_save(blob)
+
+    def read_section(self, slot: int, name: str):
+        """
+        只读取一个槽位的某一段，其余段不解压，不存在时返回 None
+        core 段返回字典，data_log 段返回 MetricsStore，日志段返回记录列表
+        """
+        with self._lock:
+            blob = self._open_blob(slot)
+            if blob is None:
+                return None
+            with blob:
+                section = read_section(blob, name)
+                return section if isinstance(section, (dict, MetricsStore)) else list(section)
+
+    def delete(self, slot: int) -> bool:
+        with self._lock, self._conn:
+            return self._conn.execute("DELETE FROM saves WHERE slot = ?", (slot,)).rowcount > 0
+
+    def import_json_saves(self, directory: str) -> int:
+        """
+        导入目录中的 save_<槽位>.json 旧存档，文件未变化的不重复导入
+        返回导入的文件数
+        """
+        if not os.path.isdir(directory):
+            return 0
+        with self._lock:
+            known = dict(self._conn.execute("SELECT filename, mtime FROM imported_files"))
+        imported = 0
+        for filename in os.listdir(directory):
+            if not (filename.startswith("save_") and filename.endswith(".json")):
+                continue
+            filepath = os.path.join(directory, filename)
+            mtime = os.path.getmtime(filepath)
+            if known.get(filename) == mtime:
+                continue
+            try:
+                slot = int(filename[len("save_"):-len(".json")])
+                with open(filepath, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if isinstance(data, dict) and isinstance(data.get("state"), dict):
+                    self.save(slot, GameState.from_dict(data["state"]), source=filename,
+                              save_time=data.get("save_time", "未知"))
+                    imported += 1
+            except (ValueError, KeyError, TypeError, IOError):
+                pass
+            # 无法识别的文件同样记下，之后不再反复尝试
+            with self._lock, self._conn:
+                self._conn.execute("INSERT OR REPLACE INTO imported_files VALUES (?, ?)", (filename, mtime))
+        return imported
+
+    def close(self):
+        self._conn.close()
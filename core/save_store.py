@@ -0,0 +1,214 @@
+"""分支存档：按内容寻址、去重存储
+
+存档按部分切成块(宗门数据、消息日志、指标表，编年史每 STORE_CHRONICLE_CHUNK 条一块)，
+每块以内容的 SHA-256 命名，只存一份：
+    objects/ab/abcdef...   zlib 压缩的块内容
+    branches/<名称>.json   分支清单，只记录各部分对应的块哈希
+    refs.json              每个块被多少个分支清单引用
+
+同一局游戏的各个分支共享相同的历史前缀块，上百个分支的占用约等于一份存档加各自的差异。
+从已有分支复制新分支只需复制清单并增加引用计数，不读写任何块。
+引用计数归零的块立即删除。
+"""
+import hashlib
+import json
+import os
+import zlib
+from datetime import datetime
+
+from config.settings import STORE_DIR, STORE_CHRONICLE_CHUNK
+from core.save_system import write_atomic
+
+# 整体存为一块的字段；其余小字段合并为 "core" 块
+_SECTION_FIELDS = ("message_log", "data_log")
+
+
+def _valid_name(name: str) -> bool:
+    """分支名用作文件名，不能为空或包含路径字符"""
+    return bool(name) and not any(c in name for c in '/\\:*?"<>|') and not name.startswith(".")
+
+
+def _encode(value) -> bytes:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"), sort_keys=True).encode("utf-8")
+
+
+class SaveStore:
+    """分支存档仓库"""
+
+    def __init__(self, root: str = STORE_DIR):
+        self.root = root
+        self.objects_dir = os.path.join(root, "objects")
+        self.branches_dir = os.path.join(root, "branches")
+        self.refs_path = os.path.join(root, "refs.json")
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.branches_dir, exist_ok=True)
+        self.refs = self._read_refs()
+        if not os.path.exists(self.refs_path) and self._branch_names():
+            # refs.json 丢失时按清单重新统计，否则释放分支时会删掉其他分支仍在使用的块
+            self.rebuild_refs()
+
+    # ---- 块 ----
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self.objects_dir, digest[:2], digest[2:])
+
+    def _put_chunk(self, value) -> str:
+        """写入一块，已存在则跳过，返回哈希"""
+        data = _encode(value)
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._object_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            write_atomic(path, zlib.compress(data))
+        return digest
+
+    def _get_chunk(self, digest: str):
+        with open(self._object_path(digest), "rb") as f:
+            return json.loads(zlib.decompress(f.read()))
+
+    # ---- 引用计数 ----
+
+    def _read_refs(self) -> dict:
+        if not os.path.exists(self.refs_path):
+            return {}
+        with open(self.refs_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _write_refs(self):
+        write_atomic(self.refs_path, json.dumps(self.refs, separators=(",", ":")))
+
+    @staticmethod
+    def _manifest_chunks(manifest: dict) -> list:
+        chunks = manifest["chunks"]
+        return [chunks["core"], *(chunks[name] for name in _SECTION_FIELDS), *chunks["chronicle"]]
+
+    def _incref(self, manifest: dict):
+        for digest in self._manifest_chunks(manifest):
+            self.refs[digest] = self.refs.get(digest, 0) + 1
+
+    def _decref(self, manifest: dict):
+        """减少引用，归零的块立即删除；引用计数本就没有记录的块(refs.json 过期)保留，由 rebuild_refs 清理"""
+        for digest in self._manifest_chunks(manifest):
+            count = self.refs.get(digest, 0)
+            if count > 1:
+                self.refs[digest] = count - 1
+                continue
+            if self.refs.pop(digest, None) is None:
+                continue
+            try:
+                os.remove(self._object_path(digest))
+            except OSError:
+                continue
+
+    def rebuild_refs(self) -> dict:
+        """按现有分支清单重新统计引用，并删除不再被引用的块(refs.json 丢失或损坏时使用)"""
+        self.refs = {}
+        for name in self._branch_names():
+            self._incref(self._read_manifest(name))
+        removed = 0
+        for prefix in os.listdir(self.objects_dir):
+            for rest in os.listdir(os.path.join(self.objects_dir, prefix)):
+                if prefix + rest not in self.refs:
+                    os.remove(os.path.join(self.objects_dir, prefix, rest))
+                    removed += 1
+        self._write_refs()
+        return {"success": True, "message": f"已清理 {removed} 个无用数据块"}
+
+    # ---- 分支 ----
+
+    def _manifest_path(self, name: str) -> str:
+        return os.path.join(self.branches_dir, f"{name}.json")
+
+    def _branch_names(self) -> list:
+        return [filename[:-5] for filename in os.listdir(self.branches_dir) if filename.endswith(".json")]
+
+    def _read_manifest(self, name: str) -> dict:
+        with open(self._manifest_path(name), "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _replace_manifest(self, name: str, manifest: dict):
+        """写入分支清单，先增加新清单的引用，再释放被覆盖清单的引用"""
+        old = self._read_manifest(name) if os.path.exists(self._manifest_path(name)) else None
+        self._incref(manifest)
+        write_atomic(self._manifest_path(name), json.dumps(manifest, ensure_ascii=False))
+        if old is not None:
+            self._decref(old)
+        self._write_refs()
+
+    def save_branch(self, state: dict, name: str) -> dict:
+        """
+        把状态(GameState.to_dict() 的结果)存为分支，只写入仓库中还没有的块
+        返回: {"success": bool, "message": str}
+        """
+        if not _valid_name(name):
+            return {"success": False, "message": "无效的分支名"}
+        chronicle = state.get("chronicle", [])
+        core = {key: value for key, value in state.items()
+                if key not in _SECTION_FIELDS and key != "chronicle"}
+        chunks = {
+            "core": self._put_chunk(core),
+            **{field: self._put_chunk(state.get(field)) for field in _SECTION_FIELDS},
+            "chronicle": [self._put_chunk(chronicle[i:i + STORE_CHRONICLE_CHUNK])
+                          for i in range(0, len(chronicle), STORE_CHRONICLE_CHUNK)],
+        }
+        manifest = {
+            "save_time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "game_time": state.get("game_time", 0),
+            "chunks": chunks,
+        }
+        try:
+            self._replace_manifest(name, manifest)
+        except IOError as e:
+            return {"success": False, "message": f"存档失败: {str(e)}"}
+        return {"success": True, "message": f"已存为分支「{name}」"}
+
+    def fork_branch(self, source: str, name: str) -> dict:
+        """从已有分支复制新分支：只复制清单并增加引用计数"""
+        if not _valid_name(name):
+            return {"success": False, "message": "无效的分支名"}
+        if not os.path.exists(self._manifest_path(source)):
+            return {"success": False, "message": "分支不存在"}
+        manifest = self._read_manifest(source)
+        manifest["save_time"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self._replace_manifest(name, manifest)
+        return {"success": True, "message": f"已从「{source}」复制分支「{name}」"}
+
+    def load_branch(self, name: str) -> dict:
+        """
+        读取分支
+        返回: {"success": bool, "message": str, "data": dict}
+        """
+        if not os.path.exists(self._manifest_path(name)):
+            return {"success": False, "message": "分支不存在", "data": None}
+        try:
+            chunks = self._read_manifest(name)["chunks"]
+            state = self._get_chunk(chunks["core"])
+            for field in _SECTION_FIELDS:
+                state[field] = self._get_chunk(chunks[field])
+            state["chronicle"] = [record for digest in chunks["chronicle"]
+                                  for record in self._get_chunk(digest)]
+        except (json.JSONDecodeError, zlib.error, IOError) as e:
+            return {"success": False, "message": f"读档失败: {str(e)}", "data": None}
+        return {"success": True, "message": "读档成功！", "data": state}
+
+    def delete_branch(self, name: str) -> dict:
+        """删除分支，并释放只被它引用的块"""
+        if not os.path.exists(self._manifest_path(name)):
+            return {"success": False, "message": "分支不存在"}
+        manifest = self._read_manifest(name)
+        os.remove(self._manifest_path(name))
+        self._decref(manifest)
+        self._write_refs()
+        return {"success": True, "message": "分支已删除"}
+
+    def list_branches(self) -> list:
+        """所有分支的名称、年份与保存时间(按保存时间排序)"""
+        branches = []
+        for name in self._branch_names():
+            manifest = self._read_manifest(name)
+            branches.append({
+                "name": name,
+                "game_time": manifest.get("game_time", 0),
+                "save_time": manifest.get("save_time", "未知"),
+            })
+        return sorted(branches, key=lambda branch: branch["save_time"])
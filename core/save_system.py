@@ -1,10 +1,18 @@
 """存档系统"""
 import json
+import lzma
 import os
-from datetime import datetime
+import sqlite3
+import zlib
 from typing import Optional
 
-from config.settings import SAVE_DIR
+from config.settings import SAVE_DIR, SAVE_DB
+from core.binary_save import SaveFormatError
+from core.game_state import GameState, SaveVersionError
+from core.profiler import profiled
+from core.save_db import SaveDatabase
+
+_database: Optional[SaveDatabase] = None
 
 
 def ensure_save_dir():
@@ -13,103 +21,90 @@ def ensure_save_dir():
         os.makedirs(SAVE_DIR)
 
 
-def get_save_files() -> dict:
-    """获取所有存档文件列表"""
-    ensure_save_dir()
+def write_atomic(filepath: str, data):
+    """写入临时文件并同步磁盘后原子替换，写到一半崩溃不会损坏原文件(data 为 str 或 bytes)"""
+    tmp_path = filepath + ".tmp"
+    mode, encoding = ("wb", None) if isinstance(data, bytes) else ("w", "utf-8")
+    with open(tmp_path, mode, encoding=encoding) as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, filepath)
+
+
+def get_database() -> SaveDatabase:
+    """存档库(首次使用时打开，并导入存档目录中的旧 JSON 存档)"""
+    global _database
+    if _database is None:
+        ensure_save_dir()
+        _database = SaveDatabase(SAVE_DB)
+        _database.import_json_saves(SAVE_DIR)
+    return _database
+
+
+@profiled("save.list")
+def get_save_files(order_by: str = "slot", **filters) -> dict:
+    """
+    获取所有存档的元数据(不读取存档内容)
+    返回: {槽位: {"filename", "save_time", "game_time", "disciples_total", "wealth"}}
+    filters 见 SaveDatabase.list
+    """
     saves = {}
-    
-    for filename in os.listdir(SAVE_DIR):
-        if filename.endswith(".json"):
-            filepath = os.path.join(SAVE_DIR, filename)
-            try:
-                # 从文件名提取槽位号
-                slot = int(filename.replace("save_", "").replace(".json", ""))
-                
-                with open(filepath, "r", encoding="utf-8") as f:
-                    data = json.load(f)
-                    saves[slot] = {
-                        "filename": filename,
-                        "filepath": filepath,
-                        "save_time": data.get("save_time", "未知"),
-                        "game_time": data["state"].get("game_time", {}),
-                        "data": data  # 包含完整的存档数据
-                    }
-            except (ValueError, json.JSONDecodeError, IOError):
-                continue
-    
+    for row in get_database().list(order_by=order_by, **filters):
+        saves[row["slot"]] = {
+            "filename": row["source"] if row["source"] != "game" else f"槽位{row['slot']}",
+            "save_time": row["save_time"],
+            "game_time": row["game_time"],
+            "disciples_total": row["disciples_total"],
+            "wealth": row["wealth"],
+        }
     return saves
 
 
-def save_game(state, slot: int = 1) -> dict:
+@profiled("save.write")
+def save_game(state: GameState, slot: int = 1) -> dict:
     """
-    保存游戏
-    返回: {"success": bool, "message": str, "filepath": str}
+    保存游戏到存档库
+    返回: {"success": bool, "message": str}
     """
-    ensure_save_dir()
-    
-    # 构建存档数据
-    save_data = {
-        "save_time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-        "state": state,
-    }
-    
-    # 生成文件名
-    filename = f"save_{slot}.json"
-    filepath = os.path.join(SAVE_DIR, filename)
-    
     try:
-        with open(filepath, "w", encoding="utf-8") as f:
-            json.dump(save_data, f, ensure_ascii=False, indent=2)
-        
+        get_database().save(slot, state)
         return {
             "success": True,
-            "message": f"存档成功！\n存档位置: {filename}",
-            "filepath": filepath
+            "message": f"存档成功！\n存档位置: 槽位{slot}",
         }
-    except IOError as e:
+    except sqlite3.Error as e:
         return {
             "success": False,
             "message": f"存档失败: {str(e)}",
-            "filepath": ""
         }
 
 
-def load_game(filepath: str) -> dict:
+@profiled("save.load")
+def load_save_state(slot: int) -> dict:
     """
-    读取存档
-    返回: {"success": bool, "message": str, "data": dict}
+    从存档库读取一个槽位
+    返回: {"success": bool, "message": str, "state": GameState}
     """
-    if not os.path.exists(filepath):
-        return {
-            "success": False,
-            "message": "存档文件不存在！",
-            "data": None
-        }
-    
     try:
-        with open(filepath, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        
-        return {
-            "success": True,
-            "message": "读档成功！",
-            "data": data
-        }
-    except (json.JSONDecodeError, IOError) as e:
-        return {
-            "success": False,
-            "message": f"读档失败: {str(e)}",
-            "data": None
-        }
+        state = get_database().load(slot)
+    except (sqlite3.Error, zlib.error, lzma.LZMAError, SaveFormatError, SaveVersionError,
+            json.JSONDecodeError) as e:
+        return {"success": False, "message": f"读档失败: {str(e)}", "state": None}
+    if state is None:
+        return {"success": False, "message": "存档不存在！", "state": None}
+    return {"success": True, "message": "读档成功！", "state": state}
 
 
-def delete_save(filepath: str) -> dict:
-    """删除存档"""
-    if not os.path.exists(filepath):
-        return {"success": False, "message": "存档不存在"}
-    
+def delete_save(slot: int) -> dict:
+    """
+    从存档库删除一个槽位
+    返回: {"success": bool, "message": str}
+    """
     try:
-        os.remove(filepath)
-        return {"success": True, "message": "存档已删除"}
-    except IOError as e:
-        return {"success": False, "message": f"删除失败: {str(e)}"}
\ No newline at end of file
+        deleted = get_database().delete(slot)
+    except sqlite3.Error as e:
+        return {"success": False, "message": f"删除失败: {str(e)}"}
+    if not deleted:
+        return {"success": False, "message": "存档不存在"}
+    return {"success": True, "message": "存档已删除"}
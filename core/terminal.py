@@ -0,0 +1,166 @@
+"""终端渲染：只重绘变化的行
+
+状态区(年份、宗门数据、最近日志)固定在屏幕顶部，用 ANSI 滚动区域(DECSTBM)把下方留给菜单与输入，
+菜单滚动时状态区不动。每次刷新与上一帧逐行比较，只把变化的行用光标定位改写，再清空下方的菜单区。
+不再每次调用 os.system("cls") 启动子进程(Linux 上也没有 cls)。
+中文按两列宽计算，单字宽度与整行的折行结果都有缓存，重复出现的日志行不再重新计算。
+输出不是终端(如重定向到文件)时直接逐行打印。
+"""
+import io
+import os
+import shutil
+import sys
+import time
+import unicodedata
+from functools import lru_cache
+
+from config.settings import RENDER_MIN_INPUT_ROWS, RENDER_WIDTH_CACHE
+
+CSI = "\x1b["
+
+
+@lru_cache(maxsize=None)
+def char_width(ch: str) -> int:
+    """单个字符占的列数：全角/宽字符 2 列，组合字符 0 列"""
+    if unicodedata.combining(ch):
+        return 0
+    return 2 if unicodedata.east_asian_width(ch) in ("W", "F") else 1
+
+
+@lru_cache(maxsize=RENDER_WIDTH_CACHE)
+def text_width(text: str) -> int:
+    """整行占的列数"""
+    if text.isascii():
+        return len(text)
+    return sum(map(char_width, text))
+
+
+@lru_cache(maxsize=RENDER_WIDTH_CACHE)
+def wrap(text: str, width: int) -> tuple:
+    """按显示宽度折行，返回各行组成的元组"""
+    if text_width(text) <= width:
+        return (text,)
+    rows, row, used = [], [], 0
+    for ch in text:
+        w = char_width(ch)
+        if used + w > width:
+            rows.append("".join(row))
+            row, used = [], 0
+        row.append(ch)
+        used += w
+    rows.append("".join(row))
+    return tuple(rows)
+
+
+def _enable_windows_vt(stream) -> bool:
+    """Windows 控制台开启 ANSI 转义序列支持"""
+    import ctypes
+    kernel32 = ctypes.windll.kernel32
+    handle = kernel32.GetStdHandle(-11 if stream is sys.stdout else -12)
+    mode = ctypes.c_uint32()
+    if not kernel32.GetConsoleMode(handle, ctypes.byref(mode)):
+        return False
+    return bool(kernel32.SetConsoleMode(handle, mode.value | 0x0004))
+
+
+class TerminalRenderer:
+    """差量重绘的终端渲染器"""
+
+    def __init__(self, stream=None, size: os.terminal_size = None):
+        self.stream = stream or sys.stdout
+        self._fixed_size = size  # 固定终端大小(测试用)，默认每帧查询
+        self.interactive = self.stream.isatty()
+        if self.interactive and os.name == "nt":
+            self.interactive = _enable_windows_vt(self.stream)
+        self._frame = []  # 上一帧各行(已折行)
+        self._size = None
+        self._region = False  # 是否设置了滚动区域
+        # 统计
+        self.frames = 0
+        self.last_latency = 0.0
+        self.last_bytes = 0
+
+    def render(self, lines: list):
+        """绘制一帧状态区，光标停在状态区下方，之后的 print/input 照常输出"""
+        start = time.perf_counter()
+        size = self._fixed_size or shutil.get_terminal_size()
+        rows = [row for line in lines for row in wrap(line, max(1, size.columns - 1))]
+        if not self.interactive:
+            output = "\n".join(rows) + "\n"
+        else:
+            output = self._diff(rows, size)
+        self.stream.write(output)
+        self.stream.flush()
+        self.frames += 1
+        self.last_bytes = len(output.encode("utf-8"))
+        self.last_latency = time.perf_counter() - start
+
+    def _diff(self, rows: list, size) -> str:
+        out = []
+        if size != self._size:
+            # 首帧或窗口大小变化：清屏后整帧重画
+            out.append(f"{CSI}r{CSI}2J")
+            self._frame, self._region, self._size = [], False, size
+        height = len(rows)
+        if height + RENDER_MIN_INPUT_ROWS > size.lines:
+            # 状态区太高放不下固定区域，退回整屏重画
+            out.append(f"{CSI}r{CSI}2J{CSI}H")
+            out.append("\n".join(rows) + "\n")
+            self._frame, self._region = [], False
+            return "".join(out)
+
+        previous = self._frame
+        for i, row in enumerate(rows):
+            if i >= len(previous) or previous[i] != row:
+                out.append(f"{CSI}{i + 1};1H{row}{CSI}K")
+        if height != len(previous) or not self._region:
+            # 设置滚动区域会把光标移回左上角，之后再定位
+            out.append(f"{CSI}{height + 1};{size.lines}r")
+            self._region = True
+        # 清空下方菜单区，光标停在状态区下一行
+        out.append(f"{CSI}{height + 1};1H{CSI}J")
+        self._frame = rows
+        return "".join(out)
+
+    def close(self):
+        """恢复整屏滚动，光标移到最后一行"""
+        if self.interactive and self._region:
+            self.stream.write(f"{CSI}r{CSI}{shutil.get_terminal_size().lines};1H\n")
+            self.stream.flush()
+        self._frame, self._region, self._size = [], False, None
+
+
+def benchmark(frames: int = 200):
+    """对比 os.system 清屏后整屏打印与差量重绘的每帧耗时与输出字节数"""
+
+    class _FakeTerminal(io.StringIO):
+        def isatty(self):
+            return True
+
+    lines = ["", " --- 第 100 年 ---", "=" * 50, "【财富】 灵石: 120/200",
+             "【弟子】 总数: 12/100 | 空闲: 3", "【分配】 挖矿: 6 | 招募: 3", "=" * 50, "", "【最近日志】"]
+    logs = [f"  第{90 + i}年 弟子挖矿产出: {i * 2} 灵石" for i in range(10)]
+    clear = "cls" if os.name == "nt" else "clear"
+
+    start = time.perf_counter()
+    sink = io.StringIO()
+    for i in range(frames):
+        os.system(clear if sys.stdout.isatty() else f"{clear} >{os.devnull} 2>&1")
+        sink.write("\n".join(lines + logs[i % 10:] + logs[:i % 10]) + "\n")
+    old_latency = (time.perf_counter() - start) / frames
+    old_bytes = len(sink.getvalue().encode("utf-8")) / frames
+
+    renderer = TerminalRenderer(_FakeTerminal(), os.terminal_size((100, 40)))
+    total_latency = total_bytes = 0
+    for i in range(frames):
+        # 每帧新增一条日志，最近日志整体上移一行，模拟一次操作后的刷新
+        renderer.render(lines + logs[i % 10:] + logs[:i % 10])
+        if i:
+            total_latency += renderer.last_latency
+            total_bytes += renderer.last_bytes
+    print(f"os.system({clear!r}) + 整屏打印: {old_latency * 1000:.3f} ms/帧, {old_bytes:.0f} 字节/帧")
+    print(f"差量重绘: {total_latency / (frames - 1) * 1000:.3f} ms/帧, {total_bytes / (frames - 1):.0f} 字节/帧")
+
+
+if __name__ == "__main__":
+    benchmark()
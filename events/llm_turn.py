@@ -0,0 +1,200 @@
+"""LLM批量回合协议：一次请求同时生成年度总结、下一年事件、选项结果与数值变化"""
+import math
+from typing import Optional
+
+from config.settings import (
+    LLM_EVENT_MAX_OPTIONS,
+    LLM_EVENT_MAX_WEALTH_DELTA,
+    LLM_EVENT_MAX_DISCIPLE_DELTA,
+    MESSAGE_LOG_DISPLAY,
+)
+from core.game_state import GameState
+from core.llm import LLM_invoke_tools, aLLM_invoke_tools
+
+
+# 选项允许修改的宗门数据及其单次变化上限
+DELTA_LIMITS = {
+    "wealth": LLM_EVENT_MAX_WEALTH_DELTA,
+    "disciples_total": LLM_EVENT_MAX_DISCIPLE_DELTA,
+}
+
+TURN_TOOLS = [
+    {
+        "type": "function",
+        "function": {
+            "name": "write_chronicle",
+            "description": "写下本年度的宗门编年史",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "narrative": {"type": "string", "description": "仙侠风的简短年度总结"},
+                },
+                "required": ["narrative"],
+            },
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "define_event",
+            "description": "定义下一年开始时发生的随机事件，并预先写好每个选项的结果与数值变化",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "title": {"type": "string"},
+                    "description": {"type": "string"},
+                    "options": {
+                        "type": "array",
+                        "maxItems": LLM_EVENT_MAX_OPTIONS,
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "text": {"type": "string", "description": "选项文字"},
+                                "outcome": {"type": "string", "description": "选择后的结果描述"},
+                                "deltas": {
+                                    "type": "object",
+                                    "properties": {
+                                        "wealth": {"type": "integer"},
+                                        "disciples_total": {"type": "integer"},
+                                    },
+                                },
+                            },
+                            "required": ["text", "outcome"],
+                        },
+                    },
+                },
+                "required": ["title", "description", "options"],
+            },
+        },
+    },
+]
+
+
+def _clamp(value: int, limit: int) -> int:
+    return max(-limit, min(limit, value))
+
+
+def validate_deltas(deltas) -> dict:
+    """校验数值变化：只保留允许的字段，取整并限制幅度"""
+    if not isinstance(deltas, dict):
+        return {}
+    result = {}
+    for key, limit in DELTA_LIMITS.items():
+        value = deltas.get(key)
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            continue
+        # json.loads 接受 Infinity、NaN 与 1e999，int() 会抛出异常
+        if not math.isfinite(value):
+            continue
+        value = _clamp(int(value), limit)
+        if value:
+            result[key] = value
+    return result
+
+
+def validate_event(args) -> Optional[dict]:
+    """
+    校验LLM定义的事件，转换为 EventManager 使用的事件格式
+    返回: 事件字典 或 None(不合法)
+    """
+    if not isinstance(args, dict):
+        return None
+    title = args.get("title")
+    description = args.get("description")
+    raw_options = args.get("options")
+    if not isinstance(title, str) or not isinstance(description, str) or not isinstance(raw_options, list):
+        return None
+
+    options = []
+    for raw in raw_options[:LLM_EVENT_MAX_OPTIONS]:
+        if not isinstance(raw, dict):
+            continue
+        text, outcome = raw.get("text"), raw.get("outcome")
+        if not isinstance(text, str) or not isinstance(outcome, str) or not text.strip():
+            continue
+        options.append({
+            "id": len(options),
+            "text": text.strip(),
+            "outcome": outcome.strip(),
+            "deltas": validate_deltas(raw.get("deltas")),
+        })
+    if not options:
+        return None
+
+    return {
+        "type": "llm",
+        "title": title.strip() or "异闻",
+        "description": description.strip(),
+        "options": options,
+    }
+
+
+def apply_deltas(state: GameState, deltas: dict) -> list:
+    """
+    按游戏规则应用数值变化，返回实际生效的变化描述
+    灵石不超过灵库上限且不为负；弟子不超过洞府上限且不少于已分配人数
+    """
+    applied = []
+    sect = state.sect_data
+    if "wealth" in deltas:
+        before = sect["wealth"]
+        if deltas["wealth"] > 0:
+            state.gain_wealth(deltas["wealth"])
+        else:
+            sect["wealth"] = max(0, before + deltas["wealth"])
+        if sect["wealth"] != before:
+            applied.append(f"灵石 {before} → {sect['wealth']}")
+    if "disciples_total" in deltas:
+        before = sect["disciples_total"]
+        assigned = sect["disciples_mining"] + sect["disciples_recruiting"]
+        sect["disciples_total"] = max(assigned, min(state.max_disciples, before + deltas["disciples_total"]))
+        if sect["disciples_total"] != before:
+            applied.append(f"弟子 {before} → {sect['disciples_total']}")
+    return applied
+
+
+def turn_messages(state: GameState) -> list:
+    """批量回合请求的消息"""
+    return [
+        {"role": "system", "content": (
+            "你是一款仙侠宗门经营游戏的叙事引擎。请在一次回复中同时调用以下工具：\n"
+            "1. write_chronicle：根据当前游戏状态与本年度的玩家行动日志，写一段仙侠风的简短年度总结；\n"
+            f"2. define_event：设计下一年开始时的随机事件，给出不超过{LLM_EVENT_MAX_OPTIONS}个选项，"
+            "并为每个选项写好结果描述与数值变化"
+            f"(灵石变化不超过±{LLM_EVENT_MAX_WEALTH_DELTA}，弟子变化不超过±{LLM_EVENT_MAX_DISCIPLE_DELTA})。\n"
+            "当前游戏状态：\n"
+            f"{state.to_prompt()}\n"
+            "玩家操作日志：\n"
+            + "\n".join(state.message_log.recent(MESSAGE_LOG_DISPLAY)) + "\n")},
+    ]
+
+
+def parse_turn(reply: dict) -> dict:
+    """解析批量回合的回复"""
+    chronicle, event = None, None
+    for name, args in reply["tool_calls"]:
+        if name == "write_chronicle" and chronicle is None:
+            # 参数不是对象时按缺失处理(同 validate_event)
+            narrative = args.get("narrative") if isinstance(args, dict) else None
+            if isinstance(narrative, str) and narrative.strip():
+                chronicle = narrative.strip()
+        elif name == "define_event" and event is None:
+            event = validate_event(args)
+
+    # 模型未使用工具时，把正文当作年度总结
+    if chronicle is None and reply["content"].strip():
+        chronicle = reply["content"].strip()
+    return {"chronicle": chronicle, "event": event}
+
+
+def plan_turn(state: GameState, invoke=LLM_invoke_tools) -> dict:
+    """
+    一次LLM请求完成年度总结与下一年事件的生成
+    返回: {"chronicle": str 或 None, "event": 事件字典 或 None}
+    """
+    return parse_turn(invoke(turn_messages(state), TURN_TOOLS))
+
+
+async def aplan_turn(state: GameState, invoke=aLLM_invoke_tools) -> dict:
+    """plan_turn 的异步版本，等待LLM时不占用线程"""
+    return parse_turn(await invoke(turn_messages(state), TURN_TOOLS))
@@ -13,15 +13,33 @@ from config.settings import (
     EVENT_SECRET_REALM_MIN_REALM,
 )
 from core.game_state import GameState
+from events.llm_turn import apply_deltas
 # from core.time_system import TimeSystem
 
 
 class EventManager:
     """事件管理器"""
     
-    def __init__(self):
+    def __init__(self, rng=random):
+        """rng: 事件使用的随机数源(random.Random 或 random 模块)"""
+        self.rng = rng
         self.pending_event: Optional[dict] = None
         self.last_secret_realm_year = 0
+
+    def to_data(self) -> dict:
+        """序列化为检查点数据(随机数源不在其中，由调用方另行保存)"""
+        return {"pending_event": self.pending_event, "last_secret_realm_year": self.last_secret_realm_year}
+
+    def load_data(self, data: dict):
+        """原地恢复 to_data 的结果(随机数源不变)"""
+        self.pending_event = data.get("pending_event")
+        self.last_secret_realm_year = data.get("last_secret_realm_year", 0)
+
+    @classmethod
+    def from_data(cls, data: dict, rng=random) -> "EventManager":
+        manager = cls(rng)
+        manager.load_data(data)
+        return manager
     
     def check_events(self, player: GameState,
                      breakthrough: bool = False) -> Optional[dict]:
@@ -29,6 +47,11 @@ class EventManager:
         检查是否触发事件
         返回: 事件信息字典 或 None
         """
+        # 上一回合结算时由LLM预先生成的事件
+        if self.pending_event is not None:
+            event, self.pending_event = self.pending_event, None
+            return event
+
         # 优先检查境界突破触发的心魔事件
         # if breakthrough:
         #     print(self._create_inner_demon_event())
@@ -42,7 +65,7 @@ class EventManager:
         #
         # # 检查天降灵雨 (修炼10次后，5%概率)
         # if player.cultivation_count >= EVENT_SPIRITUAL_RAIN_MIN_CULTIVATION:
-        #     if random.random() < EVENT_SPIRITUAL_RAIN_CHANCE:
+        #     if self.rng.random() < EVENT_SPIRITUAL_RAIN_CHANCE:
         #         return self._create_spiritual_rain_event()
 
         return None
@@ -90,6 +113,8 @@ class EventManager:
         解决事件
         返回: 结果信息字典
         """
+        if event.get("type") == "llm":
+            return self._resolve_llm_event(event, option_id, player)
         return None
         print(event)
         event_type = event["type"]
@@ -103,6 +128,19 @@ class EventManager:
 
         return {"success": False, "message": "未知事件"}
 
+    def _resolve_llm_event(self, event: dict, option_id: int, player: GameState) -> dict:
+        """解决LLM生成的事件：结果文本已预先生成，数值变化按规则校验后应用"""
+        option = event["options"][option_id]
+        applied = apply_deltas(player, option.get("deltas", {}))
+        message = option["outcome"]
+        if applied:
+            message += "（" + "，".join(applied) + "）"
+        return {
+            "success": True,
+            "message": message,
+            "applied": applied,
+        }
+
     def _resolve_spiritual_rain(self, player: GameState) -> dict:
         """解决天降灵雨事件"""
         # 添加buff: 未来3次修炼双倍收益
@@ -171,13 +209,13 @@ class EventManager:
         self.last_secret_realm_year = year
         
         # 随机遭遇
-        encounter = random.choice(["treasure", "enemy", "mechanism"])
+        encounter = self.rng.choice(["treasure", "enemy", "mechanism"])
         
         if encounter == "treasure":
             # 发现宝箱
-            rewards = random.choice([
-                ("灵石", random.randint(100, 500)),
-                ("回灵丹", random.randint(1, 3)),
+            rewards = self.rng.choice([
+                ("灵石", self.rng.randint(100, 500)),
+                ("回灵丹", self.rng.randint(1, 3)),
                 ("聚气丹", 1),
             ])
             if rewards[0] == "灵石":
@@ -195,7 +233,7 @@ class EventManager:
         
         elif encounter == "enemy":
             # 遇到敌人
-            enemy_power = player.cultivation * random.uniform(0.5, 1.5)
+            enemy_power = player.cultivation * self.rng.uniform(0.5, 1.5)
             if player.cultivation > enemy_power:
                 # 胜利
                 gain = int(player.cultivation * 0.1)
@@ -0,0 +1,414 @@
+"""状态图的检查点存储
+
+每个会话(thread)只保留最新的检查点及其待处理写入(中断、已完成任务的结果)，不保留历史。
+活跃会话的检查点以对象形式留在内存，读取时不做反序列化。
+
+ParkingSaver：每一步不做序列化；park() 把会话压缩写入 SQLite 并从内存移除，
+之后再访问该会话(如玩家发来下一条命令)时自动读回，状态图从中断处继续。
+宗门状态(GameState)按二进制存档格式(core.binary_save)编码，其余字段很小，用 pickle 保存。
+
+IncrementalSaver：每一步把版本有变化的通道与待处理写入写入 SQLite(每个通道一行，未变化的通道不重写)，
+进程崩溃或重启后从最后一步继续。只保存可序列化的数据：带 codec 的通道先转换为普通数据，
+活的子系统对象(codec 为 None)不写入，恢复时由调用方重新构建。
+"""
+import io
+import os
+import pickle
+import sqlite3
+import threading
+from typing import Iterator, Optional
+
+from langgraph.constants import START
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+
+from config.settings import PARK_DB, CHECKPOINT_DB
+from core.binary_save import read_save
+from core.game_state import GameState
+from core.save_db import encode_state
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS parked (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (thread_id, checkpoint_ns)
+);
+"""
+
+
+class _Thread:
+    """一个会话的最新检查点"""
+    __slots__ = ("checkpoint", "metadata", "parent_id", "writes")
+
+    def __init__(self, checkpoint: dict, metadata: dict, parent_id: Optional[str]):
+        self.checkpoint = checkpoint
+        self.metadata = metadata
+        self.parent_id = parent_id
+        self.writes = {}  # (task_id, 序号) -> (task_id, channel, value, task_path)
+
+
+class _Pickler(pickle.Pickler):
+    def persistent_id(self, obj):
+        if isinstance(obj, GameState):
+            return encode_state(obj)
+        return None
+
+
+class _Unpickler(pickle.Unpickler):
+    def persistent_load(self, pid):
+        return read_save(io.BytesIO(pid))
+
+
+def _dumps(thread: _Thread) -> bytes:
+    buffer = io.BytesIO()
+    _Pickler(buffer, protocol=pickle.HIGHEST_PROTOCOL).dump(
+        (thread.checkpoint, thread.metadata, thread.parent_id, thread.writes))
+    return buffer.getvalue()
+
+
+def _loads(data: bytes) -> _Thread:
+    checkpoint, metadata, parent_id, writes = _Unpickler(io.BytesIO(data)).load()
+    thread = _Thread(checkpoint, metadata, parent_id)
+    thread.writes = writes
+    return thread
+
+
+class ParkingSaver(BaseCheckpointSaver):
+    """只保留最新检查点、空闲会话可换出到 SQLite 的检查点存储"""
+
+    _schema = _SCHEMA
+
+    def __init__(self, path: str = PARK_DB):
+        super().__init__()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(self._schema)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._threads = {}  # (thread_id, checkpoint_ns) -> _Thread
+        # 统计
+        self.parks = 0
+        self.unparks = 0
+        self.parked_bytes = 0
+
+    @staticmethod
+    def _key(config) -> tuple:
+        configurable = config["configurable"]
+        return configurable["thread_id"], configurable.get("checkpoint_ns", "")
+
+    def _thread(self, key: tuple) -> Optional[_Thread]:
+        """取会话的检查点，已换出的从 SQLite 读回"""
+        thread = self._threads.get(key)
+        if thread is not None:
+            return thread
+        thread = self._load(key)
+        if thread is None:
+            return None
+        self._threads[key] = thread
+        self.unparks += 1
+        return thread
+
+    def _load(self, key: tuple) -> Optional[_Thread]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data FROM parked WHERE thread_id = ? AND checkpoint_ns = ?", key).fetchone()
+        return _loads(row[0]) if row is not None else None
+
+    @property
+    def resident(self) -> int:
+        """留在内存中的会话数"""
+        return len(self._threads)
+
+    def park(self, thread_id: str, checkpoint_ns: str = "") -> int:
+        """把会话写入 SQLite 并从内存移除，返回写入的字节数(会话不在内存中时为 0)"""
+        thread = self._threads.pop((thread_id, checkpoint_ns), None)
+        if thread is None:
+            return 0
+        data = _dumps(thread)
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO parked VALUES (?, ?, ?)", (thread_id, checkpoint_ns, data))
+        self.parks += 1
+        self.parked_bytes += len(data)
+        return len(data)
+
+    def get_tuple(self, config) -> Optional[CheckpointTuple]:
+        key = self._key(config)
+        thread = self._thread(key)
+        if thread is None:
+            return None
+        checkpoint_id = get_checkpoint_id(config)
+        if checkpoint_id and checkpoint_id != thread.checkpoint["id"]:
+            # 只保留最新检查点
+            return None
+        thread_id, checkpoint_ns = key
+        writes = sorted(thread.writes.items(), key=lambda item: (item[1][3], *item[0]))
+        return CheckpointTuple(
+            config={"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns,
+                                     "checkpoint_id": thread.checkpoint["id"]}},
+            checkpoint=thread.checkpoint,
+            metadata=thread.metadata,
+            parent_config=({"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns,
+                                             "checkpoint_id": thread.parent_id}}
+                           if thread.parent_id else None),
+            pending_writes=[(task_id, channel, value) for task_id, channel, value, _ in
+                            (write for _, write in writes)],
+        )
+
+    def list(self, config, *, filter=None, before=None, limit=None) -> Iterator[CheckpointTuple]:
+        if config is None:
+            return
+        found = self.get_tuple(config)
+        if found is None:
+            return
+        if filter and any(found.metadata.get(k) != v for k, v in filter.items()):
+            return
+        if before is not None and found.checkpoint["id"] >= get_checkpoint_id(before):
+            return
+        yield found
+
+    def put(self, config, checkpoint, metadata, new_versions) -> dict:
+        thread_id, checkpoint_ns = self._key(config)
+        self._threads[(thread_id, checkpoint_ns)] = _Thread(
+            checkpoint.copy(), get_checkpoint_metadata(config, metadata),
+            config["configurable"].get("checkpoint_id"))
+        return {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns,
+                                 "checkpoint_id": checkpoint["id"]}}
+
+    def put_writes(self, config, writes, task_id: str, task_path: str = "") -> None:
+        self._accept_writes(config, writes, task_id, task_path)
+
+    def _accept_writes(self, config, writes, task_id: str, task_path: str) -> list:
+        """把待处理写入记到当前检查点上，返回实际记下的 [(task_id, 序号)]"""
+        thread = self._thread(self._key(config))
+        if thread is None or thread.checkpoint["id"] != config["configurable"]["checkpoint_id"]:
+            return []
+        accepted = []
+        for idx, (channel, value) in enumerate(writes):
+            key = (task_id, WRITES_IDX_MAP.get(channel, idx))
+            # 普通写入只记第一次，特殊写入(中断、错误等)覆盖
+            if key[1] >= 0 and key in thread.writes:
+                continue
+            thread.writes[key] = (task_id, channel, value, task_path)
+            accepted.append(key)
+        return accepted
+
+    def delete_thread(self, thread_id: str) -> None:
+        for key in [key for key in self._threads if key[0] == thread_id]:
+            del self._threads[key]
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM parked WHERE thread_id = ?", (thread_id,))
+
+    # 内存中的操作很快，异步接口直接调用同步实现
+    async def aget_tuple(self, config) -> Optional[CheckpointTuple]:
+        return self.get_tuple(config)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None):
+        for item in self.list(config, filter=filter, before=before, limit=limit):
+            yield item
+
+    async def aput(self, config, checkpoint, metadata, new_versions) -> dict:
+        return self.put(config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id: str, task_path: str = "") -> None:
+        self.put_writes(config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        self.delete_thread(thread_id)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_INCREMENTAL_SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoints (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL,
+    parent_id TEXT,
+    type TEXT NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (thread_id, checkpoint_ns)
+);
+CREATE TABLE IF NOT EXISTS channels (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL,
+    channel TEXT NOT NULL,
+    version TEXT NOT NULL,
+    type TEXT NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (thread_id, checkpoint_ns, channel)
+);
+CREATE TABLE IF NOT EXISTS writes (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    channel TEXT NOT NULL,
+    type TEXT NOT NULL,
+    data BLOB NOT NULL,
+    task_path TEXT NOT NULL,
+    PRIMARY KEY (thread_id, checkpoint_ns, task_id, idx)
+);
+"""
+
+_SKIP = object()  # 不写入的通道
+
+# 宗门状态按二进制存档格式保存
+STATE_CODEC = (encode_state, lambda data, values: read_save(io.BytesIO(data)))
+
+
+class IncrementalSaver(ParkingSaver):
+    """
+    每一步增量写入 SQLite、崩溃后可恢复的检查点存储
+    codecs: {通道: (dump, load) 或 None}；dump(对象) 返回可序列化的数据，load(数据, 已恢复的通道值) 重建对象，
+    按字典顺序依次恢复(后面的 load 可以引用前面恢复的对象)；为 None 的通道不写入
+    图的输入(__start__ 通道)是整个状态字典，其中的字段同样按 codecs 处理
+    每个检查点只写入版本有变化的通道；待处理写入只写中断、恢复与错误，普通写入由下一个检查点带上
+    宗门状态每次写入都是完整存档，编码耗时随编年史长度增长
+    """
+    _schema = _INCREMENTAL_SCHEMA
+
+    def __init__(self, path: str = CHECKPOINT_DB, codecs: Optional[dict] = None):
+        super().__init__(path)
+        self.codecs = codecs or {}
+        # 统计
+        self.steps = 0
+        self.written_bytes = 0
+        self.resumes = 0
+
+    # ---- 编码 ----
+
+    def _dump(self, channel: str, value):
+        """通道值转换为可序列化的数据，不写入的通道返回 _SKIP"""
+        if channel == START and isinstance(value, dict):
+            return {key: self._dump(key, item) for key, item in value.items()
+                    if self.codecs.get(key, ...) is not None}
+        codec = self.codecs.get(channel, ...)
+        if codec is None:
+            return _SKIP
+        return value if codec is ... else codec[0](value)
+
+    def _encode(self, channel: str, value) -> Optional[tuple]:
+        data = self._dump(channel, value)
+        return None if data is _SKIP else self.serde.dumps_typed(data)
+
+    def _decode(self, channel: str, typed: tuple, values: dict):
+        data = self.serde.loads_typed(typed)
+        if channel == START and isinstance(data, dict):
+            return self._restore(data, dict(data))
+        codec = self.codecs.get(channel)
+        return codec[1](data, values) if codec else data
+
+    def _restore(self, data: dict, values: dict) -> dict:
+        """按 codecs 的顺序重建带 codec 的字段(原地修改 values 并返回)"""
+        for channel, codec in self.codecs.items():
+            if codec is not None and channel in data:
+                values[channel] = codec[1](data[channel], values)
+        return values
+
+    # ---- 写入 ----
+
+    def put(self, config, checkpoint, metadata, new_versions) -> dict:
+        result = super().put(config, checkpoint, metadata, new_versions)
+        thread_id, checkpoint_ns = self._key(config)
+        thread = self._threads[(thread_id, checkpoint_ns)]
+        values = checkpoint["channel_values"]
+        rows, removed = [], []
+        for channel, version in new_versions.items():
+            if channel not in values:
+                removed.append((thread_id, checkpoint_ns, channel))
+                continue
+            encoded = self._encode(channel, values[channel])
+            if encoded is not None:
+                rows.append((thread_id, checkpoint_ns, channel, str(version), *encoded))
+        head = self.serde.dumps_typed(({**checkpoint, "channel_values": {}}, thread.metadata))
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO channels VALUES (?, ?, ?, ?, ?, ?)", rows)
+            self._conn.executemany(
+                "DELETE FROM channels WHERE thread_id = ? AND checkpoint_ns = ? AND channel = ?", removed)
+            self._conn.execute("INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?)",
+                               (thread_id, checkpoint_ns, thread.parent_id, *head))
+            # 上一个检查点的待处理写入已经用完
+            self._conn.execute("DELETE FROM writes WHERE thread_id = ? AND checkpoint_ns = ?",
+                               (thread_id, checkpoint_ns))
+        self.steps += 1
+        self.written_bytes += len(head[1]) + sum(len(row[5]) for row in rows)
+        return result
+
+    def put_writes(self, config, writes, task_id: str, task_path: str = "") -> None:
+        accepted = self._accept_writes(config, writes, task_id, task_path)
+        if not accepted:
+            return
+        thread_id, checkpoint_ns = key = self._key(config)
+        thread = self._threads[key]
+        rows = []
+        # 只持久化中断、恢复、错误等特殊写入；普通写入随下一个检查点写入通道表，
+        # 崩溃在两者之间时这一步重新执行即可
+        for write_key in (key for key in accepted if key[1] < 0):
+            _, channel, value, _ = thread.writes[write_key]
+            encoded = self._encode(channel, value)
+            if encoded is not None:
+                rows.append((thread_id, checkpoint_ns, *write_key, channel, *encoded, task_path))
+        if not rows:
+            return
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        self.written_bytes += sum(len(row[6]) for row in rows)
+
+    # ---- 恢复 ----
+
+    def _load(self, key: tuple) -> Optional[_Thread]:
+        """从 SQLite 重建会话的最新检查点(进程重启后第一次访问时)"""
+        with self._lock:
+            head = self._conn.execute(
+                "SELECT parent_id, type, data FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?",
+                key).fetchone()
+            if head is None:
+                return None
+            channels = self._conn.execute(
+                "SELECT channel, version, type, data FROM channels WHERE thread_id = ? AND checkpoint_ns = ?",
+                key).fetchall()
+            writes = self._conn.execute(
+                "SELECT task_id, idx, channel, type, data, task_path FROM writes "
+                "WHERE thread_id = ? AND checkpoint_ns = ?", key).fetchall()
+        parent_id, *typed = head
+        checkpoint, metadata = self.serde.loads_typed(tuple(typed))
+        versions = checkpoint["channel_versions"]
+        # 先恢复普通通道，再按 codecs 的顺序重建对象
+        data, values = {}, {}
+        for channel, version, kind, blob in channels:
+            if str(versions.get(channel)) != version:
+                continue
+            value = self.serde.loads_typed((kind, blob))
+            if channel == START and isinstance(value, dict):
+                value = self._restore(value, dict(value))
+            (data if channel in self.codecs else values)[channel] = value
+        checkpoint["channel_values"] = self._restore(data, values)
+        thread = _Thread(checkpoint, metadata, parent_id)
+        for task_id, idx, channel, kind, blob, task_path in writes:
+            thread.writes[(task_id, idx)] = (task_id, channel, self._decode(channel, (kind, blob), values), task_path)
+        self.resumes += 1
+        return thread
+
+    def park(self, thread_id: str, checkpoint_ns: str = "") -> int:
+        """检查点已经写入 SQLite，只需从内存移除，返回 0"""
+        if self._threads.pop((thread_id, checkpoint_ns), None) is not None:
+            self.parks += 1
+        return 0
+
+    def delete_thread(self, thread_id: str) -> None:
+        for key in [key for key in self._threads if key[0] == thread_id]:
+            del self._threads[key]
+        with self._lock, self._conn:
+            for table in ("checkpoints", "channels", "writes"):
+                self._conn.execute(f"DELETE FROM {table} WHERE thread_id = ?", (thread_id,))
+
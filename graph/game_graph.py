@@ -1,6 +1,22 @@
-"""LangGraph游戏状态图"""
+"""LangGraph游戏状态图
+
+状态图在进程内只构建、编译一次，所有 GameGraphManager 共用(编译结果不含会话数据)。
+异步版本(节点换成 ASYNC_NODES 中的实现)同样只编译一次，供 ainvoke / astream 使用。
+传入检查点存储(graph.checkpoint.IncrementalSaver(codecs=GAME_GRAPH_CODECS))时，每一步把变化的字段写入 SQLite：
+运行状态图时按步写入(durability="sync")，直接调度节点时把本次变化的字段作为一次 update_state 写入。
+玩家、时间系统与 NPC 管理器不写入检查点，进程重启后由调用方重新构建，再用 GameGraphManager.resume
+取回进行中的事件、对话等其余字段。
+Mermaid 图不再在每次创建管理器时写出，需要时运行：
+
+    python -m graph.game_graph [输出路径]
+"""
+import argparse
+from typing import AsyncIterator
+
 from langgraph.graph import StateGraph, END
-from graph.state import GameState
+from graph.state import GameState, apply_update
+from core.npc_dialogue import DialogueHistory, generate_replies
+from events.special_events import EventManager
 from graph.nodes import (
     idle_node,
     cultivation_node,
@@ -10,22 +26,44 @@ from graph.nodes import (
     dialogue_process_node,
     route_from_idle,
     route_dialogue_continuation,
+    ASYNC_NODES,
 )
 
+# 节点 -> 状态图中的节点名
+NODE_NAMES = {
+    idle_node: "idle",
+    cultivation_node: "cultivation",
+    event_trigger_node: "event_trigger",
+    event_resolution_node: "event_resolution",
+    dialogue_init_node: "dialogue_init",
+    dialogue_process_node: "dialogue_process",
+}
+
+# IncrementalSaver 的通道编码：活的子系统对象不写入(None)，恢复时由调用方重建
+GAME_GRAPH_CODECS = {
+    "player": None,
+    "time_system": None,
+    "npc_manager": None,
+    "event_manager": (EventManager.to_data, lambda data, values: EventManager.from_data(data)),
+    "dialogue_history": (DialogueHistory.to_data, lambda data, values: DialogueHistory.from_data(data)),
+}
+
+# 直接调度后写入检查点的固定字段：玩家输入(管理器方法在调度节点前直接写入 current_state)，
+# 以及节点原地修改、不在返回值中的事件管理器
+_DISPATCH_FIELDS = ("action", "action_params", "event_type", "event_data", "selected_option", "current_npc",
+                    "user_input", "event_manager")
+
 
-def create_game_graph() -> StateGraph:
-    """创建游戏状态图"""
+def create_game_graph(asynchronous: bool = False) -> StateGraph:
+    """创建游戏状态图，asynchronous 为 True 时使用异步节点"""
     
     # 创建状态图
     graph = StateGraph(GameState)
+    _node = ASYNC_NODES.get if asynchronous else (lambda func: func)
     
     # 添加节点
-    graph.add_node("idle", idle_node)
-    graph.add_node("cultivation", cultivation_node)
-    graph.add_node("event_trigger", event_trigger_node)
-    graph.add_node("event_resolution", event_resolution_node)
-    graph.add_node("dialogue_init", dialogue_init_node)
-    graph.add_node("dialogue_process", dialogue_process_node)
+    for node, name in NODE_NAMES.items():
+        graph.add_node(name, _node(node))
     
     # 设置入口
     graph.set_entry_point("idle")
@@ -63,15 +101,57 @@ def create_game_graph() -> StateGraph:
     return graph
 
 
+# 不带检查点存储的已编译状态图：asynchronous -> 状态图
+_COMPILED = {}
+
+
+def get_compiled_graph(asynchronous: bool = False, checkpointer=None):
+    """
+    进程内共享的已编译状态图，首次调用时编译(每个检查点存储各编译一份)
+    带检查点存储的编译结果缓存在存储对象上，随存储对象一起释放；
+    不用全局缓存，否则用过的存储(包括已关闭的)及其 SQLite 连接会一直存活到进程结束
+    """
+    if checkpointer is None:
+        cache = _COMPILED
+    else:
+        cache = getattr(checkpointer, "_game_graphs", None)
+        if cache is None:
+            cache = checkpointer._game_graphs = {}
+    graph = cache.get(asynchronous)
+    if graph is None:
+        graph = cache[asynchronous] = create_game_graph(asynchronous).compile(checkpointer=checkpointer)
+    return graph
+
+
+def export_mermaid(path: str = "graph.mmd") -> str:
+    """把状态图导出为 Mermaid 文件，返回写入的路径"""
+    mmd_graph = get_compiled_graph().get_graph().draw_mermaid().replace("classDef", "%% classDef")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(mmd_graph)
+    return path
+
+
+# 玩家在事件、对话中途的操作只对应一个节点，直接调用，不经过状态图调度；
+# 其余动作(process_action)都运行状态图，路线由图中的边决定
+DIRECT_ROUTES = {
+    "resolve_event": (event_resolution_node,),
+    "continue_dialogue": (dialogue_process_node,),
+}
+
+
 class GameGraphManager:
-    """游戏状态图管理器"""
-    
-    def __init__(self, player, time_system, event_manager, npc_manager):
-        self.graph = create_game_graph()
-        self.compiled_graph = self.graph.compile()
-        mmd_graph = self.compiled_graph.get_graph().draw_mermaid().replace("classDef", "%% classDef")
-        with open("graph.mmd", "w") as f:
-            f.write(mmd_graph)
+    """
+    游戏状态图管理器
+    checkpointer 不为 None 时每一步把变化的字段写入检查点(thread_id 区分不同的存档)
+    """
+    
+    def __init__(self, player, time_system, event_manager, npc_manager, checkpointer=None,
+                 thread_id: str = "game"):
+        self.checkpointer = checkpointer
+        self.config = {"configurable": {"thread_id": thread_id}}
+        # 有检查点存储时每一步写入后才继续；没有时不能指定 durability(langgraph 会出错)
+        self._run_options = {"durability": "sync"} if checkpointer is not None else {}
+        self.compiled_graph = get_compiled_graph(checkpointer=checkpointer)
         self.current_state: GameState = {
             "player": player,
             "time_system": time_system,
@@ -90,7 +170,7 @@ class GameGraphManager:
             "selected_option": None,
             "current_npc": None,
             "npc_info": {},
-            "dialogue_history": [],
+            "dialogue_history": DialogueHistory(),
             "user_input": "",
             "npc_response": "",
             "dialogue_options": [],
@@ -98,25 +178,92 @@ class GameGraphManager:
             "breakthrough_occurred": False,
             "dialogue_ended": False,
         }
+
+    @classmethod
+    def resume(cls, checkpointer, thread_id: str, player, time_system, npc_manager) -> "GameGraphManager":
+        """
+        从检查点恢复：事件、对话等字段与事件管理器取自检查点，玩家、时间系统与 NPC 管理器由调用方重建后传入
+        检查点不存在时返回初始状态的管理器
+        """
+        manager = cls(player, time_system, EventManager(), npc_manager, checkpointer, thread_id)
+        manager.current_state.update(manager.compiled_graph.get_state(manager.config).values)
+        manager.update_state_info()
+        return manager
     
     def update_state_info(self):
         """同步对象信息到快照（用于UI显示）"""
         self.current_state["player_info"] = self.current_state["player"].get_display_info()
         self.current_state["time_info"] = self.current_state["time_system"].to_dict()
     
+    def _dispatch(self, route: str) -> GameState:
+        """直接调用路线上的节点"""
+        changed = set(_DISPATCH_FIELDS)
+        for node in DIRECT_ROUTES[route]:
+            update = node(self.current_state)
+            apply_update(self.current_state, update)
+            changed.update(update)
+        if self.checkpointer is not None:
+            self.compiled_graph.update_state(*self._checkpoint_update(DIRECT_ROUTES[route][-1], changed))
+        return self.current_state
+
+    async def _adispatch(self, route: str) -> GameState:
+        """直接调用路线上节点的异步版本"""
+        changed = set(_DISPATCH_FIELDS)
+        for node in DIRECT_ROUTES[route]:
+            update = await ASYNC_NODES[node](self.current_state)
+            apply_update(self.current_state, update)
+            changed.update(update)
+        if self.checkpointer is not None:
+            graph = get_compiled_graph(asynchronous=True, checkpointer=self.checkpointer)
+            await graph.aupdate_state(*self._checkpoint_update(DIRECT_ROUTES[route][-1], changed))
+        return self.current_state
+
+    def _checkpoint_update(self, node, changed) -> tuple:
+        """直接调度后写入检查点的参数：只写本次变化的字段，记为最后一个节点的输出"""
+        return self.config, {key: self.current_state[key] for key in changed}, NODE_NAMES[node]
+
     def process_action(self, action: str, params: dict = None) -> GameState:
         """处理玩家动作"""
         self.current_state["action"] = action
         self.current_state["action_params"] = params or {}
         
-        # 运行状态图
-        result = self.compiled_graph.invoke(self.current_state)
+        # 运行状态图(有检查点存储时每一步写入后才继续)
+        result = self.compiled_graph.invoke(self.current_state, self.config, **self._run_options)
         self.current_state = result
         
         # 处理完成后更新快照
         self.update_state_info()
         
         return result
+
+    async def aprocess_action(self, action: str, params: dict = None) -> GameState:
+        """处理玩家动作(异步)，参数同 process_action"""
+        self.current_state["action"] = action
+        self.current_state["action_params"] = params or {}
+        
+        graph = get_compiled_graph(asynchronous=True, checkpointer=self.checkpointer)
+        result = await graph.ainvoke(self.current_state, self.config, **self._run_options)
+        self.current_state = result
+        
+        self.update_state_info()
+        return result
+
+    async def astream(self, action: str, params: dict = None) -> AsyncIterator[tuple]:
+        """
+        运行状态图并逐个产出节点结果 (节点名, 变化的字段)，界面可以边执行边显示
+        每个节点的结果产出前已合并进 current_state
+        """
+        self.current_state["action"] = action
+        self.current_state["action_params"] = params or {}
+        
+        graph = get_compiled_graph(asynchronous=True, checkpointer=self.checkpointer)
+        async for chunk in graph.astream(self.current_state, self.config, stream_mode="updates",
+                                         **self._run_options):
+            for name, update in chunk.items():
+                apply_update(self.current_state, update or {})
+                yield name, update
+        
+        self.update_state_info()
     
     def start_cultivation(self) -> GameState:
         """开始修炼"""
@@ -131,10 +278,7 @@ class GameGraphManager:
     def resolve_event(self, selected_option: int) -> GameState:
         """解决事件"""
         self.current_state["selected_option"] = selected_option
-        # 直接运行event_resolution节点
-        result = event_resolution_node(self.current_state)
-        self.current_state = result
-        return result
+        return self._dispatch("resolve_event")
     
     def start_dialogue(self, npc_id: str) -> GameState:
         """开始与NPC对话"""
@@ -144,18 +288,48 @@ class GameGraphManager:
     def continue_dialogue(self, user_input: str) -> GameState:
         """继续对话"""
         self.current_state["user_input"] = user_input
-        # 直接运行dialogue_process节点
-        result = dialogue_process_node(self.current_state)
-        self.current_state = result
-        return result
+        return self._dispatch("continue_dialogue")
+
+    async def aresolve_event(self, selected_option: int) -> GameState:
+        """解决事件(异步)"""
+        self.current_state["selected_option"] = selected_option
+        return await self._adispatch("resolve_event")
+
+    async def acontinue_dialogue(self, user_input: str) -> GameState:
+        """继续对话(异步)：等待NPC回复时其他会话照常运行"""
+        self.current_state["user_input"] = user_input
+        return await self._adispatch("continue_dialogue")
     
+    def gather_dialogue(self, npc_ids: list, user_input: str) -> dict:
+        """
+        多名NPC同场(聚会)：并发生成各自对玩家发言的回复，返回 {npc_id: 回复}
+        对话历史只属于当前对话的NPC，其余NPC不带历史，只收到玩家这一句
+        """
+        npc_id = self.current_state.get("current_npc")
+        histories = {npc_id: self.current_state.get("dialogue_history") or DialogueHistory()} if npc_id else {}
+        return generate_replies(npc_ids, user_input, histories)
+
     def end_dialogue(self):
         """结束对话"""
         self.current_state["phase"] = "idle"
         self.current_state["current_npc"] = None
-        self.current_state["dialogue_history"] = []
+        self.current_state["dialogue_history"] = DialogueHistory()
         self.current_state["dialogue_ended"] = False
+        if self.checkpointer is not None:
+            self.compiled_graph.update_state(*self._checkpoint_update(
+                dialogue_process_node, ("phase", "current_npc", "dialogue_history", "dialogue_ended")))
     
     def get_state(self) -> GameState:
         """获取当前状态"""
         return self.current_state.copy()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="导出游戏状态图的 Mermaid 文件")
+    parser.add_argument("path", nargs="?", default="graph.mmd", help="输出路径")
+    args = parser.parse_args(argv)
+    print(f"已导出: {export_mermaid(args.path)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,29 @@
-"""LangGraph节点定义"""
+"""LangGraph节点定义
+
+节点只返回需要修改的字段，不复制整个状态；dialogue_history 由 add_dialogue 归并。
+每个节点都有异步版本(ASYNC_NODES)，供 ainvoke / astream 使用。
+节点耗时记入 core.profiler(阶段名 node.<节点名>)，直接调度与运行状态图时都会记录。
+"""
 import random
 from typing import Literal
 from graph.state import GameState
 from config.settings import NPCS
 from core.cultivation import CultivationSystem
+from core.profiler import profiled
+from core.npc_dialogue import DialogueHistory, generate_reply, agenerate_reply
 
 
-def idle_node(state: GameState) -> GameState:
+@profiled("node.idle")
+def idle_node(state: GameState) -> dict:
     """闲置状态节点"""
     return {
-        **state,
         "phase": "idle",
         "message": "等待行动...",
     }
 
 
-def cultivation_node(state: GameState) -> GameState:
+@profiled("node.cultivation")
+def cultivation_node(state: GameState) -> dict:
     """修炼节点 - 执行实际修炼/打坐逻辑"""
     action = state.get("action")
     player = state["player"]
@@ -33,7 +41,6 @@ def cultivation_node(state: GameState) -> GameState:
     should_trigger = state["event_manager"].check_events(player, time_system, breakthrough) is not None
     
     return {
-        **state,
         "phase": "cultivation",
         "action_result": result,
         "message": result.get("message", ""),
@@ -42,7 +49,8 @@ def cultivation_node(state: GameState) -> GameState:
     }
 
 
-def event_trigger_node(state: GameState) -> GameState:
+@profiled("node.event_trigger")
+def event_trigger_node(state: GameState) -> dict:
     """事件触发节点"""
     event_type = state.get("event_type")
     event_data = state.get("event_data", {})
@@ -64,13 +72,13 @@ def event_trigger_node(state: GameState) -> GameState:
         ]
     
     return {
-        **state,
         "phase": "event",
         "event_options": options,
     }
 
 
-def event_resolution_node(state: GameState) -> GameState:
+@profiled("node.event_resolution")
+def event_resolution_node(state: GameState) -> dict:
     """事件解决节点"""
     event_manager = state["event_manager"]
     player = state["player"]
@@ -92,7 +100,6 @@ def event_resolution_node(state: GameState) -> GameState:
         result = {"message": "未选择选项", "success": False}
     
     return {
-        **state,
         "phase": "idle",
         "action_result": result,
         "message": result.get("message", ""),
@@ -103,7 +110,8 @@ def event_resolution_node(state: GameState) -> GameState:
     }
 
 
-def dialogue_init_node(state: GameState) -> GameState:
+@profiled("node.dialogue_init")
+def dialogue_init_node(state: GameState) -> dict:
     """对话初始化节点"""
     npc_id = state.get("current_npc")
     npc_config = NPCS.get(npc_id, {})
@@ -123,65 +131,45 @@ def dialogue_init_node(state: GameState) -> GameState:
         options = ["告辞"]
     
     return {
-        **state,
         "phase": "dialogue",
         "npc_info": npc_config,
         "npc_response": initial_dialogue,
         "dialogue_options": options,
-        "dialogue_history": [{
+        "dialogue_history": DialogueHistory([{
             "role": "npc",
             "content": initial_dialogue,
-        }],
+        }]),
         "dialogue_ended": False,
     }
 
 
-def dialogue_process_node(state: GameState) -> GameState:
-    """对话处理节点"""
+def _dialogue_extra_message(state: GameState):
+    """对话中的特殊操作(指点、商品、切磋等)，返回替代LLM回复的文字或 None"""
     user_input = state.get("user_input", "")
     npc_id = state.get("current_npc")
-    history = state.get("dialogue_history", [])
     player = state["player"]
-    npc_manager = state["npc_manager"]
-    
-    # 记录玩家选择
-    history.append({
-        "role": "player",
-        "content": user_input,
-    })
-    
-    # 处理特殊逻辑
-    extra_message = None
-    npc = npc_manager.get_npc(npc_id)
+    npc = state["npc_manager"].get_npc(npc_id)
     
     if npc_id == "master":
         if user_input == "请求指点":
-            result = npc.give_guidance(player)
-            extra_message = result["message"]
+            return npc.give_guidance(player)["message"]
     elif npc_id == "merchant":
         if user_input == "查看商品":
             items = npc.get_shop_items()
             items_text = "\n".join([f"{i['name']}: {i['price']}灵石 - {i['desc']}" for i in items])
-            extra_message = f"本店商品：\n{items_text}"
+            return f"本店商品：\n{items_text}"
     elif npc_id == "friend":
         if user_input == "切磋交流":
-            result = npc.spar(player)
-            extra_message = result["message"]
+            return npc.spar(player)["message"]
         elif user_input == "闲聊":
-            result = npc.chat(player)
-            extra_message = result["message"]
-    
-    # 生成回复
-    if extra_message:
-        response = extra_message
-    else:
-        response = _generate_npc_response(npc_id, user_input, history)
-    
-    # 记录NPC回复
-    history.append({
-        "role": "npc",
-        "content": response,
-    })
+            return npc.chat(player)["message"]
+    return None
+
+
+def _dialogue_update(state: GameState, response: str) -> dict:
+    """根据NPC回复生成对话处理节点的返回值"""
+    user_input = state.get("user_input", "")
+    npc_id = state.get("current_npc")
     
     # 检查是否结束对话
     ended = user_input == "告辞"
@@ -200,19 +188,64 @@ def dialogue_process_node(state: GameState) -> GameState:
             options = ["告辞"]
     
     return {
-        **state,
         "npc_response": response,
-        "dialogue_history": history,
+        # 本轮的玩家输入与NPC回复，追加到对话历史
+        "dialogue_history": [
+            {"role": "player", "content": user_input},
+            {"role": "npc", "content": response},
+        ],
         "dialogue_options": options,
         "dialogue_ended": ended,
     }
 
 
+@profiled("node.dialogue_process")
+def dialogue_process_node(state: GameState) -> dict:
+    """对话处理节点"""
+    response = _dialogue_extra_message(state)
+    if not response:
+        # 本轮玩家输入由提示词组装时单独附加
+        response = _generate_npc_response(
+            state.get("current_npc"), state.get("user_input", ""),
+            state.get("dialogue_history") or DialogueHistory())
+    return _dialogue_update(state, response)
+
+
+@profiled("node.dialogue_process")
+async def adialogue_process_node(state: GameState) -> dict:
+    """对话处理节点(异步)：等待LLM回复时让出事件循环"""
+    response = _dialogue_extra_message(state)
+    if not response:
+        response = await _agenerate_npc_response(
+            state.get("current_npc"), state.get("user_input", ""),
+            state.get("dialogue_history") or DialogueHistory())
+    return _dialogue_update(state, response)
+
+
 def _generate_npc_response(npc_id: str, user_input: str, history: list) -> str:
-    """
-    LLM占位符 - 生成NPC回复
-    当前返回模板回复，后续可替换为真实LLM调用
-    """
+    """生成NPC回复 - 优先调用LLM，请求失败时退回模板回复"""
+    try:
+        response = generate_reply(npc_id, user_input, history)
+    except (OSError, ValueError):
+        response = ""
+    if response and response != "胜算云API错误":
+        return response
+    return _template_npc_response(npc_id, user_input)
+
+
+async def _agenerate_npc_response(npc_id: str, user_input: str, history: list) -> str:
+    """异步生成NPC回复，失败时同样退回模板回复"""
+    try:
+        response = await agenerate_reply(npc_id, user_input, history)
+    except (OSError, ValueError, EOFError):
+        response = ""
+    if response and response != "胜算云API错误":
+        return response
+    return _template_npc_response(npc_id, user_input)
+
+
+def _template_npc_response(npc_id: str, user_input: str) -> str:
+    """模板回复"""
     npc_config = NPCS.get(npc_id, {})
     npc_name = npc_config.get("name", "NPC")
     
@@ -241,6 +274,38 @@ def _generate_npc_response(npc_id: str, user_input: str, history: list) -> str:
     return responses.get(user_input, f"{npc_name}微微点头。")
 
 
+# 其余节点没有 I/O，异步版本直接在事件循环中执行同步逻辑
+async def aidle_node(state: GameState) -> dict:
+    return idle_node(state)
+
+
+async def acultivation_node(state: GameState) -> dict:
+    return cultivation_node(state)
+
+
+async def aevent_trigger_node(state: GameState) -> dict:
+    return event_trigger_node(state)
+
+
+async def aevent_resolution_node(state: GameState) -> dict:
+    return event_resolution_node(state)
+
+
+async def adialogue_init_node(state: GameState) -> dict:
+    return dialogue_init_node(state)
+
+
+# 同步节点 -> 异步节点
+ASYNC_NODES = {
+    idle_node: aidle_node,
+    cultivation_node: acultivation_node,
+    event_trigger_node: aevent_trigger_node,
+    event_resolution_node: aevent_resolution_node,
+    dialogue_init_node: adialogue_init_node,
+    dialogue_process_node: adialogue_process_node,
+}
+
+
 def route_from_idle(state: GameState) -> Literal["cultivation", "event", "dialogue", "idle"]:
     """从闲置状态路由"""
     action = state.get("action", "")
@@ -1,11 +1,26 @@
-"""LangGraph状态定义"""
-from typing import TypedDict, List, Optional, Any
+"""LangGraph状态定义
+
+节点只返回变化的字段，由 LangGraph 合并进状态；带 Annotated 归并函数的字段按函数合并，其余字段直接覆盖。
+直接调度节点时用 apply_update 按同样的规则合并。
+"""
+from typing import Annotated, TypedDict, List, Optional, Any, get_type_hints
+from core.npc_dialogue import DialogueHistory
 from core.player import Player
 from core.time_system import TimeSystem
 from events.special_events import EventManager
 from npc.npcs import NPCManager
 
 
+def add_dialogue(history: Optional[DialogueHistory], update) -> DialogueHistory:
+    """
+    对话历史的归并函数
+    update 为 DialogueHistory 时整体替换(开始/结束对话)，为列表时追加到窗口末尾
+    """
+    if isinstance(update, DialogueHistory):
+        return update
+    return (history or DialogueHistory()).extend(update)
+
+
 class GameState(TypedDict, total=False):
     """游戏状态结构"""
     # 核心系统对象
@@ -40,7 +55,7 @@ class GameState(TypedDict, total=False):
     # NPC对话相关
     current_npc: Optional[str]
     npc_info: dict
-    dialogue_history: List[dict]
+    dialogue_history: Annotated[DialogueHistory, add_dialogue]
     user_input: str
     npc_response: str
     dialogue_options: List[str]
@@ -49,3 +64,19 @@ class GameState(TypedDict, total=False):
     should_trigger_event: bool
     breakthrough_occurred: bool
     dialogue_ended: bool
+
+
+# 字段 -> 归并函数
+REDUCERS = {
+    key: hint.__metadata__[0]
+    for key, hint in get_type_hints(GameState, include_extras=True).items()
+    if hasattr(hint, "__metadata__")
+}
+
+
+def apply_update(state: GameState, update: dict) -> GameState:
+    """把节点返回的变化合并进状态(原地修改并返回 state)"""
+    for key, value in update.items():
+        reducer = REDUCERS.get(key)
+        state[key] = reducer(state.get(key), value) if reducer else value
+    return state
@@ -0,0 +1,219 @@
+"""宗门回合状态图(对应 main_game_loop.mmd)
+
+    回合开始 → 事件(等待玩家选择) → 等待玩家操作 → 回合结算 → 回合开始
+
+需要玩家输入的节点(turn_event、turn_player)在开头调用 interrupt() 暂停，
+状态图停在检查点上，收到下一条命令时用 Command(resume=命令) 从暂停处继续。
+宗门状态、事件管理器与随机数流都是原地修改的对象，节点修改后须在返回值中带上，
+通道版本才会更新(IncrementalSaver 只写入版本有变化的通道)。
+检查点存储使用 graph.checkpoint.ParkingSaver：等待输入的会话可以换出到磁盘，不占内存，
+下次收到命令时自动读回。需要在进程崩溃后恢复时改用 IncrementalSaver(codecs=TURN_CODECS)，
+并以 durability="sync" 运行，每一步都写入 SQLite；重启后用同一 thread_id 创建会话即可继续。
+
+本模块不依赖 graph.state / graph.nodes(修仙版的玩家、时间系统等)，只使用宗门版的 core 模块。
+"""
+from typing import Optional, TypedDict
+
+from langgraph.graph import StateGraph
+from langgraph.types import Command, interrupt
+
+from core import actions
+from core.game_state import GameState
+from graph.checkpoint import STATE_CODEC
+from core.profiler import profiler, profiled
+from core.rng import RandomStreams
+from events.llm_turn import plan_turn, aplan_turn
+from events.special_events import EventManager
+
+WELCOME = "欢迎来到《仙宗 - 修仙模拟器》"
+
+# IncrementalSaver 的通道编码：随机数流先恢复，事件管理器恢复时接回其中的事件随机数流
+TURN_CODECS = {
+    "sect": STATE_CODEC,
+    "rng": (RandomStreams.to_data, lambda data, values: RandomStreams.from_data(data)),
+    "event_manager": (EventManager.to_data,
+                      lambda data, values: EventManager.from_data(data, values["rng"]["events"])),
+}
+
+
+class TurnState(TypedDict):
+    """回合状态图的状态"""
+    sect: GameState
+    event_manager: EventManager
+    rng: RandomStreams
+    event: Optional[dict]  # 等待玩家处理的事件
+    reply: dict  # 回复给玩家的内容，暂停时由调用方取走
+    ended: bool  # 玩家已结束本回合
+
+
+def turn_start_node(state: TurnState) -> dict:
+    """回合开始：年份加一，检查事件(LLM 在上一回合结算时预先生成)"""
+    sect = state["sect"]
+    # 上一回合的结算节点已计时完毕，在这里结束上一回合的统计(导出不计入本节点耗时)
+    profiler.end_turn(sect.game_time)
+    with profiler.span("node.turn_start"):
+        sect.game_time += 1
+        event = state["event_manager"].check_events(sect, False)
+        return {
+            "sect": sect,
+            "event_manager": state["event_manager"],  # check_events 取走了预生成的事件
+            "event": event,
+            "reply": {**state["reply"], "state": actions.status(sect, event)},
+        }
+
+
+def turn_event_node(state: TurnState) -> dict:
+    """等待玩家处理事件，期间可以查看状况与日志"""
+    command = interrupt(state["reply"])
+    # 计时从恢复执行开始，不含等待玩家输入的时间
+    with profiler.span("node.turn_event"):
+        sect, event = state["sect"], state["event"]
+        if command.startswith(("status", "log")):
+            return {"reply": actions.perform(sect, command) | {"event": event}}
+        reply = actions.choose(sect, state["event_manager"], event, command)
+        if not reply["success"]:
+            return {"reply": reply}
+        # 事件结算可能用到事件随机数流
+        return {"sect": sect, "rng": state["rng"], "event": None, "reply": reply}
+
+
+def turn_player_node(state: TurnState) -> dict:
+    """等待玩家操作：调整弟子、扩建，或结束回合"""
+    command = interrupt(state["reply"])
+    with profiler.span("node.turn_player"):
+        if command.strip() == "end":
+            return {"ended": True}
+        return {"sect": state["sect"], "reply": actions.perform(state["sect"], command)}
+
+
+def _settle_update(state: TurnState, plan: Optional[dict], error: Optional[Exception]) -> dict:
+    state["event_manager"].pending_event = actions.apply_plan(state["sect"], plan, error)
+    return {
+        "sect": state["sect"],
+        "event_manager": state["event_manager"],
+        "rng": state["rng"],  # 招募判定推进了随机数流
+        "ended": False,
+        "reply": {"success": True, "message": (plan["chronicle"] or "") if plan else ""},
+    }
+
+
+@profiled("node.turn_settle")
+def turn_settle_node(state: TurnState, config) -> dict:
+    """回合结算：数值结算后由 LLM 推演年度总结与下一年事件"""
+    actions.settle_turn(state["sect"], state["rng"]["recruit"])
+    planner = config["configurable"].get("planner", plan_turn)
+    try:
+        plan, error = planner(state["sect"]), None
+    except (OSError, EOFError, ValueError) as e:
+        plan, error = None, e
+    return _settle_update(state, plan, error)
+
+
+@profiled("node.turn_settle")
+async def aturn_settle_node(state: TurnState, config) -> dict:
+    """回合结算(异步)：等待LLM推演时让出事件循环"""
+    actions.settle_turn(state["sect"], state["rng"]["recruit"])
+    planner = config["configurable"].get("planner", aplan_turn)
+    try:
+        plan, error = await planner(state["sect"]), None
+    except (OSError, EOFError, ValueError) as e:
+        plan, error = None, e
+    return _settle_update(state, plan, error)
+
+
+def route_after_start(state: TurnState) -> str:
+    return "event" if state["event"] is not None else "player"
+
+
+def route_after_player(state: TurnState) -> str:
+    return "settle" if state["ended"] else "player"
+
+
+def create_turn_graph(asynchronous: bool = False) -> StateGraph:
+    """创建回合状态图，asynchronous 为 True 时结算节点使用异步推演"""
+    graph = StateGraph(TurnState)
+    graph.add_node("turn_start", turn_start_node)
+    graph.add_node("turn_event", turn_event_node)
+    graph.add_node("turn_player", turn_player_node)
+    graph.add_node("turn_settle", aturn_settle_node if asynchronous else turn_settle_node)
+
+    graph.set_entry_point("turn_start")
+    graph.add_conditional_edges("turn_start", route_after_start,
+                                {"event": "turn_event", "player": "turn_player"})
+    # 事件处理完之前一直停在事件节点
+    graph.add_conditional_edges("turn_event", route_after_start,
+                                {"event": "turn_event", "player": "turn_player"})
+    graph.add_conditional_edges("turn_player", route_after_player,
+                                {"settle": "turn_settle", "player": "turn_player"})
+    graph.add_edge("turn_settle", "turn_start")
+    return graph
+
+
+# 不带检查点存储的已编译回合状态图：asynchronous -> 状态图
+_COMPILED = {}
+
+
+def get_turn_graph(checkpointer, asynchronous: bool = False):
+    """
+    每个检查点存储共用一份已编译的回合状态图
+    编译结果缓存在存储对象上，随存储对象一起释放(见 graph.game_graph.get_compiled_graph)
+    """
+    if checkpointer is None:
+        cache = _COMPILED
+    else:
+        cache = getattr(checkpointer, "_turn_graphs", None)
+        if cache is None:
+            cache = checkpointer._turn_graphs = {}
+    graph = cache.get(asynchronous)
+    if graph is None:
+        graph = cache[asynchronous] = create_turn_graph(asynchronous).compile(checkpointer=checkpointer)
+    return graph
+
+
+class TurnSession:
+    """
+    一局游戏在回合状态图中的会话(一个 thread)
+    状态只存在于检查点存储中，会话对象本身只记录 thread_id
+    默认检查点只在状态图暂停(等待输入)时写入一次(durability="exit")，中间步骤不写；
+    使用 IncrementalSaver 时传入 durability="sync"，每一步写入后才继续下一步
+    """
+    __slots__ = ("saver", "config", "durability")
+
+    def __init__(self, saver, thread_id: str, planner=None, durability: str = "exit"):
+        self.saver = saver
+        self.durability = durability
+        self.config = {"configurable": {"thread_id": thread_id}}
+        if planner is not None:
+            self.config["configurable"]["planner"] = planner
+
+    @staticmethod
+    def _initial(state: Optional[GameState]) -> dict:
+        streams = RandomStreams()
+        return {"sect": state or GameState(), "event_manager": EventManager(streams["events"]), "rng": streams,
+                "event": None, "reply": {"success": True, "message": WELCOME}, "ended": False}
+
+    def start(self, state: Optional[GameState] = None) -> dict:
+        """开始游戏，运行到第一个需要玩家输入的节点，返回欢迎信息"""
+        graph = get_turn_graph(self.saver)
+        return graph.invoke(self._initial(state), self.config, durability=self.durability)["reply"]
+
+    def handle(self, command: str) -> dict:
+        """执行一条命令，运行到下一个需要玩家输入的节点"""
+        graph = get_turn_graph(self.saver)
+        return graph.invoke(Command(resume=command), self.config, durability=self.durability)["reply"]
+
+    async def astart(self, state: Optional[GameState] = None) -> dict:
+        graph = get_turn_graph(self.saver, True)
+        return (await graph.ainvoke(self._initial(state), self.config, durability=self.durability))["reply"]
+
+    async def ahandle(self, command: str) -> dict:
+        graph = get_turn_graph(self.saver, True)
+        return (await graph.ainvoke(Command(resume=command), self.config, durability=self.durability))["reply"]
+
+    def park(self) -> int:
+        """换出到磁盘，返回写入的字节数"""
+        return self.saver.park(self.config["configurable"]["thread_id"])
+
+    def close(self):
+        """结束会话，删除检查点"""
+        self.saver.delete_thread(self.config["configurable"]["thread_id"])
@@ -0,0 +1,261 @@
+"""仙宗 - 修仙模拟器 多会话服务器
+
+一个进程内用 asyncio 托管大量互相独立的宗门，每个 TCP 连接一局游戏，各自拥有 GameState 与 EventManager。
+协议按行收发：客户端每行一条命令，服务器每条命令回复一行 JSON {"success": bool, "message": str, ...}。
+
+    status                      宗门状况
+    dispatch mining|recruiting N    派遣弟子
+    recall mining|recruiting N      召回弟子
+    upgrade vault|cave          扩建
+    choose N                    处理当前事件
+    log [N]                     最近日志
+    end                         结束回合(LLM 推演期间不占用线程，其他会话照常处理)
+    quit                        断开
+
+默认每局游戏是回合状态图(graph.turn_graph)中的一个会话：等待玩家输入时状态图停在检查点上，
+空闲超过 park_after 秒的会话换出到 SQLite(graph.checkpoint.ParkingSaver)，内存只用于活跃会话，
+收到下一条命令时自动读回。--direct 时改用常驻内存的 GameSession，不经过状态图。
+所有会话的 LLM 请求共用 core.llm 的连接池。
+
+    python -m server.game_server [--host HOST] [--port PORT] [--park-after 秒] [--direct [--record 目录]]
+                                 [--profile [--tracemalloc]]
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import time
+from typing import Optional
+
+from config.settings import (SERVER_HOST, SERVER_PORT, SERVER_MAX_LINE, SERVER_PARK_AFTER, PARK_DB, REPLAY_DIR,
+                             PROFILE_JSONL, PROFILE_PROMETHEUS)
+from core import actions
+from core.game_state import GameState
+from core.profiler import profiler
+from core.recording import Recorder
+from core.rng import RandomStreams
+from events.llm_turn import aplan_turn
+from events.special_events import EventManager
+from graph.checkpoint import ParkingSaver
+from graph.turn_graph import TurnSession, WELCOME
+
+
+class GameSession:
+    """
+    一局游戏(一个连接)，状态常驻内存
+    handle / start 为同步接口(planner 为同步函数，用于无界面回放)，ahandle / astart 为异步接口
+    recorder 不为 None 时把命令与 LLM 推演结果录制下来(core.recording)
+    """
+    __slots__ = ("state", "event_manager", "event", "planner", "rng", "recorder")
+
+    def __init__(self, state: Optional[GameState] = None, planner=aplan_turn,
+                 streams: Optional[RandomStreams] = None, recorder: Optional[Recorder] = None):
+        self.state = state or GameState()
+        self.rng = streams or RandomStreams()
+        self.event_manager = EventManager(self.rng["events"])
+        self.event: Optional[dict] = None  # 等待玩家处理的事件
+        self.planner = planner
+        self.recorder = recorder
+
+    def start_turn(self):
+        """开始新回合：年份加一，检查事件"""
+        self.state.game_time += 1
+        with profiler.span("turn.events"):
+            self.event = self.event_manager.check_events(self.state, False)
+
+    def start(self) -> dict:
+        self.start_turn()
+        return {"success": True, "message": WELCOME,
+                "state": actions.status(self.state, self.event)}
+
+    async def astart(self) -> dict:
+        return self.start()
+
+    def _perform(self, command: str) -> Optional[dict]:
+        """执行除结束回合以外的命令；结束回合时完成数值结算并返回 None"""
+        if self.recorder is not None:
+            self.recorder.command(command)
+        if self.event is not None:
+            if command.startswith(("status", "log")):
+                return actions.perform(self.state, command) | {"event": self.event}
+            result = actions.choose(self.state, self.event_manager, self.event, command)
+            if result["success"]:
+                self.event = None
+            return result
+        if command.strip() == "end":
+            with profiler.span("turn.settle"):
+                actions.settle_turn(self.state, self.rng["recruit"])
+            return None
+        return actions.perform(self.state, command)
+
+    def handle(self, command: str) -> dict:
+        """执行一条命令"""
+        reply = self._perform(command)
+        if reply is not None:
+            return reply
+        try:
+            with profiler.span("turn.llm"):
+                plan, error = self.planner(self.state), None
+        except (OSError, EOFError, ValueError) as e:
+            plan, error = None, e
+        return self._end_turn(plan, error)
+
+    async def ahandle(self, command: str) -> dict:
+        """执行一条命令，结束回合时等待LLM推演期间让出事件循环"""
+        reply = self._perform(command)
+        if reply is not None:
+            return reply
+        try:
+            with profiler.span("turn.llm"):
+                plan, error = await self.planner(self.state), None
+        except (OSError, EOFError, ValueError) as e:
+            plan, error = None, e
+        return self._end_turn(plan, error)
+
+    def _end_turn(self, plan: Optional[dict], error: Optional[Exception]) -> dict:
+        """记录LLM推演结果并进入下一年"""
+        if self.recorder is not None:
+            self.recorder.plan(plan, error)
+        self.event_manager.pending_event = actions.apply_plan(self.state, plan, error)
+        if self.recorder is not None:
+            self.recorder.turn(self.state)
+        profiler.end_turn(self.state.game_time)
+        self.start_turn()
+        return {"success": True, "message": (plan["chronicle"] or "") if plan else "",
+                "state": actions.status(self.state, self.event)}
+
+    def park(self) -> int:
+        """状态常驻内存，不支持换出"""
+        return 0
+
+    def close(self):
+        if self.recorder is not None:
+            self.recorder.close(self.state)
+
+
+class GameServer:
+    """多会话服务器"""
+
+    def __init__(self, host: str = SERVER_HOST, port: int = SERVER_PORT, planner=aplan_turn,
+                 park_after: Optional[float] = SERVER_PARK_AFTER, park_db: str = PARK_DB, direct: bool = False,
+                 record_dir: Optional[str] = None):
+        """
+        park_after: 会话空闲多少秒后换出到磁盘，None 表示不换出
+        direct: 使用常驻内存的 GameSession，不经过回合状态图(不支持换出)
+        record_dir: 把每个会话录制到该目录(core.recording)，只用于 direct 会话
+        """
+        self.host = host
+        self.port = port
+        self.planner = planner
+        self.park_after = park_after
+        self.saver = None if direct else ParkingSaver(park_db)
+        self.record_dir = record_dir
+        self._record_prefix = time.strftime("server-%Y%m%d-%H%M%S")
+        self.sessions = set()
+        self.server: Optional[asyncio.AbstractServer] = None
+        self._ids = itertools.count(1)
+        # 统计
+        self.connections = 0
+        self.commands = 0
+
+    def _session(self):
+        if self.saver is not None:
+            return TurnSession(self.saver, f"{id(self):x}-{next(self._ids)}", self.planner)
+        streams = RandomStreams()
+        recorder = None
+        if self.record_dir:
+            path = os.path.join(self.record_dir, f"{self._record_prefix}-{next(self._ids)}.jsonl")
+            recorder = Recorder(path, streams.seeds, "server")
+        return GameSession(planner=self.planner, streams=streams, recorder=recorder)
+
+    async def _readline(self, reader: asyncio.StreamReader, session) -> bytes:
+        """读取一条命令，空闲超过 park_after 秒时先把会话换出再继续等待"""
+        if self.park_after is None:
+            return await reader.readline()
+        try:
+            return await asyncio.wait_for(reader.readline(), self.park_after)
+        except asyncio.TimeoutError:
+            session.park()
+            return await reader.readline()
+
+    async def start(self) -> asyncio.AbstractServer:
+        self.server = await asyncio.start_server(self._serve, self.host, self.port, limit=SERVER_MAX_LINE,
+                                                 backlog=4096)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self.server
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        session = self._session()
+        self.sessions.add(session)
+        self.connections += 1
+        try:
+            writer.write(self._encode(await session.astart()))
+            await writer.drain()
+            while True:
+                try:
+                    line = await self._readline(reader, session)
+                except (ValueError, asyncio.LimitOverrunError):
+                    # 单行过长
+                    break
+                if not line:
+                    break
+                command = line.decode("utf-8", "replace").strip()
+                if command == "quit":
+                    break
+                self.commands += 1
+                writer.write(self._encode(await session.ahandle(command)))
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.sessions.discard(session)
+            session.close()
+            writer.close()
+
+    @staticmethod
+    def _encode(reply: dict) -> bytes:
+        return json.dumps(reply, ensure_ascii=False).encode("utf-8") + b"\n"
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        if self.saver is not None:
+            self.saver.close()
+
+
+async def serve(host: str, port: int, park_after: Optional[float], direct: bool, record_dir: Optional[str]):
+    server = GameServer(host, port, park_after=park_after, direct=direct, record_dir=record_dir)
+    await server.start()
+    print(f"服务器已启动：{host}:{server.port}")
+    async with server.server:
+        await server.server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="仙宗多会话服务器")
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    parser.add_argument("--park-after", type=float, default=SERVER_PARK_AFTER,
+                        help="会话空闲多少秒后换出到磁盘(负数表示不换出)")
+    parser.add_argument("--direct", action="store_true", help="会话常驻内存，不经过回合状态图")
+    parser.add_argument("--record", nargs="?", const=REPLAY_DIR,
+                        help=f"录制每个会话的目录(默认 {REPLAY_DIR})，需同时使用 --direct")
+    parser.add_argument("--profile", action="store_true",
+                        help=f"每回合把各阶段耗时追加到 {PROFILE_JSONL}，并导出 Prometheus 直方图到 {PROFILE_PROMETHEUS}")
+    parser.add_argument("--tracemalloc", action="store_true", help="同时用 tracemalloc 记录每回合的内存分配(较慢)")
+    args = parser.parse_args(argv)
+    if args.profile or args.tracemalloc:
+        profiler.configure(PROFILE_JSONL, PROFILE_PROMETHEUS, trace_memory=args.tracemalloc)
+    if args.record and not args.direct:
+        parser.error("--record 需要 --direct")
+    park_after = args.park_after if args.park_after >= 0 else None
+    try:
+        asyncio.run(serve(args.host, args.port, park_after, args.direct, args.record))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
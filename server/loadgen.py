@@ -0,0 +1,212 @@
+"""多会话服务器压测：在本进程内启动服务器、本地假 LLM 服务与大量客户端
+
+    python -m server.loadgen --sessions 2000 --actions 20 --llm-delay 0.2
+
+先让全部会话连上并空闲一段时间(统计每会话内存与空闲 CPU；空闲超过 park_after 秒的会话会被换出到磁盘)，
+再让每个会话连续执行 actions 条命令(每 end_every 条结束一次回合，遇到事件选第一个选项)，输出命令延迟分位数与吞吐。
+客户端与服务器在同一进程，内存与 CPU 统计包含客户端一侧的开销。
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+from typing import Optional
+
+from config.settings import LLM_POOL_SIZE
+from core.llm import LLMPool, set_pool
+from server.game_server import GameServer
+
+_ACTIONS = ("dispatch mining 1", "dispatch recruiting 1", "recall mining 1", "recall recruiting 1",
+            "upgrade vault", "upgrade cave", "status")
+
+
+def _rss() -> int:
+    """当前进程常驻内存(字节)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _raise_fd_limit():
+    try:
+        import resource
+    except ImportError:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+def _percentiles(values: list) -> str:
+    if not values:
+        return "无"
+    values = sorted(values)
+    pick = lambda q: values[min(len(values) - 1, int(len(values) * q))] * 1000
+    return f"p50 {pick(0.5):.2f}ms  p95 {pick(0.95):.2f}ms  p99 {pick(0.99):.2f}ms  最慢 {values[-1] * 1000:.2f}ms"
+
+
+async def fake_llm(delay: float) -> asyncio.AbstractServer:
+    """本地假 LLM 服务：等待 delay 秒后返回年度总结，隔年附带一个事件"""
+    counter = 0
+
+    async def handle(reader, writer):
+        nonlocal counter
+        try:
+            while True:
+                if not await reader.readline():
+                    break
+                length = 0
+                while (line := await reader.readline()) not in (b"\r\n", b""):
+                    name, _, value = line.decode("latin-1").partition(":")
+                    if name.strip().lower() == "content-length":
+                        length = int(value)
+                await reader.readexactly(length)
+                await asyncio.sleep(delay)
+                counter += 1
+                calls = [{"function": {"name": "write_chronicle",
+                                       "arguments": json.dumps({"narrative": "本年风调雨顺，宗门安好。"})}}]
+                if counter % 2:
+                    event = {"title": "山门来客", "description": "一名散修登门求见。",
+                             "options": [{"text": "以礼相待", "outcome": "散修留下些许灵石。", "deltas": {"wealth": 5}},
+                                         {"text": "闭门谢客", "outcome": "散修悻悻离去。"}]}
+                    calls.append({"function": {"name": "define_event", "arguments": json.dumps(event)}})
+                body = json.dumps({"choices": [{"message": {"content": "", "tool_calls": calls}}]}).encode()
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                             + f"Content-Length: {len(body)}\r\n\r\n".encode() + body)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, "127.0.0.1", 0)
+
+
+class _Client:
+    __slots__ = ("reader", "writer", "event")
+
+    async def connect(self, port: int):
+        self.reader, self.writer = await asyncio.open_connection("127.0.0.1", port)
+        self.event = json.loads(await self.reader.readline())["state"]["event"]
+
+    async def send(self, command: str) -> dict:
+        self.writer.write(command.encode("utf-8") + b"\n")
+        await self.writer.drain()
+        return json.loads(await self.reader.readline())
+
+
+async def _play(client: _Client, actions: int, end_every: int, rng: random.Random, think: float,
+                latencies: dict):
+    for i in range(actions):
+        if think:
+            await asyncio.sleep(rng.uniform(0, think))
+        if client.event:
+            kind, command = "choose", "choose 0"
+        elif (i + 1) % end_every == 0:
+            kind, command = "end", "end"
+        else:
+            kind, command = "action", rng.choice(_ACTIONS)
+        start = time.perf_counter()
+        reply = await client.send(command)
+        latencies[kind].append(time.perf_counter() - start)
+        if kind == "choose":
+            client.event = None
+        elif kind == "end":
+            client.event = reply["state"]["event"]
+
+
+async def run(sessions: int, actions: int, end_every: int, llm_delay: float, think: float, idle: float,
+              seed: int, pool_size: int = LLM_POOL_SIZE, park_after: Optional[float] = None,
+              direct: bool = False):
+    _raise_fd_limit()
+    llm_server = await fake_llm(llm_delay)
+    pool = LLMPool("127.0.0.1", llm_server.sockets[0].getsockname()[1], ssl=False, size=pool_size)
+    set_pool(pool)
+    park_db = os.path.join(tempfile.mkdtemp(prefix="loadgen-"), "parked.db")
+    server = GameServer(port=0, park_after=park_after, park_db=park_db, direct=direct)
+    await server.start()
+
+    # 建立会话
+    rss_before = _rss()
+    start = time.perf_counter()
+    clients, failures = [], 0
+    for batch in range(0, sessions, 500):
+        pending = [_Client() for _ in range(min(500, sessions - batch))]
+        results = await asyncio.gather(*(c.connect(server.port) for c in pending), return_exceptions=True)
+        for client, result in zip(pending, results):
+            if isinstance(result, BaseException):
+                failures += 1
+            else:
+                clients.append(client)
+    connect_time = time.perf_counter() - start
+    rss_connected = _rss()
+    print(f"会话：{len(clients)} 个建立成功，{failures} 个失败，用时 {connect_time:.2f}s")
+    if clients:
+        print(f"内存：{(rss_connected - rss_before) / len(clients) / 1024:.1f} KB/会话"
+              f"(常驻内存 {rss_before / 2**20:.0f}MB → {rss_connected / 2**20:.0f}MB)")
+
+    # 空闲
+    cpu, wall = time.process_time(), time.perf_counter()
+    await asyncio.sleep(idle)
+    cpu, wall = time.process_time() - cpu, time.perf_counter() - wall
+    print(f"空闲 {wall:.1f}s：CPU 占用 {cpu / wall:.1%}")
+    saver = server.saver
+    if saver is not None and saver.parks:
+        # 换出后释放的内存留在 Python 的分配器中供后续会话复用，常驻内存不会随之下降
+        print(f"换出：{saver.parks} 个会话，平均 {saver.parked_bytes / saver.parks:.0f} 字节，"
+              f"内存中剩 {saver.resident} 个")
+
+    # 压测
+    latencies = {"action": [], "choose": [], "end": []}
+    rng = random.Random(seed)
+    start = time.perf_counter()
+    await asyncio.gather(*(_play(c, actions, end_every, random.Random(rng.random()), think, latencies)
+                           for c in clients))
+    elapsed = time.perf_counter() - start
+    total = sum(len(v) for v in latencies.values())
+    print(f"命令：{total} 条，用时 {elapsed:.2f}s，吞吐 {total / elapsed:.0f} 条/s")
+    for kind, label in (("action", "普通操作"), ("choose", "处理事件"), ("end", f"结束回合(LLM 延迟 {llm_delay * 1000:.0f}ms)")):
+        print(f"  {label}({len(latencies[kind])} 条)：{_percentiles(latencies[kind])}")
+    print(f"LLM 连接池：{pool.requests} 次请求，建立 {pool.connects} 条连接，"
+          f"最多 {pool_size / llm_delay:.0f} 次/s(超出时结束回合需排队)")
+    if saver is not None:
+        print(f"检查点：换出 {saver.parks} 次，读回 {saver.unparks} 次")
+
+    for client in clients:
+        client.writer.close()
+    # 等服务器一侧的会话处理完断开
+    deadline = time.perf_counter() + 5
+    while server.sessions and time.perf_counter() < deadline:
+        await asyncio.sleep(0.05)
+    await server.close()
+    pool.close()
+    await asyncio.sleep(0.1)  # 让假 LLM 服务一侧看到连接关闭
+    llm_server.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="多会话服务器压测")
+    parser.add_argument("--sessions", type=int, default=1000, help="会话数")
+    parser.add_argument("--actions", type=int, default=20, help="每个会话执行的命令数")
+    parser.add_argument("--end-every", type=int, default=5, help="每隔多少条命令结束一次回合")
+    parser.add_argument("--llm-delay", type=float, default=0.2, help="假 LLM 每次回复的延迟(秒)")
+    parser.add_argument("--think", type=float, default=0.0, help="每条命令前随机等待的最长秒数")
+    parser.add_argument("--idle", type=float, default=2.0, help="全部连上后空闲观察的秒数")
+    parser.add_argument("--pool", type=int, default=LLM_POOL_SIZE, help="LLM 连接池大小")
+    parser.add_argument("--park-after", type=float, default=None,
+                        help="会话空闲多少秒后换出到磁盘(默认不换出)")
+    parser.add_argument("--direct", action="store_true", help="会话常驻内存，不经过回合状态图")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    asyncio.run(run(args.sessions, args.actions, args.end_every, args.llm_delay, args.think, args.idle,
+                    args.seed, args.pool, args.park_after, args.direct))
+
+
+if __name__ == "__main__":
+    main()
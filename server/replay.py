@@ -0,0 +1,228 @@
+"""无界面回放对局录像(core.recording)
+
+回放时按录像中的种子恢复各子系统的随机数流，依次执行录下的命令，LLM 推演结果直接取自录像，
+不访问网络、不输出界面，以 CPU 全速运行；每回合结算后比对校验值，发现与录制时不一致即报告分歧的年份。
+
+    python -m server.replay run saves/replays                  # 回放目录下全部录像
+    python -m server.replay run a.jsonl b.jsonl --workers 4
+    python -m server.replay record saves/replays/ci --sessions 1000 --turns 50 --seed 1
+                                                               # 用脚本玩家生成一批录像
+
+录像多于 REPLAY_INLINE_FILES 个时在进程池中回放。有分歧或录像损坏时退出码为 1。
+"""
+import argparse
+import glob
+import os
+import random
+import statistics
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+from config.settings import REPLAY_DIR, REPLAY_INLINE_FILES
+from core.game_state import GameState
+from core.recording import Recorder, Recording, state_digest
+from core.rng import RandomStreams
+from events.llm_turn import validate_event
+from server.game_server import GameSession
+
+# 脚本玩家的普通操作
+_ACTIONS = ("dispatch mining 1", "dispatch recruiting 1", "recall mining 1", "recall recruiting 1",
+            "upgrade vault", "upgrade cave", "status", "log 5")
+_REPORT_FAILURES = 20  # 报告中最多列出的不一致录像数
+
+
+class _Exhausted(Exception):
+    """录像中的 LLM 推演结果已用完"""
+
+
+class _Verifier:
+    """代替 Recorder 挂在回放会话上，逐回合比对校验值"""
+    __slots__ = ("expected", "turns", "diverged")
+
+    def __init__(self, expected: list):
+        self.expected = expected
+        self.turns = 0
+        self.diverged: Optional[int] = None  # 第一次不一致的年份
+
+    def command(self, command: str):
+        pass
+
+    def plan(self, plan, error=None):
+        pass
+
+    def turn(self, state: GameState):
+        if self.diverged is None and (self.turns >= len(self.expected)
+                                      or state_digest(state) != self.expected[self.turns]):
+            self.diverged = state.game_time
+        self.turns += 1
+
+    def close(self, state=None):
+        pass
+
+
+def _recorded_planner(plans: list):
+    """按顺序返回录像中的 LLM 推演结果"""
+    pending = iter(plans)
+
+    def planner(state: GameState) -> dict:
+        plan = next(pending, None)
+        if plan is None:
+            raise _Exhausted()
+        if isinstance(plan, Exception):
+            raise plan
+        return plan
+
+    return planner
+
+
+def replay(recording: Recording) -> dict:
+    """
+    回放一局录像
+    返回: {"success": bool, "message": str, "path", "turns", "commands", "elapsed", "diverged"}
+    """
+    verifier = _Verifier(recording.turns)
+    session = GameSession(planner=_recorded_planner(recording.plans), streams=RandomStreams(recording.seeds),
+                          recorder=verifier)
+    start = time.perf_counter()
+    message = ""
+    try:
+        session.start()
+        for command in recording.commands:
+            session.handle(command)
+    except _Exhausted:
+        message = "录像中的 LLM 推演结果不足"
+    elapsed = time.perf_counter() - start
+
+    if not message and verifier.diverged is not None:
+        message = f"第 {verifier.diverged} 年结算后与录像不一致"
+    elif not message and verifier.turns != len(recording.turns):
+        message = f"回合数不一致：录像 {len(recording.turns)}，回放 {verifier.turns}"
+    elif not message and recording.end and recording.end["digest"] != state_digest(session.state):
+        message = "结束时的宗门状态与录像不一致"
+    return {
+        "success": not message,
+        "message": message or "一致",
+        "path": recording.path,
+        "turns": verifier.turns,
+        "commands": len(recording.commands),
+        "elapsed": elapsed,
+        "diverged": verifier.diverged,
+    }
+
+
+def _replay_file(path: str) -> dict:
+    try:
+        return replay(Recording(path))
+    except (OSError, ValueError, KeyError) as e:
+        return {"success": False, "message": f"无法读取录像：{e}", "path": path, "turns": 0, "commands": 0,
+                "elapsed": 0.0, "diverged": None}
+
+
+def collect(paths: list) -> list:
+    """展开目录，返回全部录像文件"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, "*.jsonl"))))
+        else:
+            files.append(path)
+    return files
+
+
+def replay_files(files: list, workers: Optional[int] = None) -> list:
+    """回放一批录像，录像较多时使用进程池"""
+    if len(files) <= REPLAY_INLINE_FILES or workers == 1:
+        return [_replay_file(path) for path in files]
+    chunksize = max(1, len(files) // (8 * (workers or os.cpu_count() or 1)))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(_replay_file, files, chunksize=chunksize))
+
+
+def _offline_plan(rng: random.Random, state: GameState) -> dict:
+    """脚本玩家使用的离线推演：固定格式的年度总结，约一半年份附带一个事件"""
+    event = None
+    if rng.random() < 0.5:
+        event = validate_event({
+            "title": "山门来客",
+            "description": "一名散修登门求见。",
+            "options": [
+                {"text": "以礼相待", "outcome": "散修留下些许灵石。", "deltas": {"wealth": rng.randint(1, 20)}},
+                {"text": "收为弟子", "outcome": "散修拜入山门。", "deltas": {"disciples_total": 1}},
+                {"text": "闭门谢客", "outcome": "散修悻悻离去。"},
+            ],
+        })
+    return {"chronicle": f"第{state.game_time}年，宗门弟子{state.sect_data['disciples_total']}人，诸事平顺。",
+            "event": event}
+
+
+def record_scripted(path: str, seed: int, turns: int) -> dict:
+    """用脚本玩家玩 turns 个回合并录制到 path，返回录制结果"""
+    policy = random.Random(seed)
+    streams = RandomStreams(seed=seed)
+    recorder = Recorder(path, streams.seeds, "script")
+    session = GameSession(planner=lambda state: _offline_plan(policy, state), streams=streams, recorder=recorder)
+    session.start()
+    while recorder.turns < turns:
+        if session.event is not None:
+            session.handle(f"choose {policy.randrange(len(session.event['options']))}")
+            continue
+        for _ in range(policy.randint(0, 5)):
+            session.handle(policy.choice(_ACTIONS))
+        session.handle("end")
+    session.close()
+    return {"path": path, "turns": recorder.turns, "commands": recorder.commands}
+
+
+def _report(results: list, wall: float) -> str:
+    failed = [r for r in results if not r["success"]]
+    turns = sum(r["turns"] for r in results)
+    commands = sum(r["commands"] for r in results)
+    elapsed = sorted(r["elapsed"] for r in results) or [0.0]
+    lines = [f"{r['path']}: {r['message']}" for r in failed[:_REPORT_FAILURES]]
+    if len(failed) > _REPORT_FAILURES:
+        lines.append(f"……另有 {len(failed) - _REPORT_FAILURES} 局不一致")
+    lines.append(f"回放 {len(results)} 局：一致 {len(results) - len(failed)}，不一致 {len(failed)}；"
+                 f"共 {turns} 回合、{commands} 条命令，用时 {wall:.2f}s"
+                 f"({turns / wall if wall else 0:.0f} 回合/s，{commands / wall if wall else 0:.0f} 条/s)")
+    lines.append(f"每局回放耗时 p50 {elapsed[len(elapsed) // 2] * 1000:.2f}ms  "
+                 f"p95 {elapsed[int(len(elapsed) * 0.95)] * 1000:.2f}ms  "
+                 f"平均 {statistics.fmean(elapsed) * 1000:.2f}ms")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="无界面回放对局录像")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_parser = commands.add_parser("run", help="回放录像并比对校验值")
+    run_parser.add_argument("paths", nargs="*", default=[REPLAY_DIR], help="录像文件或目录")
+    run_parser.add_argument("--workers", type=int, help="进程数，默认等于 CPU 核数")
+    record_parser = commands.add_parser("record", help="用脚本玩家生成录像")
+    record_parser.add_argument("out", nargs="?", default=REPLAY_DIR, help="输出目录")
+    record_parser.add_argument("--sessions", type=int, default=100, help="局数")
+    record_parser.add_argument("--turns", type=int, default=50, help="每局回合数")
+    record_parser.add_argument("--seed", type=int, default=0, help="总种子，各局的种子由它派生")
+    args = parser.parse_args(argv)
+
+    if args.command == "record":
+        seeds = random.Random(args.seed)
+        start = time.perf_counter()
+        for i in range(args.sessions):
+            record_scripted(os.path.join(args.out, f"script-{args.seed}-{i:05d}.jsonl"), seeds.getrandbits(63),
+                            args.turns)
+        print(f"已生成 {args.sessions} 局录像到 {args.out}，用时 {time.perf_counter() - start:.2f}s")
+        return
+
+    files = collect(args.paths)
+    if not files:
+        parser.error("没有找到录像")
+    start = time.perf_counter()
+    results = replay_files(files, args.workers)
+    print(_report(results, time.perf_counter() - start))
+    if not all(r["success"] for r in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""跨存档统计"""
+import json
+
+import pytest
+
+from bench.micro import aged_state
+from core.analytics import find_saves, run_query
+from core.binary_save import save_to_file
+from core.save_db import SaveDatabase
+
+
+@pytest.fixture(scope="module")
+def archive(tmp_path_factory):
+    root = tmp_path_factory.mktemp("archive")
+    states = [aged_state(years, seed) for seed, years in enumerate((5, 10, 15, 20))]
+    save_to_file(str(root / "a.sav"), states[0])
+    (root / "save_2.json").write_text(json.dumps({"save_time": "", "state": states[1].to_dict()}), encoding="utf-8")
+    # 自动存档快照与分支存档清单不是完整存档
+    (root / "journal").mkdir()
+    (root / "journal" / "snapshot_1.json").write_text(json.dumps(states[1].to_dict()), encoding="utf-8")
+    (root / "store" / "branches").mkdir(parents=True)
+    (root / "store" / "refs.json").write_text("{}", encoding="utf-8")
+    (root / "store" / "branches" / "main.json").write_text('{"chunks": {}}', encoding="utf-8")
+    database = SaveDatabase(str(root / "saves.db"))
+    database.save(1, states[2])
+    database.save(2, states[3])
+    database.close()
+
+    data = (root / "a.sav").read_bytes()
+    (root / "truncated.sav").write_bytes(data[:len(data) // 2])
+    corrupt = bytearray(data)
+    for i in range(len(data) // 2, len(data) - 8):
+        corrupt[i] ^= 0x5A
+    (root / "corrupt.sav").write_bytes(bytes(corrupt))
+    return root, states
+
+
+def test_find_saves_lists_database_slots(archive):
+    root, _ = archive
+    names = [path[len(str(root)) + 1:] for path in find_saves(str(root))]
+    assert names == ["a.sav", "corrupt.sav", "save_2.json", "saves.db#1", "saves.db#2", "truncated.sav"]
+
+
+def test_broken_saves_are_skipped_not_fatal(archive, tmp_path):
+    root, states = archive
+    result = run_query(str(root), "final(year)", workers=1, cache_path=str(tmp_path / "cache.db"))
+    assert result["files"] == 6
+    assert sorted(path[len(str(root)) + 1:] for path in result["errors"]) == ["corrupt.sav", "truncated.sav"]
+    assert result["summary"]["count"] == 4
+    assert result["summary"]["percentiles"][50] == pytest.approx(12.5)
+
+
+def test_cache_hits_on_repeat_query(archive, tmp_path):
+    root, _ = archive
+    cache = str(tmp_path / "cache.db")
+    run_query(str(root), "max(wealth)", workers=1, cache_path=cache)
+    assert run_query(str(root), "max(wealth)", workers=1, cache_path=cache)["cache_hits"] == 4
+
+
+@pytest.mark.parametrize("codec", ["zlib", "lzma"])
+def test_every_single_byte_corruption_is_contained(tmp_path, codec):
+    save_to_file(str(tmp_path / "x.sav"), aged_state(10), codec)
+    data = (tmp_path / "x.sav").read_bytes()
+    failures = 0
+    for i in range(len(data)):
+        corrupt = bytearray(data)
+        corrupt[i] ^= 0xFF
+        (tmp_path / f"{i}.sav").write_bytes(bytes(corrupt))
+    (tmp_path / "x.sav").unlink()
+    result = run_query(str(tmp_path), "final(year)", workers=1, cache_path=None)
+    # 每个文件要么解析失败被跳过，要么正常参与统计，查询本身不中断
+    assert result["errors"]
+    assert len(result["errors"]) + result["summary"]["count"] + result["missing"] == len(data)
@@ -0,0 +1,33 @@
+"""后台自动存档：写入失败时记录错误并继续工作"""
+from core.autosave import AutosaveService
+from core.game_state import GameState
+from core.journal import SaveJournal, load_journal
+
+
+def test_worker_survives_unexpected_errors(tmp_path):
+    journal = SaveJournal(str(tmp_path))
+    append = journal.append
+    failures = []
+
+    def failing_append(state):
+        if not failures:
+            failures.append(state)
+            raise TypeError("Object of type set is not JSON serializable")
+        append(state)
+
+    journal.append = failing_append
+    service = AutosaveService(journal)
+    state = GameState()
+    service.reset(state)
+    assert service.flush(5)
+    state.game_time = 1
+    service.submit(state)
+    assert service.flush(5)
+    assert "not JSON serializable" in service.last_error and service.written == 1
+
+    state.game_time = 2
+    service.submit(state)
+    assert service.flush(5)
+    service.close()
+    assert service.written == 2
+    assert load_journal(str(tmp_path))["state"].game_time == 2
@@ -0,0 +1,55 @@
+"""编年史：延迟建立的搜索与年份索引"""
+from core.chronicle import Chronicle
+
+
+def _chronicle():
+    chronicle = Chronicle()
+    chronicle.append(1, "raw", "山门初立")
+    chronicle.append(1, "dispatch", 2, "挖矿")
+    chronicle.append(3, "recruit_success", 4)
+    chronicle.append(3, "llm_summary", "灵脉矿洞产出稳定")
+    return chronicle
+
+
+def test_append_and_load_do_not_build_the_index():
+    chronicle = _chronicle()
+    assert chronicle._indexed == 0 and not chronicle._postings
+    loaded = Chronicle.from_data(chronicle.to_data())
+    assert loaded._indexed == 0 and loaded.to_data() == chronicle.to_data()
+
+
+def test_search_indexes_new_entries_incrementally():
+    chronicle = _chronicle()
+    assert list(chronicle.search("挖矿")) == [1]
+    assert list(chronicle.search("矿洞")) == [3]
+    chronicle.append(4, "raw", "再开一座矿洞")
+    assert list(chronicle.search("矿洞")) == [3, 4]
+    assert list(chronicle.search("无此事")) == []
+    assert chronicle.format(4) == "第4年 再开一座矿洞"
+
+
+def test_first_entry_of_year():
+    chronicle = _chronicle()
+    assert chronicle.first_entry_of_year(2) == 2
+    assert chronicle.first_entry_of_year(5) is None
+    chronicle.append(6, "raw", "新的一年")
+    assert chronicle.first_entry_of_year(5) == 4
+
+
+def test_truncate_undoes_indexed_and_unindexed_entries():
+    chronicle = _chronicle()
+    list(chronicle.search("弟子"))  # 前 4 条已建索引
+    chronicle.append(5, "raw", "弟子下山历练")
+    chronicle.truncate(4)  # 只删未建索引的部分
+    assert list(chronicle.search("弟子")) == [1, 2]
+    chronicle.truncate(2)
+    assert len(chronicle) == 2
+    assert list(chronicle.search("弟子")) == [1]
+    assert chronicle.first_entry_of_year(3) is None
+    chronicle.append(3, "raw", "弟子归来")
+    assert list(chronicle.search("弟子")) == [1, 2]
+
+
+def test_unknown_template_is_kept_as_raw_text():
+    chronicle = Chronicle.from_data([[2, "removed_template", ["灵石", 5]]])
+    assert list(chronicle.records()) == [(2, "raw", ("灵石 5",))]
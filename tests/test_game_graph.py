@@ -0,0 +1,149 @@
+"""游戏状态图的管理器
+
+修仙版的玩家、时间系统、NPC 与修炼模块不在本仓库中，缺少时注册最小的替身模块
+"""
+import asyncio
+import importlib
+import sys
+import types
+
+import pytest
+
+
+class Player:
+    def get_display_info(self):
+        return {"name": "测试"}
+
+
+class TimeSystem:
+    def to_dict(self):
+        return {"year": 1}
+
+
+class NPCManager:
+    def get_npc(self, npc_id):
+        return None
+
+
+class CultivationSystem:
+    @staticmethod
+    def perform_cultivation(player, time_system):
+        return {"success": True, "message": "修炼片刻"}
+
+    meditate = perform_cultivation
+
+
+_STAND_INS = {
+    "core.player": {"Player": Player},
+    "core.time_system": {"TimeSystem": TimeSystem},
+    "npc": {},
+    "npc.npcs": {"NPCManager": NPCManager},
+    "core.cultivation": {"CultivationSystem": CultivationSystem},
+}
+for _name, _attrs in _STAND_INS.items():
+    try:
+        importlib.import_module(_name)
+    except ImportError:
+        sys.modules[_name] = types.ModuleType(_name)
+        sys.modules[_name].__dict__.update(_attrs)
+
+from core import npc_dialogue  # noqa: E402
+from core.npc_dialogue import DialogueHistory  # noqa: E402
+from events.special_events import EventManager  # noqa: E402
+from graph.game_graph import GameGraphManager  # noqa: E402
+
+
+@pytest.fixture
+def manager():
+    return GameGraphManager(Player(), TimeSystem(), EventManager(), NPCManager())
+
+
+def test_gather_dialogue_keeps_histories_apart(manager, monkeypatch):
+    sent = {}
+
+    def invoke(messages):
+        sent[messages[0]["content"]] = [m["content"] for m in messages[1:]]
+        return {"content": "嗯。", "usage": {}, "elapsed": 0.0}
+
+    monkeypatch.setattr(npc_dialogue, "LLM_invoke_detail", invoke)
+    manager.current_state["current_npc"] = "master"
+    manager.current_state["dialogue_history"] = DialogueHistory([{"role": "npc", "content": "师父的话"}])
+    manager.gather_dialogue(["master", "friend"], "诸位好")
+    assert sent[npc_dialogue.build_persona("master")] == ["师父的话", "诸位好"]
+    assert sent[npc_dialogue.build_persona("friend")] == ["诸位好"]
+
+
+def test_direct_routes_are_single_graph_nodes():
+    from graph.game_graph import DIRECT_ROUTES, NODE_NAMES, get_compiled_graph
+    graph_nodes = set(get_compiled_graph().get_graph().nodes)
+    assert set(DIRECT_ROUTES) == {"resolve_event", "continue_dialogue"}
+    for route in DIRECT_ROUTES.values():
+        assert len(route) == 1 and NODE_NAMES[route[0]] in graph_nodes
+
+
+def test_continue_dialogue_dispatches_directly(manager, monkeypatch):
+    monkeypatch.setattr(npc_dialogue, "LLM_invoke_detail",
+                        lambda messages: {"content": "去吧。", "usage": {}, "elapsed": 0.0})
+    manager.current_state.update(phase="dialogue", current_npc="master")
+    state = manager.continue_dialogue("告辞")
+    assert state["npc_response"] == "去吧。" and state["dialogue_ended"]
+    assert [entry["content"] for entry in state["dialogue_history"]] == ["告辞", "去吧。"]
+
+
+# ---- 运行状态图：没有检查点存储 / 逐步写入检查点 ----
+
+def test_graph_paths_without_checkpointer(manager):
+    assert manager.checkpointer is None
+    assert manager.process_action("talk_to_npc")["phase"] == "dialogue"
+    assert asyncio.run(manager.aprocess_action("idle"))["phase"] == "idle"
+
+    async def stream():
+        return [name async for name, _ in manager.astream("talk_to_npc")]
+
+    assert asyncio.run(stream()) == ["idle", "dialogue_init"]
+    assert manager.current_state["phase"] == "dialogue"
+
+
+def test_checkpointed_manager_resumes_after_restart(tmp_path, monkeypatch):
+    from graph.checkpoint import IncrementalSaver
+    from graph.game_graph import GAME_GRAPH_CODECS
+    monkeypatch.setattr(npc_dialogue, "LLM_invoke_detail",
+                        lambda messages: {"content": "善。", "usage": {}, "elapsed": 0.0})
+    path = str(tmp_path / "checkpoints.db")
+    saver = IncrementalSaver(path, GAME_GRAPH_CODECS)
+    manager = GameGraphManager(Player(), TimeSystem(), EventManager(), NPCManager(), saver, "slot1")
+    manager.start_dialogue("master")
+    manager.current_state["event_manager"].pending_event = {"title": "异闻"}
+    manager.continue_dialogue("询问修炼心得")
+    history = manager.current_state["dialogue_history"]
+    saver.close()
+
+    # 新的进程：同一个库文件，玩家等对象由调用方重建
+    saver = IncrementalSaver(path, GAME_GRAPH_CODECS)
+    resumed = GameGraphManager.resume(saver, "slot1", Player(), TimeSystem(), NPCManager())
+    state = resumed.current_state
+    assert state["phase"] == "dialogue" and state["current_npc"] == "master"
+    assert state["dialogue_history"] == history and state["npc_response"] == "善。"
+    assert state["event_manager"].pending_event == {"title": "异闻"}
+    assert state["player_info"] == {"name": "测试"}
+
+    resumed.end_dialogue()
+    assert resumed.process_action("idle")["phase"] == "idle"
+    saver.close()
+
+
+def test_compiled_graph_is_released_with_its_saver(tmp_path):
+    import gc
+    import weakref
+    from graph.checkpoint import IncrementalSaver
+    from graph.game_graph import GAME_GRAPH_CODECS, get_compiled_graph
+
+    assert get_compiled_graph() is get_compiled_graph()
+    saver = IncrementalSaver(str(tmp_path / "graph.db"), GAME_GRAPH_CODECS)
+    assert get_compiled_graph(checkpointer=saver) is get_compiled_graph(checkpointer=saver)
+    assert get_compiled_graph(checkpointer=saver) is not get_compiled_graph()
+    released = weakref.ref(saver)
+    saver.close()
+    del saver
+    gc.collect()
+    assert released() is None
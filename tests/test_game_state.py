@@ -0,0 +1,48 @@
+"""GameState 的序列化、存档往返与版本迁移"""
+import io
+
+import pytest
+
+from bench.micro import aged_state
+from core.binary_save import read_save
+from core.game_state import GameState, SAVE_VERSION, SaveVersionError
+from core.save_db import encode_state
+
+
+@pytest.fixture(scope="module")
+def state():
+    return aged_state(30)
+
+
+def test_dict_round_trip(state):
+    data = state.to_dict()
+    assert data["version"] == SAVE_VERSION
+    assert GameState.from_dict(data).to_dict() == data
+
+
+def test_binary_round_trip(state):
+    loaded = read_save(io.BytesIO(encode_state(state)))
+    assert loaded.to_dict() == state.to_dict()
+    assert len(loaded.chronicle) == len(state.chronicle)
+
+
+def test_v0_save_migrates_to_current_version():
+    legacy = {
+        "game_time": 3,
+        "sect_data": {"disciples_mining": 1, "disciples_recruiting": 0, "vault_level": 2,
+                      "cave_level": 1, "wealth": 50, "disciples_total": 4},
+        "message_log": ["第2年 招收了一名弟子", "无年份的消息"],
+        "event_log": [], "buffs": {}, "inventory": {"灵草": 2},
+        "max_wealth": 200, "max_disciples": 100, "idle_disciples": 3,
+    }
+    state = GameState.from_dict(legacy)
+    assert state.game_time == 3 and state.max_wealth == 200 and state.inventory == {"灵草": 2}
+    assert list(state.message_log.records()) == [(2, "raw", ("招收了一名弟子",)), (0, "raw", ("无年份的消息",))]
+    # v2 迁移用消息日志作为编年史的开端，v3 换成空的指标表
+    assert len(state.chronicle) == 2 and len(state.data_log) == 0
+    assert state.to_dict()["version"] == SAVE_VERSION
+
+
+def test_newer_version_is_rejected(state):
+    with pytest.raises(SaveVersionError):
+        GameState.from_dict({**state.to_dict(), "version": SAVE_VERSION + 1})
@@ -0,0 +1,64 @@
+"""本局操作历史：回退还原状态、待处理事件与随机数流"""
+import copy
+
+from bench.micro import stub_invoke
+from core import actions
+from core.game_state import GameState
+from core.history import StateHistory
+from core.rng import RandomStreams
+from events.llm_turn import plan_turn
+from events.special_events import EventManager
+
+
+def _end_turn(state: GameState, event_manager: EventManager, streams: RandomStreams):
+    actions.settle_turn(state, streams["recruit"])
+    event_manager.pending_event = actions.apply_plan(state, plan_turn(state, stub_invoke))
+    state.game_time += 1
+
+
+def test_rewind_within_turn_restores_state():
+    state = GameState()
+    history = StateHistory()
+    history.record(state, "开始")
+    before = copy.deepcopy(state.to_dict())
+    actions.dispatch(state, "mining", 1)
+    history.record(state)
+    actions.upgrade(state, "vault")
+    history.record(state)
+    history.rewind(state, 0)
+    assert state.to_dict() == before and history.labels() == ["开始"]
+
+
+def test_rewind_across_turns_restores_events_and_random_streams():
+    state = GameState()
+    streams = RandomStreams(seed=3)
+    event_manager = EventManager(streams["events"])
+    history = StateHistory(event_manager=event_manager, streams=streams)
+    actions.dispatch(state, "recruiting", state.idle_disciples)
+    history.record(state, "第0年")
+    expected_events = event_manager.to_data()
+    expected_streams = streams.getstate()
+
+    _end_turn(state, event_manager, streams)
+    first = copy.deepcopy((state.sect_data, event_manager.to_data()))
+    assert event_manager.pending_event is not None
+    # 下一年开始时取走预先生成的事件
+    assert event_manager.check_events(state) is not None
+    history.record(state, "第1年")
+
+    history.rewind(state, 0)
+    assert event_manager.to_data() == expected_events and streams.getstate() == expected_streams
+    assert event_manager.rng is streams["events"]
+    # 重玩这一回合得到同样的结算结果与事件
+    _end_turn(state, event_manager, streams)
+    assert (state.sect_data, event_manager.to_data()) == first
+
+
+def test_marks_share_unchanged_streams():
+    state = GameState()
+    streams = RandomStreams(seed=1)
+    history = StateHistory(event_manager=EventManager(streams["events"]), streams=streams)
+    history.record(state, "a")
+    history.record(state, "b")
+    first, second = history._marks
+    assert second.streams is first.streams and second.events is first.events
@@ -0,0 +1,100 @@
+"""自动存档日志：增量追加、快照换代与崩溃后恢复"""
+import os
+import random
+
+import pytest
+
+from bench.micro import _ACTIONS, stub_invoke
+from core import actions, journal
+from core.game_state import GameState
+from core.journal import SaveJournal, load_journal, open_journal
+from events.llm_turn import plan_turn
+
+
+def _play(state: GameState, saver: SaveJournal, years: int, rng: random.Random):
+    """用脚本玩家玩 years 年，每回合结束追加一次自动存档"""
+    for _ in range(years):
+        state.game_time += 1
+        for _ in range(rng.randint(0, 3)):
+            actions.perform(state, rng.choice(_ACTIONS))
+        actions.settle_turn(state, rng)
+        actions.apply_plan(state, plan_turn(state, stub_invoke))
+        saver.append(state)
+
+
+@pytest.fixture
+def played(tmp_path):
+    state = GameState()
+    saver = SaveJournal(str(tmp_path))
+    _play(state, saver, 8, random.Random(1))
+    saver.close()
+    return state, saver
+
+
+def test_snapshot_plus_journal_restores_state(tmp_path, played):
+    state, saver = played
+    result = load_journal(str(tmp_path))
+    assert result["success"] and result["generation"] == saver.generation == 1
+    assert result["state"].to_dict() == state.to_dict()
+
+
+def test_half_written_last_line_is_ignored(tmp_path, played):
+    state, saver = played
+    path = os.path.join(str(tmp_path), "journal_1.log")
+    with open(path, "r", encoding="utf-8") as f:
+        lines = f.readlines()
+    with open(path, "w", encoding="utf-8") as f:
+        f.writelines(lines[:-1])
+        f.write(lines[-1][:len(lines[-1]) // 2])
+    restored = load_journal(str(tmp_path))["state"]
+    assert restored.game_time == state.game_time - 1
+    assert len(restored.chronicle) < len(state.chronicle)
+
+
+def test_new_generation_every_snapshot_interval(tmp_path, monkeypatch):
+    monkeypatch.setattr(journal, "JOURNAL_SNAPSHOT_EVERY", 3)
+    state = GameState()
+    saver = SaveJournal(str(tmp_path))
+    _play(state, saver, 10, random.Random(2))
+    saver.close()
+    saver._compactor.join()
+    # 第 1 回合写第一代快照，之后每 3 回合增量换一代
+    assert saver.generation == 3
+    assert sorted(os.listdir(str(tmp_path))) == ["journal_2.log", "journal_3.log",
+                                                 "snapshot_2.json", "snapshot_3.json"]
+    assert load_journal(str(tmp_path))["state"].to_dict() == state.to_dict()
+
+
+def test_open_journal_continues_after_restart(tmp_path, played):
+    state, _ = played
+    saver, result = open_journal(str(tmp_path))
+    assert result["success"] and saver.generation == 2
+    _play(result["state"], saver, 3, random.Random(3))
+    scratch = SaveJournal(str(tmp_path / "scratch"))
+    _play(state, scratch, 3, random.Random(3))
+    saver.close()
+    scratch.close()
+    assert load_journal(str(tmp_path))["state"].to_dict() == state.to_dict()
+
+
+def test_missing_journal(tmp_path):
+    saver, result = open_journal(str(tmp_path / "none"))
+    assert not result["success"] and result["state"] is None
+    assert saver.generation == 0
+
+
+@pytest.mark.parametrize("snapshot", ['{"game_time": 3', '[1, 2]', '{"version": "x"}', '{"message_log": 7}'])
+def test_broken_snapshot_falls_back_to_previous_generation(tmp_path, played, snapshot):
+    state, saver = played
+    saver.reset(state)
+    saver.close()
+    (tmp_path / "snapshot_2.json").write_text(snapshot, encoding="utf-8")
+    result = load_journal(str(tmp_path))
+    assert result["success"] and result["generation"] == 1
+    assert result["state"].to_dict() == state.to_dict()
+
+
+def test_no_readable_snapshot(tmp_path):
+    (tmp_path / "snapshot_1.json").write_text("[1, 2]", encoding="utf-8")
+    result = load_journal(str(tmp_path))
+    assert not result["success"] and result["state"] is None
@@ -0,0 +1,39 @@
+"""批量回合协议的解析"""
+import json
+
+from core.llm import _tool_calls
+from events.llm_turn import parse_turn, validate_deltas, DELTA_LIMITS
+
+
+def _reply(*calls, content=""):
+    return {"choices": [{"message": {"content": content, "tool_calls": [
+        {"function": {"name": name, "arguments": arguments}} for name, arguments in calls]}}]}
+
+
+def test_tool_calls_drop_non_object_arguments():
+    reply = _tool_calls([], _reply(("write_chronicle", "[1, 2]"), ("write_chronicle", '"文本"'),
+                                   ("define_event", "3"), ("write_chronicle", "{not json"),
+                                   ("write_chronicle", json.dumps({"narrative": "丰年"}))))
+    assert reply["tool_calls"] == [("write_chronicle", {"narrative": "丰年"})]
+
+
+def test_parse_turn_treats_non_object_arguments_as_missing():
+    plan = parse_turn({"content": "正文", "tool_calls": [("write_chronicle", ["丰年"]),
+                                                        ("define_event", "事件")]})
+    assert plan == {"chronicle": "正文", "event": None}
+
+
+def test_parse_turn_reads_chronicle_and_event():
+    event = {"title": "散修来访", "description": "一名散修叩门",
+             "options": [{"text": "收留", "outcome": "散修拜入山门", "deltas": {"disciples_total": 9}}]}
+    plan = parse_turn({"content": "", "tool_calls": [("write_chronicle", {"narrative": " 丰年 "}),
+                                                    ("define_event", event)]})
+    assert plan["chronicle"] == "丰年"
+    assert plan["event"]["options"][0]["deltas"] == {"disciples_total": 5}
+
+
+def test_validate_deltas_skips_non_finite_values():
+    deltas = json.loads('{"wealth": 1e999, "disciples_total": NaN}')
+    assert validate_deltas(deltas) == {}
+    assert validate_deltas(json.loads('{"wealth": -Infinity, "disciples_total": 2.7}')) == {"disciples_total": 2}
+    assert validate_deltas({"wealth": 10 ** 9}) == {"wealth": DELTA_LIMITS["wealth"]}
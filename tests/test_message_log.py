@@ -0,0 +1,43 @@
+"""消息日志：定长环形缓冲区"""
+from core.message_log import MessageLog
+
+
+def _log(capacity: int = 3) -> MessageLog:
+    log = MessageLog(capacity)
+    log.append(1, "dispatch", 2, "挖矿")
+    log.append(1, "mining_gain", 4)
+    log.append(2, "recruit_none")
+    log.append(2, "raw", "山门有客来访")
+    log.append(3, "vault_upgrade", 100, 200)
+    return log
+
+
+def test_ring_keeps_the_newest_entries():
+    log = _log()
+    assert len(log) == 3
+    assert list(log) == ["第2年 本轮未招募到新弟子。", "第2年 山门有客来访", "第3年 灵库扩建成功！上限 100 → 200"]
+    assert log.recent(2) == list(log)[1:]
+    assert log.recent(10) == list(log)
+    assert list(log.records())[0] == (2, "recruit_none", ())
+
+
+def test_filter_by_category_and_year():
+    log = _log(capacity=10)
+    assert log.filter("settlement") == ["第1年 弟子挖矿产出: 4 灵石", "第2年 本轮未招募到新弟子。"]
+    assert log.filter("settlement", year=2) == ["第2年 本轮未招募到新弟子。"]
+    assert log.filter("save") == []
+
+
+def test_round_trip_and_snapshot_are_independent():
+    log = _log()
+    loaded = MessageLog.from_data(log.to_data())
+    assert list(loaded) == list(log) and loaded.capacity == 3
+    snapshot = log.snapshot()
+    log.append(4, "raw", "新的一年")
+    assert list(snapshot) == list(loaded)
+    assert log.recent(1) == ["第4年 新的一年"]
+
+
+def test_unknown_template_is_kept_as_raw_text():
+    log = MessageLog.from_data({"capacity": 2, "records": [[5, "removed_template", ["灵石", 3]]]})
+    assert list(log) == ["第5年 灵石 3"]
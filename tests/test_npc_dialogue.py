@@ -0,0 +1,65 @@
+"""NPC对话：提示词组装、有界历史与统计"""
+import threading
+
+import pytest
+
+from core import npc_dialogue
+from core.npc_dialogue import DialogueHistory, DialogueStats, generate_replies
+
+
+@pytest.fixture
+def sent(monkeypatch):
+    """替换LLM请求，记录每个NPC收到的消息"""
+    sent, lock = {}, threading.Lock()
+
+    def invoke(messages):
+        with lock:
+            sent[messages[0]["content"]] = messages
+        return {"content": "嗯。", "usage": {"prompt_tokens": 10}, "elapsed": 0.01}
+
+    monkeypatch.setattr(npc_dialogue, "LLM_invoke_detail", invoke)
+    return sent
+
+
+def test_history_is_bounded_and_folds_into_summary():
+    history = DialogueHistory()
+    for i in range(30):
+        history = history.extend([{"role": "player", "content": f"第{i}句"}], window=10)
+    assert len(history) == 10 and history.dropped == 20
+    assert history[0]["content"] == "第20句" and "第19句" in history.summary
+    assert DialogueHistory.from_data(history.to_data()) == history
+
+
+def test_stats_keep_aggregates_only():
+    stats = DialogueStats()
+    for _ in range(1000):
+        stats.record("master", [{"content": "12345"}], 20, {"elapsed": 0.5, "usage": {"prompt_tokens": 8}})
+    assert not hasattr(stats, "records")
+    summary = stats.summary()
+    assert summary["count"] == 1000
+    assert summary["avg_elapsed"] == pytest.approx(0.5)
+    assert summary["sent_ratio"] == pytest.approx(0.25)
+
+
+def test_replies_use_each_npcs_own_history(sent):
+    history = DialogueHistory([{"role": "npc", "content": "师父的话"}])
+    replies = generate_replies(["master", "friend"], "诸位好", {"master": history},
+                               stats=None)
+    assert replies == {"master": "嗯。", "friend": "嗯。"}
+    by_npc = {npc_id: sent[npc_dialogue.build_persona(npc_id)] for npc_id in ("master", "friend")}
+    assert [m["content"] for m in by_npc["master"][1:]] == ["师父的话", "诸位好"]
+    assert [m["content"] for m in by_npc["friend"][1:]] == ["诸位好"]
+
+
+def test_full_history_counts_folded_entries(sent):
+    history = DialogueHistory()
+    for i in range(40):
+        history = history.extend([{"role": "player", "content": "道友" * 10}], window=10)
+    assert history.chars == 40 * 20
+    assert DialogueHistory.from_data(history.to_data()).chars == history.chars
+
+    stats = DialogueStats()
+    npc_dialogue.generate_reply("master", "请赐教", history, stats=stats)
+    full = len(npc_dialogue.build_persona("master")) + 40 * 20 + len("请赐教")
+    assert stats.full_history_chars == full
+    assert stats.summary()["sent_ratio"] < 1
@@ -0,0 +1,61 @@
+"""录像回放：相同的种子与输入得到相同的结果"""
+import json
+
+import pytest
+
+from core.recording import Recording
+from server.replay import record_scripted, replay, replay_files
+
+
+@pytest.fixture
+def recorded(tmp_path):
+    path = str(tmp_path / "game.jsonl")
+    record_scripted(path, seed=7, turns=12)
+    return path
+
+
+def _rewrite(path: str, edit):
+    """逐行改写录像，edit(记录) 返回 None 表示删除该行"""
+    with open(path, encoding="utf-8") as f:
+        records = [json.loads(line) for line in f]
+    with open(path, "w", encoding="utf-8") as f:
+        for record in records:
+            record = edit(record)
+            if record is not None:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def test_replay_matches_recording(recorded):
+    recording = Recording(recorded)
+    result = replay(recording)
+    assert result["success"], result["message"]
+    assert result["turns"] == len(recording.turns) == recording.end["turns"] == 12
+    assert result["commands"] == recording.end["commands"]
+
+
+def test_same_seed_records_identical_games(tmp_path, recorded):
+    again = str(tmp_path / "again.jsonl")
+    record_scripted(again, seed=7, turns=12)
+    with open(recorded, encoding="utf-8") as a, open(again, encoding="utf-8") as b:
+        assert a.read() == b.read()
+
+
+def test_changed_digest_reports_divergent_year(recorded):
+    turns = iter(range(100))
+    _rewrite(recorded, lambda record: {"t": "0" * 16} if "t" in record and next(turns) == 4 else record)
+    result = replay(Recording(recorded))
+    assert not result["success"] and result["diverged"] == 5
+
+
+def test_missing_plans_are_reported(recorded):
+    _rewrite(recorded, lambda record: None if "p" in record else record)
+    result = replay(Recording(recorded))
+    assert not result["success"] and "不足" in result["message"]
+
+
+def test_unreadable_recording(tmp_path, recorded):
+    broken = tmp_path / "broken.jsonl"
+    broken.write_text('{"version": 99}\n', encoding="utf-8")
+    results = replay_files([recorded, str(broken)], workers=1)
+    assert [result["success"] for result in results] == [True, False]
+    assert "无法读取录像" in results[1]["message"]
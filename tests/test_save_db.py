@@ -0,0 +1,67 @@
+"""SQLite 存档库与存档系统接口"""
+import json
+
+import pytest
+
+from bench.micro import aged_state
+from core import save_system
+from core.game_state import GameState
+from core.save_db import SaveDatabase
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    database = SaveDatabase(str(tmp_path / "saves.db"))
+    monkeypatch.setattr(save_system, "_database", database)
+    yield database
+    database.close()
+
+
+def test_save_load_and_sections(database):
+    state = aged_state(20)
+    database.save(1, state, save_time="2026-01-01 00:00:00")
+    assert database.load(1).to_dict() == state.to_dict()
+    assert database.read_section(1, "core")["game_time"] == 20
+    assert len(database.read_section(1, "data_log")) == len(state.data_log)
+    assert len(database.read_section(1, "chronicle")) == len(state.chronicle)
+    assert database.load(2) is None
+
+
+def test_list_filters_and_orders_by_metadata(database):
+    for slot, year in ((1, 30), (2, 10), (3, 20)):
+        state = GameState()
+        state.game_time = year
+        database.save(slot, state)
+    assert [row["slot"] for row in database.list(order_by="game_time")] == [2, 3, 1]
+    assert [row["slot"] for row in database.list(min_game_time=15, max_game_time=25)] == [3]
+    with pytest.raises(ValueError):
+        database.list(order_by="state; DROP TABLE saves")
+
+
+def test_import_json_saves_once(database, tmp_path):
+    state = GameState()
+    state.game_time = 7
+    (tmp_path / "save_4.json").write_text(json.dumps({"save_time": "旧", "state": state.to_dict()}),
+                                          encoding="utf-8")
+    (tmp_path / "save_5.json").write_text("{broken", encoding="utf-8")
+    assert database.import_json_saves(str(tmp_path)) == 1
+    assert database.import_json_saves(str(tmp_path)) == 0
+    assert database.load(4).game_time == 7
+
+
+def test_import_skips_files_that_are_not_objects(database, tmp_path):
+    (tmp_path / "save_5.json").write_text("[1, 2]", encoding="utf-8")
+    (tmp_path / "save_6.json").write_text('{"state": 3}', encoding="utf-8")
+    assert database.import_json_saves(str(tmp_path)) == 0
+    assert database.load(5) is None
+    with database._lock:
+        imported = {row[0] for row in database._conn.execute("SELECT filename FROM imported_files")}
+    assert imported == {"save_5.json", "save_6.json"}
+
+
+def test_save_system_goes_through_the_database(database):
+    assert save_system.save_game(GameState(), 3)["success"]
+    assert save_system.load_save_state(3)["state"].game_time == 0
+    assert save_system.delete_save(3)["success"]
+    assert not save_system.delete_save(3)["success"]
+    assert save_system.load_save_state(3) == {"success": False, "message": "存档不存在！", "state": None}
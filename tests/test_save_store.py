@@ -0,0 +1,113 @@
+"""分支存档：按内容寻址的块去重与引用计数"""
+import os
+
+import pytest
+
+from bench.micro import aged_state
+from core import save_store
+from core.save_store import SaveStore
+
+
+def _objects(store: SaveStore) -> set:
+    return {prefix + rest for prefix in os.listdir(store.objects_dir)
+            for rest in os.listdir(os.path.join(store.objects_dir, prefix))}
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(save_store, "STORE_CHRONICLE_CHUNK", 4)
+    return SaveStore(str(tmp_path))
+
+
+@pytest.fixture(scope="module")
+def early():
+    return aged_state(10).to_dict()
+
+
+@pytest.fixture(scope="module")
+def late():
+    # 同一种子多玩几年，编年史以 early 的编年史为前缀
+    return aged_state(14).to_dict()
+
+
+def test_branch_round_trip(store, early):
+    assert store.save_branch(early, "main")["success"]
+    result = store.load_branch("main")
+    assert result["success"] and result["data"] == early
+    assert [branch["name"] for branch in store.list_branches()] == ["main"]
+
+
+def test_branches_share_history_prefix(store, early, late):
+    assert late["chronicle"][:len(early["chronicle"])] == early["chronicle"]
+    store.save_branch(early, "early")
+    before = _objects(store)
+    store.save_branch(late, "late")
+    shared = before & _objects(store)
+    # 编年史前缀中完整的块只存一份
+    assert len(shared) >= len(early["chronicle"]) // 4
+    assert store.load_branch("late")["data"] == late
+
+
+def test_fork_copies_manifest_only(store, early):
+    store.save_branch(early, "main")
+    objects = _objects(store)
+    assert store.fork_branch("main", "copy")["success"]
+    assert _objects(store) == objects
+    assert set(store.refs.values()) == {2}
+    assert store.load_branch("copy")["data"] == early
+
+
+def test_delete_frees_only_unreferenced_chunks(store, early, late):
+    store.save_branch(early, "early")
+    only_early = _objects(store)
+    store.save_branch(late, "late")
+    store.delete_branch("late")
+    assert _objects(store) == only_early
+    store.delete_branch("early")
+    assert _objects(store) == set() and store.refs == {}
+
+
+def test_overwrite_releases_old_chunks(store, early, late):
+    store.save_branch(early, "main")
+    store.save_branch(late, "main")
+    fresh = SaveStore(os.path.join(store.root, "fresh"))
+    fresh.save_branch(late, "main")
+    assert _objects(store) == _objects(fresh)
+
+
+def test_rebuild_refs_removes_orphans(store, early, late):
+    store.save_branch(early, "early")
+    store.save_branch(late, "late")
+    os.remove(store._manifest_path("late"))
+    os.remove(store.refs_path)
+    result = SaveStore(store.root).rebuild_refs()
+    assert result["success"]
+    assert SaveStore(store.root).load_branch("early")["data"] == early
+    assert _objects(store) == set(store._manifest_chunks(store._read_manifest("early")))
+
+
+def test_invalid_and_missing_branches(store, early):
+    assert not store.save_branch(early, "../escape")["success"]
+    assert not store.save_branch(early, "")["success"]
+    assert store.load_branch("nope") == {"success": False, "message": "分支不存在", "data": None}
+    assert not store.fork_branch("nope", "copy")["success"]
+    assert not store.delete_branch("nope")["success"]
+
+
+def test_missing_refs_are_rebuilt_before_deleting(store, early, late):
+    store.save_branch(early, "early")
+    store.save_branch(late, "late")
+    os.remove(store.refs_path)
+    reopened = SaveStore(store.root)
+    assert reopened.refs == store.refs
+    reopened.delete_branch("late")
+    assert reopened.load_branch("early")["data"] == early
+
+
+def test_stale_refs_never_delete_shared_chunks(store, early):
+    store.save_branch(early, "main")
+    store.fork_branch("main", "copy")
+    # refs.json 过期(例如从旧备份恢复)，不记录任何块
+    store.refs = {}
+    store.delete_branch("copy")
+    assert store.load_branch("main")["data"] == early
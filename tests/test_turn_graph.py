@@ -0,0 +1,105 @@
+"""宗门回合状态图：检查点换出与读回、逐步写入与崩溃后恢复"""
+import gc
+import weakref
+
+import pytest
+
+from bench.micro import aged_state, stub_invoke
+from core.recording import state_digest
+from events.llm_turn import plan_turn
+from graph.checkpoint import IncrementalSaver, ParkingSaver
+from graph.turn_graph import TurnSession, TURN_CODECS, get_turn_graph
+
+
+def _planner(state):
+    return plan_turn(state, stub_invoke)
+
+
+def _values(saver, thread_id: str) -> dict:
+    return saver.get_tuple({"configurable": {"thread_id": thread_id}}).checkpoint["channel_values"]
+
+
+def _play(session: TurnSession, commands) -> list:
+    return [session.handle(command) for command in commands]
+
+
+@pytest.fixture
+def checkpoint_db(tmp_path):
+    return str(tmp_path / "checkpoints.db")
+
+
+def test_incremental_saver_resumes_after_restart(checkpoint_db):
+    saver = IncrementalSaver(checkpoint_db, TURN_CODECS)
+    session = TurnSession(saver, "t1", _planner, durability="sync")
+    session.start(aged_state(10))
+    # 结束回合后 LLM 预先生成的事件在下一年开始时等待玩家选择
+    replies = _play(session, ["dispatch mining 1", "end"])
+    assert replies[-1]["success"] and _values(saver, "t1")["event"] is not None
+    before = _values(saver, "t1")
+    expected = (state_digest(before["sect"]), before["sect"].to_dict(), before["event"],
+                before["rng"].to_data(), before["event_manager"].to_data())
+    # 模拟崩溃：不关闭也不换出，直接用新的存储对象打开同一个库文件
+    resumed = IncrementalSaver(checkpoint_db, TURN_CODECS)
+    after = _values(resumed, "t1")
+    assert resumed.resumes == 1
+    assert (state_digest(after["sect"]), after["sect"].to_dict(), after["event"],
+            after["rng"].to_data(), after["event_manager"].to_data()) == expected
+    assert after["event_manager"].rng is after["rng"]["events"]
+
+    session = TurnSession(resumed, "t1", _planner, durability="sync")
+    replies = _play(session, ["choose 0", "status", "end"])
+    assert all(reply["success"] for reply in replies)
+    assert _values(resumed, "t1")["sect"].game_time == before["sect"].game_time + 1
+    saver.close()
+    resumed.close()
+
+
+def test_incremental_saver_delete_and_park(checkpoint_db):
+    saver = IncrementalSaver(checkpoint_db, TURN_CODECS)
+    session = TurnSession(saver, "t1", _planner, durability="sync")
+    session.start()
+    assert session.park() == 0 and ("t1", "") not in saver._threads
+    assert session.handle("status")["success"]
+    session.close()
+    assert IncrementalSaver(checkpoint_db, TURN_CODECS).get_tuple(session.config) is None
+    saver.close()
+
+
+def test_parking_saver_park_and_resume(checkpoint_db):
+    saver = ParkingSaver(checkpoint_db)
+    session = TurnSession(saver, "t1", _planner)
+    other = TurnSession(saver, "t2", _planner)
+    session.start(aged_state(5))
+    other.start()
+    _play(session, ["dispatch mining 1", "end"])
+    before = _values(saver, "t1")
+    expected = (state_digest(before["sect"]), before["event"], before["rng"].to_data())
+
+    assert session.park() > 0 and saver.resident == 1 and saver.parks == 1
+    assert session.park() == 0
+    # 换出后由另一个存储对象(如重启后的进程)读回
+    restarted = ParkingSaver(checkpoint_db)
+    after = _values(restarted, "t1")
+    assert restarted.unparks == 1
+    assert (state_digest(after["sect"]), after["event"], after["rng"].to_data()) == expected
+
+    # 原存储对象再次处理命令时从 SQLite 取回会话
+    assert session.handle("choose 0")["success"]
+    assert saver.unparks == 1 and saver.resident == 2
+    assert _values(saver, "t1")["sect"].game_time == before["sect"].game_time
+
+    session.close()
+    assert ParkingSaver(checkpoint_db).get_tuple(session.config) is None
+    saver.close()
+    restarted.close()
+
+
+def test_compiled_graph_is_released_with_its_saver(checkpoint_db):
+    saver = ParkingSaver(checkpoint_db)
+    assert get_turn_graph(saver) is get_turn_graph(saver)
+    assert get_turn_graph(saver, True) is not get_turn_graph(saver)
+    released = weakref.ref(saver)
+    saver.close()
+    del saver
+    gc.collect()
+    assert released() is None
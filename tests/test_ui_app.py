@@ -0,0 +1,55 @@
+"""图形界面：后台推演的结果处理(SDL dummy 驱动，无窗口)"""
+import pytest
+
+pygame = pytest.importorskip("pygame")
+
+from config.settings import FPS  # noqa: E402
+from ui.app import GameApp  # noqa: E402
+
+
+@pytest.fixture
+def make_app(monkeypatch):
+    monkeypatch.setenv("SDL_VIDEODRIVER", "dummy")
+    apps = []
+
+    def make(planner, **kwargs):
+        apps.append(GameApp(planner=planner, autosave=False, **kwargs))
+        return apps[-1]
+
+    yield make
+    for app in apps:
+        app.close()
+
+
+def _finish_turn(app: GameApp):
+    app.end_turn()
+    app._planning.exception(timeout=10)
+    app.step(0.0)
+
+
+def test_planner_error_is_logged_and_game_continues(make_app):
+    def offline(state):
+        raise OSError("网络不可用")
+
+    app = make_app(offline)
+    year = app.state.game_time
+    _finish_turn(app)
+    assert app._planning is None
+    assert app.state.game_time == year + 1
+    assert any("天机推演失败" in line and "网络不可用" in line for line in app.state.message_log.recent(5))
+
+
+def test_plan_is_applied(make_app):
+    app = make_app(lambda state: {"chronicle": "风调雨顺", "event": None})
+    _finish_turn(app)
+    assert any("风调雨顺" in line for line in app.state.message_log.recent(5))
+
+
+def test_frame_times_keep_only_the_last_second(make_app):
+    app = make_app(None)
+    recording = make_app(None, record_frames=True)
+    for _ in range(FPS * 3):
+        app.step(0.0)
+        recording.step(0.0)
+    assert len(app.frame_times) == FPS and app.all_frame_times is None
+    assert len(recording.frame_times) == FPS and len(recording.all_frame_times) == FPS * 3
@@ -0,0 +1,313 @@
+"""仙宗 - 修仙模拟器 图形界面版本
+
+每帧只重绘内容有变化的控件，并只把这些矩形更新到屏幕(pygame.display.update(rects))，
+没有变化的帧不做任何绘制；时钟限制在 FPS 帧/秒，空闲时几乎不占 CPU。
+LLM 回合推演在后台线程进行，推演期间界面照常刷新。
+
+    python -m ui.app                               # 打开窗口
+    python -m ui.app --headless --frames 900       # 用 SDL dummy 驱动无窗口运行并输出帧时间统计
+    python -m ui.app --profile [--tracemalloc]     # 每回合导出各阶段耗时(core.profiler)
+
+游戏中按 F3 在故事面板显示各阶段耗时。
+"""
+import argparse
+import os
+import statistics
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Optional
+
+import pygame
+
+from config.settings import (
+    SCREEN_WIDTH, SCREEN_HEIGHT, FPS, TITLE, COLORS, HUD_RECT,
+    BUTTON_HEIGHT, BUTTON_WIDTH, BUTTON_MARGIN,
+    FONT_SIZE_MEDIUM, FONT_SIZE_SMALL, MESSAGE_LOG_DISPLAY,
+    UI_STORY_RECT, UI_LOG_RECT, UI_STATS_RECT, PROFILE_JSONL, PROFILE_PROMETHEUS,
+)
+from core import actions
+from core.autosave import AutosaveService
+from core.game_state import GameState
+from core.profiler import profiler
+from events.llm_turn import plan_turn
+from events.special_events import EventManager
+from ui.text import load_font, TextCache
+from ui.widgets import TextPanel, StoryPanel, Button
+
+
+class GameApp:
+    """图形界面"""
+
+    def __init__(self, state: Optional[GameState] = None, planner=plan_turn, autosave: bool = True,
+                 record_frames: bool = False):
+        """record_frames 为 True 时另外保留全部帧耗时(all_frame_times)，供无窗口运行结束时统计"""
+        pygame.init()
+        pygame.display.set_caption(TITLE)
+        self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+        self.clock = pygame.time.Clock()
+        self.medium = TextCache(load_font(FONT_SIZE_MEDIUM))
+        self.small = TextCache(load_font(FONT_SIZE_SMALL))
+
+        self.state = state or GameState()
+        self.event_manager = EventManager()
+        self.planner = planner
+        self.autosave = AutosaveService() if autosave else None
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._planning: Optional[Future] = None
+        self.event: Optional[dict] = None
+
+        self.hud = TextPanel(HUD_RECT, self.medium)
+        self.story = StoryPanel(UI_STORY_RECT, self.medium)
+        self.log_panel = TextPanel(UI_LOG_RECT, self.small, COLORS["light_gray"])
+        self.stats = TextPanel(UI_STATS_RECT, self.small, COLORS["gray"])
+        self.action_buttons = self._layout_buttons([
+            ("派遣挖矿", lambda: actions.dispatch(self.state, "mining", 1)),
+            ("派遣招募", lambda: actions.dispatch(self.state, "recruiting", 1)),
+            ("召回挖矿", lambda: actions.recall(self.state, "mining", 1)),
+            ("召回招募", lambda: actions.recall(self.state, "recruiting", 1)),
+            ("扩建灵库", lambda: actions.upgrade(self.state, "vault")),
+            ("扩建洞府", lambda: actions.upgrade(self.state, "cave")),
+            ("结束回合", self.end_turn),
+        ])
+        self.option_buttons = []
+        # 帧统计(不含等待下一帧的时间)：界面只显示最近一秒
+        self.frame_times = deque(maxlen=FPS)
+        self.all_frame_times: Optional[list] = [] if record_frames else None
+        self.dirty_pixels = 0
+        self._stats_at = 0.0
+
+        self.screen.fill(COLORS["black"])
+        pygame.display.flip()
+        self.start_turn()
+
+    def _layout_buttons(self, specs: list, columns: int = 2) -> list:
+        """在 HUD 下方按列排布按钮"""
+        width = BUTTON_WIDTH if columns > 1 else HUD_RECT[2]
+        buttons = []
+        for i, (label, callback) in enumerate(specs):
+            x = HUD_RECT[0] + (i % columns) * (BUTTON_WIDTH + BUTTON_MARGIN)
+            y = HUD_RECT[1] + HUD_RECT[3] + BUTTON_MARGIN + (i // columns) * (BUTTON_HEIGHT + BUTTON_MARGIN)
+            buttons.append(Button((x, y, width, BUTTON_HEIGHT), self.small, label, callback))
+        return buttons
+
+    @property
+    def buttons(self) -> list:
+        return self.option_buttons if self.event else self.action_buttons
+
+    @property
+    def widgets(self) -> list:
+        return [self.hud, self.story, self.log_panel, self.stats, *self.buttons]
+
+    # ---- 回合流程 ----
+
+    def start_turn(self):
+        """开始新回合：年份加一，有事件时显示事件与选项按钮"""
+        self.state.game_time += 1
+        with profiler.span("turn.events"):
+            event = self.event_manager.check_events(self.state, False)
+        if event:
+            self._show_event(event)
+
+    def _show_event(self, event: dict):
+        self.event = event
+        self.story.show(f"【事件：{event['title']}】\n{event['description']}")
+        self.option_buttons = self._layout_buttons(
+            [(opt["text"], lambda i=i: self._resolve_event(i)) for i, opt in enumerate(event["options"])],
+            columns=1)
+        self._clear_button_area()
+
+    def _resolve_event(self, option_id: int):
+        result = self.event_manager.resolve_event(self.event, option_id, self.state)
+        self.state.log("event_result", result["message"])
+        self.story.show(f"[结果] {result['message']}")
+        self.event = None
+        self._clear_button_area()
+
+    def _clear_button_area(self):
+        """切换按钮组时擦掉按钮区域并让新按钮重绘"""
+        top = HUD_RECT[1] + HUD_RECT[3] + BUTTON_MARGIN
+        area = pygame.Rect(HUD_RECT[0], top, HUD_RECT[2], UI_STATS_RECT[1] - top - BUTTON_MARGIN)
+        self.screen.fill(COLORS["black"], area)
+        self.dirty_pixels += area.width * area.height
+        pygame.display.update(area)
+        for button in self.buttons:
+            button.dirty = True
+
+    def end_turn(self):
+        """结算本回合，LLM 推演放到后台线程"""
+        if self._planning is not None:
+            return
+        with profiler.span("turn.settle"):
+            actions.settle_turn(self.state)
+        self.story.show("推演天机中……")
+        self._planning = self._executor.submit(self._plan)
+
+    def _plan(self) -> dict:
+        """后台线程中的 LLM 推演"""
+        with profiler.span("turn.llm"):
+            return self.planner(self.state)
+
+    def _finish_planning(self):
+        """取回推演结果；网络或LLM出错时记入日志，本回合没有总结与事件，游戏继续"""
+        try:
+            plan, error = self._planning.result(), None
+        except (OSError, EOFError, ValueError) as e:
+            plan, error = None, e
+        self._planning = None
+        self.event_manager.pending_event = actions.apply_plan(self.state, plan, error)
+        if plan is None:
+            self.story.show(f"天机推演失败：{error}")
+        elif plan["chronicle"]:
+            self.story.show(plan["chronicle"])
+        if self.autosave:
+            with profiler.span("turn.autosave"):
+                self.autosave.submit(self.state)
+            if self.autosave.last_error:
+                self.state.log("save_result", self.autosave.last_error)
+                self.autosave.last_error = None
+        profiler.end_turn(self.state.game_time)
+        self.start_turn()
+
+    # ---- 主循环 ----
+
+    def _sync_widgets(self):
+        """把游戏状态同步到控件，内容没变的控件保持干净"""
+        sect = self.state.sect_data
+        self.hud.set_lines([
+            f"第 {self.state.game_time} 年",
+            f"灵石 {sect['wealth']:.0f}/{self.state.max_wealth}",
+            f"弟子 {sect['disciples_total']}/{self.state.max_disciples}",
+            f"挖矿 {sect['disciples_mining']}  招募 {sect['disciples_recruiting']}",
+            f"空闲 {self.state.idle_disciples}",
+            f"灵库 {sect['vault_level']} 级  洞府 {sect['cave_level']} 级",
+        ])
+        self.log_panel.set_lines(self.state.message_log.recent(MESSAGE_LOG_DISPLAY))
+        busy = self._planning is not None
+        for button in self.action_buttons:
+            button.set_enabled(not busy)
+
+    def _update_stats(self):
+        """每秒刷新一次帧时间统计"""
+        now = time.perf_counter()
+        if now - self._stats_at < 1 or not self.frame_times:
+            return
+        self._stats_at = now
+        recent = sorted(self.frame_times)
+        self.stats.set_lines([f"帧耗时 p50 {recent[len(recent) // 2] * 1000:.2f}ms "
+                              f"最慢 {recent[-1] * 1000:.2f}ms"])
+
+    def step(self, dt: float, events=()) -> bool:
+        """处理输入并绘制一帧，返回是否继续运行"""
+        start = time.perf_counter()
+        for event in events:
+            if event.type == pygame.QUIT:
+                return False
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                self.story.show("【性能统计】\n" + "\n".join(profiler.summary_lines()))
+                continue
+            for widget in [self.story, *self.buttons]:
+                if widget.handle(event):
+                    break
+        if self._planning is not None and self._planning.done():
+            self._finish_planning()
+
+        self._sync_widgets()
+        self._update_stats()
+        rects = []
+        for widget in self.widgets:
+            widget.update(dt)
+            rects.extend(widget.draw(self.screen))
+        if rects:
+            pygame.display.update(rects)
+            self.dirty_pixels += sum(rect.width * rect.height for rect in rects)
+        elapsed = time.perf_counter() - start
+        self.frame_times.append(elapsed)
+        if self.all_frame_times is not None:
+            self.all_frame_times.append(elapsed)
+        profiler.add("ui.frame", elapsed)
+        return True
+
+    def run(self, max_frames: Optional[int] = None, script=None):
+        """
+        主循环，限制在 FPS 帧/秒
+        script(app, frame) 每帧调用一次，用于无窗口运行时模拟操作
+        """
+        frame = 0
+        running = True
+        while running and (max_frames is None or frame < max_frames):
+            dt = self.clock.tick(FPS) / 1000
+            if script:
+                script(self, frame)
+            running = self.step(dt, pygame.event.get())
+            frame += 1
+        self.close()
+
+    def close(self):
+        if self._planning is not None:
+            # 等待推演结束，结果(包括错误)不再处理
+            self._planning.exception()
+        self._executor.shutdown()
+        if self.autosave:
+            self.autosave.close()
+        pygame.quit()
+
+
+def _demo_script(app: GameApp, frame: int):
+    """无窗口运行时的操作脚本：每秒做一次操作，每 5 秒结束一次回合"""
+    if app.event and frame % FPS == FPS // 2:
+        app._resolve_event(0)
+    elif frame % (FPS * 5) == FPS * 5 - 1:
+        app.end_turn()
+    elif frame % FPS == 0:
+        action = (frame // FPS) % 4
+        if action == 0:
+            actions.dispatch(app.state, "mining", 1)
+        elif action == 1:
+            actions.upgrade(app.state, "vault")
+        elif action == 2:
+            actions.dispatch(app.state, "recruiting", 1)
+        else:
+            actions.recall(app.state, "recruiting", 1)
+
+
+def _offline_planner(state: GameState) -> dict:
+    """无窗口运行时不访问网络的回合推演"""
+    return {
+        "chronicle": (f"第{state.game_time}年，宗门弟子{state.sect_data['disciples_total']}人，"
+                      "山门之外风雪未歇，众弟子昼夜轮值于灵脉矿洞，掌门闭关参悟，"
+                      "偶有外门弟子下山历练，带回些许灵石与江湖传闻。") * 2,
+        "event": None,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=TITLE)
+    parser.add_argument("--headless", action="store_true", help="使用 SDL dummy 视频驱动无窗口运行")
+    parser.add_argument("--frames", type=int, default=FPS * 30, help="无窗口运行的帧数")
+    parser.add_argument("--profile", action="store_true", help="每回合导出各阶段耗时")
+    parser.add_argument("--tracemalloc", action="store_true", help="同时用 tracemalloc 记录每回合的内存分配(较慢)")
+    args = parser.parse_args(argv)
+    if args.profile or args.tracemalloc:
+        profiler.configure(PROFILE_JSONL, PROFILE_PROMETHEUS, trace_memory=args.tracemalloc)
+
+    if not args.headless:
+        GameApp().run()
+        return
+
+    os.environ["SDL_VIDEODRIVER"] = "dummy"
+    app = GameApp(planner=_offline_planner, autosave=False, record_frames=True)
+    wall, cpu = time.perf_counter(), time.process_time()
+    app.run(args.frames, _demo_script)
+    wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+    times = sorted(app.all_frame_times)
+    screen_pixels = SCREEN_WIDTH * SCREEN_HEIGHT
+    print(f"{len(times)} 帧，用时 {wall:.1f}s，实际 {len(times) / wall:.1f} FPS，CPU 占用 {cpu / wall:.0%}")
+    print(f"帧耗时 p50 {times[len(times) // 2] * 1000:.3f}ms  p95 {times[int(len(times) * 0.95)] * 1000:.3f}ms  "
+          f"最慢 {times[-1] * 1000:.3f}ms  平均 {statistics.fmean(times) * 1000:.3f}ms")
+    print(f"平均每帧重绘面积 {app.dirty_pixels / len(times) / screen_pixels:.2%} 屏幕")
+    print(f"文字缓存命中 {app.small.hits + app.medium.hits}，未命中 {app.small.misses + app.medium.misses}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""中文文字渲染：字形/文本表面缓存与增量折行
+
+- 每个字的字形表面与宽度只渲染/测量一次，整行文字由缓存的字形拼出
+- 整行文字表面按 (文字, 颜色) 做 LRU 缓存，日志等每帧重复出现的行不再渲染
+- WrappedText 追加文字时只重新排最后一行，已排好的行及其表面保持不变
+"""
+from collections import OrderedDict
+
+import pygame
+
+from config.settings import FONT_PATH, FONT_CANDIDATES, UI_TEXT_CACHE
+
+
+def load_font(size: int) -> pygame.font.Font:
+    """加载中文字体：优先 FONT_PATH，其次系统中的常见中文字体，都没有时用默认字体"""
+    if FONT_PATH:
+        return pygame.font.Font(FONT_PATH, size)
+    return pygame.font.Font(pygame.font.match_font(FONT_CANDIDATES), size)
+
+
+class TextCache:
+    """一种字体的字形与文本表面缓存"""
+
+    def __init__(self, font: pygame.font.Font, capacity: int = UI_TEXT_CACHE):
+        self.font = font
+        self.line_height = font.get_linesize()
+        self.capacity = capacity
+        self._advances = {}  # 字 -> 宽度
+        self._glyphs = {}  # (字, 颜色) -> 表面
+        self._texts = OrderedDict()  # (文字, 颜色) -> 表面
+        # 统计
+        self.hits = 0
+        self.misses = 0
+
+    def advance(self, ch: str) -> int:
+        """单字宽度"""
+        width = self._advances.get(ch)
+        if width is None:
+            width = self._advances[ch] = self.font.size(ch)[0]
+        return width
+
+    def width(self, text: str) -> int:
+        return sum(self.advance(ch) for ch in text)
+
+    def glyph(self, ch: str, color) -> pygame.Surface:
+        key = (ch, color)
+        surface = self._glyphs.get(key)
+        if surface is None:
+            surface = self._glyphs[key] = self.font.render(ch, True, color)
+        return surface
+
+    def compose(self, text: str, color) -> pygame.Surface:
+        """由缓存的字形拼出一行文字(不进入整行缓存)"""
+        surface = pygame.Surface((max(1, self.width(text)), self.line_height), pygame.SRCALPHA)
+        x = 0
+        for ch in text:
+            surface.blit(self.glyph(ch, color), (x, 0))
+            x += self.advance(ch)
+        return surface
+
+    def text(self, text: str, color) -> pygame.Surface:
+        """整行文字表面(LRU 缓存)"""
+        key = (text, color)
+        surface = self._texts.get(key)
+        if surface is not None:
+            self._texts.move_to_end(key)
+            self.hits += 1
+            return surface
+        self.misses += 1
+        surface = self._texts[key] = self.compose(text, color)
+        if len(self._texts) > self.capacity:
+            self._texts.popitem(last=False)
+        return surface
+
+
+class WrappedText:
+    """按像素宽度折行的文字，支持逐步追加"""
+
+    def __init__(self, cache: TextCache, width: int, color):
+        self.cache = cache
+        self.width = width
+        self.color = color
+        self.lines = [""]
+        self._line_width = 0
+        self._surfaces = []  # 已排好(不会再变)的行的表面
+
+    def clear(self):
+        self.lines = [""]
+        self._line_width = 0
+        self._surfaces = []
+
+    def drop_front(self, count: int):
+        """丢掉最前面的 count 行(滚动用)"""
+        self.lines = self.lines[count:]
+        self._surfaces = self._surfaces[count:]
+
+    def append(self, text: str) -> int:
+        """追加文字，返回第一条有变化的行号(此前的行不变)"""
+        first_changed = len(self.lines) - 1
+        for ch in text:
+            if ch == "\n":
+                self.lines.append("")
+                self._line_width = 0
+                continue
+            advance = self.cache.advance(ch)
+            if self._line_width + advance > self.width and self.lines[-1]:
+                self.lines.append("")
+                self._line_width = 0
+            self.lines[-1] += ch
+            self._line_width += advance
+        return first_changed
+
+    def surface(self, index: int) -> pygame.Surface:
+        """第 index 行的表面：已排好的行渲染一次后保留，最后一行每次变化时重拼"""
+        last = len(self.lines) - 1
+        while len(self._surfaces) < min(index + 1, last):
+            i = len(self._surfaces)
+            self._surfaces.append(self.cache.compose(self.lines[i], self.color))
+        if index < last:
+            return self._surfaces[index]
+        return self.cache.compose(self.lines[index], self.color)
@@ -0,0 +1,193 @@
+"""界面控件：只在内容变化时重绘，并返回需要更新到屏幕的矩形"""
+from typing import Callable, Optional
+
+import pygame
+
+from config.settings import COLORS, UI_TYPE_SPEED
+from ui.text import TextCache, WrappedText
+
+_PADDING = 10
+
+
+class Widget:
+    """控件基类：内容变化时标记为脏，draw 只在脏时重绘"""
+
+    def __init__(self, rect):
+        self.rect = pygame.Rect(rect)
+        self.dirty = True
+
+    def update(self, dt: float):
+        """每帧调用，dt 为距上一帧的秒数"""
+
+    def handle(self, event) -> bool:
+        """处理输入事件，返回是否已处理"""
+        return False
+
+    def draw(self, surface: pygame.Surface) -> list:
+        """脏时重绘，返回需要更新的屏幕矩形"""
+        if not self.dirty:
+            return []
+        self.dirty = False
+        self._draw(surface)
+        return [self.rect]
+
+    def _draw(self, surface: pygame.Surface):
+        raise NotImplementedError
+
+    def _draw_panel(self, surface: pygame.Surface):
+        pygame.draw.rect(surface, COLORS["panel_bg"], self.rect)
+        pygame.draw.rect(surface, COLORS["panel_border"], self.rect, 1)
+
+
+class TextPanel(Widget):
+    """若干行文字(HUD、日志)，内容与上次相同时不重绘"""
+
+    def __init__(self, rect, cache: TextCache, color=COLORS["white"]):
+        super().__init__(rect)
+        self.cache = cache
+        self.color = color
+        self.lines = []
+
+    def set_lines(self, lines: list):
+        if lines != self.lines:
+            self.lines = list(lines)
+            self.dirty = True
+
+    def _draw(self, surface):
+        self._draw_panel(surface)
+        clip = surface.get_clip()
+        surface.set_clip(self.rect.inflate(-2, -2))
+        y = self.rect.y + _PADDING
+        for line in self.lines:
+            surface.blit(self.cache.text(line, self.color), (self.rect.x + _PADDING, y))
+            y += self.cache.line_height
+        surface.set_clip(clip)
+
+
+class StoryPanel(Widget):
+    """LLM 叙事区：文字逐字出现，每帧只重绘有变化的行"""
+
+    def __init__(self, rect, cache: TextCache, color=COLORS["gold"]):
+        super().__init__(rect)
+        self.cache = cache
+        self.text = WrappedText(cache, self.rect.width - 2 * _PADDING, color)
+        self._pending = ""  # 尚未显示的文字
+        self._budget = 0.0
+        self._changed_from: Optional[int] = None
+        self._max_lines = (self.rect.height - 2 * _PADDING) // cache.line_height
+
+    def show(self, text: str):
+        """替换为新的一段文字，逐字显示"""
+        self.text.clear()
+        self._pending = text
+        self._budget = 0.0
+        self.dirty = True
+
+    @property
+    def typing(self) -> bool:
+        return bool(self._pending)
+
+    def finish(self):
+        """立即显示全部文字"""
+        self._reveal(len(self._pending))
+
+    def _reveal(self, count: int):
+        shown, self._pending = self._pending[:count], self._pending[count:]
+        first = self.text.append(shown)
+        # 超出面板高度时只保留最后若干行
+        overflow = len(self.text.lines) - self._max_lines
+        if overflow > 0:
+            self.text.drop_front(overflow)
+            self.dirty = True
+            return
+        self._changed_from = first if self._changed_from is None else min(self._changed_from, first)
+
+    def update(self, dt):
+        if not self._pending:
+            return
+        self._budget += dt * UI_TYPE_SPEED
+        count = int(self._budget)
+        if count:
+            self._budget -= count
+            self._reveal(count)
+
+    def handle(self, event) -> bool:
+        if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1 and self.rect.collidepoint(event.pos):
+            self.finish()
+            return True
+        return False
+
+    def draw(self, surface):
+        if self.dirty:
+            self._changed_from = None
+            return super().draw(surface)
+        if self._changed_from is None:
+            return []
+        # 只重绘第一条变化的行到最后一行
+        first, self._changed_from = self._changed_from, None
+        top = self.rect.y + _PADDING + first * self.cache.line_height
+        area = pygame.Rect(self.rect.x + 1, top, self.rect.width - 2,
+                           (len(self.text.lines) - first) * self.cache.line_height)
+        area = area.clip(self.rect.inflate(-2, -2))
+        pygame.draw.rect(surface, COLORS["panel_bg"], area)
+        self._blit_lines(surface, first)
+        return [area]
+
+    def _draw(self, surface):
+        self._draw_panel(surface)
+        self._blit_lines(surface, 0)
+
+    def _blit_lines(self, surface, first: int):
+        clip = surface.get_clip()
+        surface.set_clip(self.rect.inflate(-2, -2))
+        for i in range(first, len(self.text.lines)):
+            y = self.rect.y + _PADDING + i * self.cache.line_height
+            surface.blit(self.text.surface(i), (self.rect.x + _PADDING, y))
+        surface.set_clip(clip)
+
+
+class Button(Widget):
+    """按钮：悬停、按下、禁用状态变化时重绘"""
+
+    def __init__(self, rect, cache: TextCache, label: str, callback: Callable[[], None]):
+        super().__init__(rect)
+        self.cache = cache
+        self.label = label
+        self.callback = callback
+        self.enabled = True
+        self.hover = False
+        self.pressed = False
+
+    def set_enabled(self, enabled: bool):
+        if enabled != self.enabled:
+            self.enabled = enabled
+            self.dirty = True
+
+    def handle(self, event) -> bool:
+        if event.type == pygame.MOUSEMOTION:
+            hover = self.rect.collidepoint(event.pos)
+            if hover != self.hover:
+                self.hover, self.dirty = hover, True
+        elif event.type == pygame.MOUSEBUTTONDOWN and event.button == 1 and self.rect.collidepoint(event.pos):
+            self.pressed, self.dirty = True, True
+            return True
+        elif event.type == pygame.MOUSEBUTTONUP and event.button == 1 and self.pressed:
+            self.pressed, self.dirty = False, True
+            if self.enabled and self.rect.collidepoint(event.pos):
+                self.callback()
+            return True
+        return False
+
+    def _draw(self, surface):
+        if not self.enabled:
+            color = COLORS["dark_gray"]
+        elif self.pressed:
+            color = COLORS["button_pressed"]
+        elif self.hover:
+            color = COLORS["button_hover"]
+        else:
+            color = COLORS["button_normal"]
+        pygame.draw.rect(surface, color, self.rect)
+        pygame.draw.rect(surface, COLORS["panel_border"], self.rect, 1)
+        label = self.cache.text(self.label, COLORS["white"] if self.enabled else COLORS["gray"])
+        surface.blit(label, label.get_rect(center=self.rect.center))